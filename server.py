@@ -9,6 +9,13 @@ class CONFIG(object):
     sensor_pins = [11, 9, 10, 22, 27, 17,
                    14, 15, 18, 25, 8, 7]
     gpio_read_delay_in_ms = 5  # Wait before reading the sensor value after an interrupt, for reliability
+    gpio_min_settle_window_in_ms = 0.5  # Coalesce edges in an adaptive settle window (between this and gpio_read_delay_in_ms) instead of sleeping. None to disable
+    gpio_char_device = None  # e.g. '/dev/gpiochip0' to read the sensors through the GPIO character device, with kernel edge timestamps
+    gpio_sample_rate_in_hz = None  # e.g. 10000 to sample all the sensors at a fixed rate through /dev/gpiomem, instead of interrupts
+                                   # Each sample wakes up a Python thread: at 10000 expect a large share of a CPU core (max 20000)
+    sensors_deliver_word = True  # Sensor adapters deliver one integer word for all pins, decoded with a lookup table
+    record_sensors_to = None     # File path: record all the sensor snapshots (see boost.sensors.recording)
+    replay_sensors_from = None   # File path: replay a sensors recording instead of reading the sensors
 
     # Shaft encoder
     sensor_devices = {
@@ -16,11 +23,26 @@ class CONFIG(object):
         'B': [6, 7, 8, 9, 10, 11],
     }
     stasis_timeout_in_sec = 1.0     # Time to wait on the same sector before assuming speed is null
-    max_speed_in_deg_per_sec = 800  # If speed is higher, assume a fault in the sensors read
+    max_speed_in_deg_per_sec = 800  # Sector transitions requiring a higher speed are rejected as faulty sensor reads
+    shaft_events_ring_size = 256        # Power of 2. Position changes waiting to be handed over from the sensors thread to the main loop
+    dispatch_shaft_events_every_ms = 5  # How often the main loop hands position changes over to the planner
+    calibration_spin_up_in_sec = 2.0    # Band calibration: time for the head to reach a steady speed
+    calibration_recording_in_sec = 5.0  # Band calibration: edges are recorded for this long (at least two full turns)
+    power_calibration_settle_in_sec = 1.5   # Power calibration: time for the speed to settle at each power of the sweep
+    power_calibration_measure_in_sec = 1.0  # Power calibration: the speed is averaged over this long, at each power
 
     # Motors
     motors_apply_power_every_ms = 50     # Max 250, otherwise the ThunderBorg protection mechanism will kick in and stop the motors
+    motors_heartbeat_every_ms = 150      # Power is only written when it changes, but at least this often (max 250, as above)
+    motor_channels = None                # e.g. {'A': (1, 0x15, 1), 'B': (1, 0x15, 2), 'C': (1, 0x16, 1)}: I2C bus, address and channel
+                                         # of the ThunderBorg of each motor. None: discover the boards on bus 1, two motors each
+    motors_io_thread = True              # Talk to the ThunderBorg from a dedicated thread, so that the asyncio loop never blocks on I2C
+    motor_time_constant_in_sec = 0.3     # How quickly the heads follow a change of power, to predict how far they go when stopping
+    motor_dead_band_power = 0.1          # Power below which the heads do not turn: from there, they coast when stopping
+    coast_deceleration_in_deg_per_sec2 = 180.0  # How quickly friction stops a coasting head (None: the heads follow the power all the way)
     monitor_motors_power_every_ms = 100  # To report power values to the UI
+    poll_motors_health_every_ms = 100    # At most one reading (fault flags, battery, motor levels) from the board each time
+    nominal_battery_voltage = None       # e.g. 12.0 to scale the power up as the battery sags (None: no compensation)
 
     # Program
     step_program_every_ms = 50  # This is effectively the resolution of the timer in the program
@@ -28,6 +50,7 @@ class CONFIG(object):
 
 class CONFIG_DEV(CONFIG):
     mock_hardware = True
+    simulate_hardware = True     # Physics-simulated motors and shafts, instead of motionless mocks
 
 
 if __name__ == '__main__':
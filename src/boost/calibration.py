@@ -0,0 +1,177 @@
+def compute_band_offsets(edges, num_bits):
+    """
+    Offsets of the bands of one device (in degrees, MSB to LSB, positive when the edges come at a larger angle), from the
+    edges recorded while the shaft turns at constant speed, in one direction (see ShaftEncoders.start_recording_edges).
+
+    At constant speed the boundaries would be crossed at evenly spaced times: a straight line is fitted through
+    (boundary, time), and the time residual of each edge, times the speed, is how far its band is from where it should
+    be. The residuals of each band are averaged over all of its edges. Returns None if some band has no edges.
+    """
+    num_edges = len(edges)
+    if num_edges < 2:
+        return None
+    num_codes = 1 << num_bits
+    sector_angle = 360.0 / num_codes
+
+    # Least squares fit of: time = start_time + boundary * time_per_boundary
+    mean_boundary = sum(boundary for _, boundary in edges) / float(num_edges)
+    mean_time = sum(timestamp for timestamp, _ in edges) / float(num_edges)
+    covariance = sum((boundary - mean_boundary) * (timestamp - mean_time) for timestamp, boundary in edges)
+    variance = sum((boundary - mean_boundary) ** 2 for _, boundary in edges)
+    if variance == 0 or covariance == 0:
+        return None
+    time_per_boundary = covariance / variance
+    # Position values grow as the angle decreases
+    velocity = -sector_angle / time_per_boundary
+
+    sums = [0.0] * num_bits
+    counts = [0] * num_bits
+    for timestamp, boundary in edges:
+        residual = timestamp - (mean_time + (boundary - mean_boundary) * time_per_boundary)
+        position, previous_position = boundary % num_codes, (boundary - 1) % num_codes
+        code_bit = (position ^ (position >> 1)) ^ (previous_position ^ (previous_position >> 1))
+        band_idx = num_bits - code_bit.bit_length()
+        sums[band_idx] += residual * velocity
+        counts[band_idx] += 1
+    if not all(counts):
+        return None
+    band_offsets = [band_sum / count for band_sum, count in zip(sums, counts)]
+    # A common offset of all the bands is just a different zero, keep them centered
+    mean_offset = sum(band_offsets) / num_bits
+    return [band_offset - mean_offset for band_offset in band_offsets]
+
+
+class BandCalibration(object):
+    """
+    Calibration of the band alignment of one device: spin the head at constant power, record the timing of the edges,
+    and compute the offset of each band.
+
+    The steps are driven by the caller, which decides how long to wait in between:
+     - "spin": apply the power, and wait for the shaft to reach a steady speed
+     - "start_recording": record the edges for a few full turns
+     - "finish": stop the motor, and compute the offsets (None if the recording is not good enough)
+    """
+    def __init__(self, shaft_encoder, motors_controller, device, power):
+        assert device in shaft_encoder.devices, 'Invalid device {0}'.format(device)
+        self.shaft_encoder = shaft_encoder
+        self.motors_controller = motors_controller
+        self.device = device
+        self.power = power
+        self.edges = None
+
+    def spin(self):
+        self.motors_controller.set_power_manually(self.device, self.power)
+
+    def start_recording(self):
+        self.edges = self.shaft_encoder.start_recording_edges(self.device)
+
+    def finish(self):
+        self.motors_controller.set_power_manually(self.device, 0)
+        self.shaft_encoder.stop_recording_edges(self.device)
+        edges = self.edges or []
+        num_codes = self.shaft_encoder.num_codes[self.device]
+        if len(edges) < num_codes * 2:
+            return None  # At least two full turns
+        boundaries = [boundary for _, boundary in edges]
+        if boundaries != list(range(boundaries[0], boundaries[0] + len(boundaries))) and \
+                boundaries != list(range(boundaries[0], boundaries[0] - len(boundaries), -1)):
+            return None  # Not turning steadily in one direction
+        return compute_band_offsets(edges, len(self.shaft_encoder.devices[self.device]))
+
+
+# Powers of the sweep of the speed-to-power calibration, in each direction
+DEFAULT_SWEEP_POWERS = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
+
+
+def fit_power_curve(samples):
+    """
+    Power-to-speed curve of one direction, from (power, measured speed) samples: the [power, mean speed] points, by
+    growing power and starting from [0, 0], with the speed made non-decreasing (a slower speed at a higher power is
+    measurement noise). Both the power and the speed are magnitudes.
+    """
+    speeds_by_power = {}
+    for power, speed in samples:
+        if power != 0:
+            speeds_by_power.setdefault(abs(power), []).append(abs(speed))
+    curve = [[0.0, 0.0]]
+    for power, speeds in sorted(speeds_by_power.items()):
+        curve.append([power, max(sum(speeds) / len(speeds), curve[-1][1])])
+    return curve
+
+
+def get_power_for_speed(curve, speed):
+    """
+    Inverse of a power-to-speed curve (linear in between the points). None if the speed is beyond the curve.
+    """
+    for (power_0, speed_0), (power_1, speed_1) in zip(curve, curve[1:]):
+        if speed_1 > speed_0 and speed_0 <= speed <= speed_1:
+            return power_0 + (power_1 - power_0) * (speed - speed_0) / (speed_1 - speed_0)
+    return None
+
+
+def compute_power_definitions(curves, num_speeds):
+    """
+    Power definitions that give evenly spaced speeds, up to the top speed that all the curves can reach, and those speeds
+    (degrees/sec). The power of a speed is the mean of what each curve needs (e.g. one curve per direction).
+    Returns None if some curve never moves the shaft.
+    """
+    max_speed = min(curve[-1][1] for curve in curves)
+    if max_speed <= 0:
+        return None
+    speed_definitions = [max_speed * (idx + 1) / num_speeds for idx in range(num_speeds)]
+    power_definitions = [sum(get_power_for_speed(curve, speed) for curve in curves) / len(curves) for speed in speed_definitions]
+    return [round(power, 3) for power in power_definitions], [round(speed, 1) for speed in speed_definitions]
+
+
+def compute_shared_power_definitions(power_curves_by_device, num_speeds):
+    """
+    Power definitions (and speeds) shared by all the motors, from the curves of all the calibrated devices: the speeds
+    are within reach of every device, in both directions.
+    """
+    curves = [curve for device, curves in sorted(power_curves_by_device.items()) for direction, curve in sorted(curves.items())]
+    return compute_power_definitions(curves, num_speeds) if curves else None
+
+
+class PowerCalibration(object):
+    """
+    Calibration of the speed of one device as a function of the power: sweep the powers in both directions, measure the
+    steady-state speed at each, and fit a power-to-speed curve per direction.
+
+    The steps are driven by the caller, which waits for the speed to settle in between:
+     - "next_power": apply the next power of the sweep (returns False when the sweep is over)
+     - "measure": record the speed measured by the shaft encoder, as many times as wanted for each power
+     - "finish": stop the motor, and fit the curves ({'ccw': curve, 'cw': curve}, None if the shaft never moved)
+    Each direction starts from zero power, so the motor is never reversed at speed.
+    """
+    def __init__(self, shaft_encoder, motors_controller, device, sweep_powers=None):
+        assert device in shaft_encoder.devices, 'Invalid device {0}'.format(device)
+        self.shaft_encoder = shaft_encoder
+        self.motors_controller = motors_controller
+        self.device = device
+        sweep_powers = sweep_powers or DEFAULT_SWEEP_POWERS
+        # Positive power is counter-clockwise
+        self.powers = [0.0] + list(sweep_powers) + [0.0] + [-power for power in sweep_powers]
+        self.power_idx = -1
+        self.samples = []  # (power, speed)
+
+    def next_power(self):
+        self.power_idx += 1
+        if self.power_idx >= len(self.powers):
+            return False
+        self.motors_controller.set_power_manually(self.device, self.powers[self.power_idx])
+        return True
+
+    def measure(self):
+        power = self.powers[self.power_idx]
+        if power != 0:
+            self.samples.append((power, self.shaft_encoder.get_velocity(self.device).velocity))
+
+    def finish(self):
+        self.motors_controller.set_power_manually(self.device, 0)
+        curves = {
+            'ccw': fit_power_curve([(power, speed) for power, speed in self.samples if power > 0]),
+            'cw': fit_power_curve([(power, speed) for power, speed in self.samples if power < 0]),
+        }
+        if any(curve[-1][1] <= 0 for curve in curves.values()):
+            return None
+        return curves
@@ -0,0 +1,140 @@
+import unittest
+from datetime import datetime, timedelta
+from .calibration import BandCalibration, PowerCalibration, compute_band_offsets, compute_power_definitions, compute_shared_power_definitions, fit_power_curve, get_power_for_speed
+from .simulation import HardwareSimulator
+from .sensors.shaft_encoder import ShaftEncoders
+from .motors.motors_controller import MotorsController
+
+
+DEVICES = {
+    'A': [0, 1, 2, 3, 4, 5],
+    'B': [6, 7, 8, 9, 10, 11],
+}
+
+BAND_OFFSETS = [0.8, -0.5, 0.3, 0.0, -0.4, 0.6]
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class ComputeBandOffsetsTestSuite(unittest.TestCase):
+    def test_evenly_spaced_edges(self):
+        edges = [(0.01 * idx, boundary) for idx, boundary in enumerate(range(5, 5 + 64 * 2))]
+        for band_offset in compute_band_offsets(edges, 6):
+            self.assertAlmostEqual(band_offset, 0.0)
+
+    def test_not_enough_edges(self):
+        self.assertIsNone(compute_band_offsets([(0.0, 1), (0.01, 2)], 6))
+
+
+class BandCalibrationTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.simulator = HardwareSimulator(self.clock, DEVICES, 12, band_offsets={'A': BAND_OFFSETS})
+        self.shaft_encoders = ShaftEncoders(self.simulator.sensors_adapter, DEVICES, self.clock, 1.0, 800, self.fail)
+        self.motors_controller = MotorsController(self.clock, DEVICES.keys())
+        self.simulator.start(self.shaft_encoders._on_sensor_values, run_thread=False)
+        self.shaft_encoders.start(lambda positions, speeds: None)
+
+    def run_simulation(self, seconds):
+        for idx in range(int(seconds * 1000)):
+            if idx % 50 == 0:
+                self.motors_controller.apply_motor_power(self.simulator.motors_adapter)
+            self.simulator.step(0.001)
+            self.clock.add(timedelta(milliseconds=1))
+
+    def calibrate(self, power, seconds):
+        calibration = BandCalibration(self.shaft_encoders, self.motors_controller, 'A', power)
+        calibration.spin()
+        self.run_simulation(1.5)
+        calibration.start_recording()
+        self.run_simulation(seconds)
+        return calibration.finish()
+
+    def test_measures_misaligned_bands(self):
+        band_offsets = self.calibrate(-0.8, 3.0)
+        mean_offset = sum(BAND_OFFSETS) / len(BAND_OFFSETS)
+        for measured, actual in zip(band_offsets, BAND_OFFSETS):
+            self.assertAlmostEqual(measured, actual - mean_offset, delta=0.05)
+        self.assertEqual(self.motors_controller.get_current_power()['A'], 0)
+
+    def test_same_result_turning_the_other_way(self):
+        band_offsets = self.calibrate(0.8, 3.0)
+        mean_offset = sum(BAND_OFFSETS) / len(BAND_OFFSETS)
+        for measured, actual in zip(band_offsets, BAND_OFFSETS):
+            self.assertAlmostEqual(measured, actual - mean_offset, delta=0.05)
+
+    def test_too_short_a_recording(self):
+        self.assertIsNone(self.calibrate(-0.8, 0.5))
+
+
+class ComputePowerDefinitionsTestSuite(unittest.TestCase):
+    def test_fit_power_curve(self):
+        curve = fit_power_curve([(0.1, 0.0), (0.2, 40.0), (0.2, 44.0), (0.4, 120.0), (0.3, 110.0), (0.5, 115.0)])
+        self.assertEqual(curve, [[0.0, 0.0], [0.1, 0.0], [0.2, 42.0], [0.3, 110.0], [0.4, 120.0], [0.5, 120.0]])
+
+    def test_evenly_spaced_speeds(self):
+        # Dead band up to 0.2, then linear, and slower in one direction
+        ccw = [[0.0, 0.0], [0.2, 0.0], [1.0, 400.0]]
+        cw = [[0.0, 0.0], [0.2, 0.0], [1.0, 300.0]]
+        power_definitions, speed_definitions = compute_power_definitions([ccw, cw], 3)
+        self.assertEqual(speed_definitions, [100.0, 200.0, 300.0])
+        self.assertEqual(power_definitions, [round((0.4 + 0.4667) / 2, 3), round((0.6 + 0.7333) / 2, 3), round((0.8 + 1.0) / 2, 3)])
+        self.assertIsNone(get_power_for_speed(ccw, 500.0))
+
+    def test_shared_by_all_the_devices(self):
+        fast = [[0.0, 0.0], [0.2, 0.0], [1.0, 400.0]]
+        slow = [[0.0, 0.0], [0.2, 0.0], [1.0, 300.0]]
+        power_definitions, speed_definitions = compute_shared_power_definitions({'A': {'ccw': fast, 'cw': fast},
+                                                                                 'B': {'ccw': slow, 'cw': slow}}, 3)
+        # Up to the top speed of the slowest device
+        self.assertEqual(speed_definitions, [100.0, 200.0, 300.0])
+        self.assertEqual(power_definitions, compute_power_definitions([fast, slow], 3)[0])
+        self.assertIsNone(compute_shared_power_definitions({}, 3))
+
+    def test_never_moves(self):
+        self.assertIsNone(compute_power_definitions([[[0.0, 0.0], [1.0, 0.0]]], 5))
+
+
+class PowerCalibrationTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.simulator = HardwareSimulator(self.clock, DEVICES, 12)
+        self.shaft_encoders = ShaftEncoders(self.simulator.sensors_adapter, DEVICES, self.clock, 1.0, 800, self.fail)
+        self.motors_controller = MotorsController(self.clock, DEVICES.keys())
+        self.simulator.start(self.shaft_encoders._on_sensor_values, run_thread=False)
+        self.shaft_encoders.start(lambda positions, speeds: None)
+
+    def run_simulation(self, seconds):
+        for idx in range(int(seconds * 1000)):
+            if idx % 50 == 0:
+                self.motors_controller.apply_motor_power(self.simulator.motors_adapter)
+            self.simulator.step(0.001)
+            self.clock.add(timedelta(milliseconds=1))
+
+    def test_sweep(self):
+        calibration = PowerCalibration(self.shaft_encoders, self.motors_controller, 'A', [0.2, 0.4, 0.6, 0.8, 1.0])
+        while calibration.next_power():
+            self.run_simulation(1.5)
+            for _ in range(5):
+                calibration.measure()
+                self.run_simulation(0.1)
+        curves = calibration.finish()
+        self.assertEqual(self.motors_controller.get_current_power()['A'], 0)
+        shaft = self.simulator.shafts['A']
+        for direction in ('ccw', 'cw'):
+            self.assertEqual([power for power, _ in curves[direction]], [0.0, 0.2, 0.4, 0.6, 0.8, 1.0])
+            for power, speed in curves[direction][1:]:
+                self.assertAlmostEqual(speed, shaft.steady_state_speed(power), delta=5.0)
+        power_definitions, speed_definitions = compute_power_definitions(list(curves.values()), 5)
+        # The simulated shaft has a dead band: evenly spaced speeds are not evenly spaced powers
+        for power, speed in zip(power_definitions, speed_definitions):
+            self.assertAlmostEqual(shaft.steady_state_speed(power), speed, delta=5.0)
@@ -3,10 +3,17 @@ from functools import partial
 from .language.errors import ProgramSyntaxError
 
 
-class CommandTurn(namedtuple('CommandTurn', 'direction target speed to', defaults=(None,))):
+def get_num_turn_sections(runtime_parameters, target):
+    # Either one value for all the motors, or one per motor (function parameters are checked against the largest)
+    num_turn_sections = runtime_parameters.num_turn_sections
+    if isinstance(num_turn_sections, dict):
+        return num_turn_sections.get(target, max(num_turn_sections.values()))
+    return num_turn_sections
+
+
+class CommandTurn(namedtuple('CommandTurn', 'direction target speed to turns', defaults=(None, None))):
     @classmethod
     def parse(cls, program_line, function_name, params_string, locals_dict, runtime_parameters, errors):
-        turn_to_range = (1, runtime_parameters.num_turn_sections)
         speed_range = (1, runtime_parameters.num_speeds)
         try:
             command = eval(cls.__name__ + params_string, {cls.__name__: partial(cls, function_name)}, locals_dict)
@@ -14,12 +21,20 @@ class CommandTurn(namedtuple('CommandTurn', 'direction target speed to', default
             errors.append(ProgramSyntaxError(program_line.line_num, 'Parsing exception: {0}'.format(err)))
             return
         if command.to is not None:
+            turn_to_range = (1, get_num_turn_sections(runtime_parameters, command.target))
             if not isinstance(command.to, int):
                 errors.append(ProgramSyntaxError(program_line.line_num, '"to" parameter must be an integer'))
                 return
             if not (turn_to_range[0] <= command.to <= turn_to_range[1]):
                 errors.append(ProgramSyntaxError(program_line.line_num, '"to" parameter must be in range {0}-{1}'.format(*turn_to_range)))
                 return
+        if command.turns is not None:
+            if not isinstance(command.turns, int):
+                errors.append(ProgramSyntaxError(program_line.line_num, '"turns" parameter must be an integer'))
+                return
+            if command.turns < 0:
+                errors.append(ProgramSyntaxError(program_line.line_num, '"turns" parameter must not be negative'))
+                return
         if not isinstance(command.speed, int):
             errors.append(ProgramSyntaxError(program_line.line_num, '"speed" parameter must be an integer'))
             return
@@ -29,12 +44,15 @@ class CommandTurn(namedtuple('CommandTurn', 'direction target speed to', default
         return command
 
     def execute(self, execution_context):
+        turns_message = ' after {0} full turns'.format(self.turns) if self.turns else ''
         if self.to:
-            execution_context.log_message('{0} turning {1} to {2} at speed {3}'.format(self.target, self.direction, self.to, self.speed))
+            execution_context.log_message('{0} turning {1} to {2}{3} at speed {4}'.format(self.target, self.direction, self.to, turns_message, self.speed))
+        elif self.turns:
+            execution_context.log_message('{0} turning {1} {2} full turns at speed {3}'.format(self.target, self.direction, self.turns, self.speed))
         else:
             execution_context.log_message('{0} turning {1} at speed {2}'.format(self.target, self.direction, self.speed))
         motor = execution_context.get_symbol(self.target)
-        motor.turn(self.direction, self.to, self.speed)
+        motor.turn(self.direction, self.to, self.speed, self.turns)
 
         execution_context.advance_pc()
         return False  # Non blocking - continue executing following commands
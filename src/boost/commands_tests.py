@@ -47,8 +47,9 @@ class FakeMotor(object):
         self.name = name
         self.emit_log = emit_log
 
-    def turn(self, direction, to, speed):
-        self.emit_log('{0} MOTOR {1} TURN {2} {3} {4}'.format(self.clock.now(), self.name, direction, to, speed))
+    def turn(self, direction, to, speed, turns=None):
+        turns_log = ' TURNS {0}'.format(turns) if turns is not None else ''
+        self.emit_log('{0} MOTOR {1} TURN {2} {3} {4}{5}'.format(self.clock.now(), self.name, direction, to, speed, turns_log))
 
     def stop(self):
         self.emit_log('{0} MOTOR {1} STOP'.format(self.clock.now(), self.name))
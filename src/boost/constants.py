@@ -1,5 +1,12 @@
 from collections import namedtuple
 
-MotorControllerConstants = namedtuple('MotorControllerConstants', 'power_definitions ramp_up_time_from_zero_to_max_in_sec')
+# Optional closed-loop speed control (see MotorsController):
+#  - speed_definitions: target speed of each speed value, in degrees/sec (same length as power_definitions)
+#  - speed_gains: device -> [kp, ki, kd], devices without gains stay open-loop
+# Optional shape of the ramps (see motors.motion_profile):
+#  - motion_profile: 'trapezoidal' (linear ramps, the default) or 's_curve'
+#  - jerk_time_in_sec: for 's_curve', how long the rate of change of the power takes to build up to its max
+MotorControllerConstants = namedtuple('MotorControllerConstants', 'power_definitions ramp_up_time_from_zero_to_max_in_sec speed_definitions speed_gains motion_profile jerk_time_in_sec')
+MotorControllerConstants.__new__.__defaults__ = (None, None, None, None)
 
 RuntimeParameters = namedtuple('RuntimeParameters', 'num_turn_sections num_speeds')
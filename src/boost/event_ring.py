@@ -0,0 +1,45 @@
+class EventRing(object):
+    """
+    Bounded single-producer / single-consumer ring, to hand events over from one thread to another without locks.
+
+    Only the producer thread calls "push", and it is the only one moving "tail". Only the consumer thread calls
+    "drain", and it is the only one moving "head". Each index is written by one thread and read by the other, and a
+    slot is written before the index that publishes it moves (atomic under the GIL), so no lock is needed.
+
+    When the ring is full the new event is dropped and counted: the consumer is expected to read the current state of
+    whatever the events refer to, rather than rely on every single event.
+    """
+    def __init__(self, capacity):
+        assert capacity > 0 and (capacity & (capacity - 1)) == 0, 'The capacity must be a power of 2'
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.slots = [None] * capacity
+        self.head = 0  # Next slot to read, moved by the consumer only
+        self.tail = 0  # Next slot to write, moved by the producer only
+        self.num_dropped = 0  # Written by the producer only
+
+    def push(self, *event):
+        tail = self.tail
+        if tail - self.head >= self.capacity:
+            self.num_dropped += 1
+            return False
+        self.slots[tail & self.mask] = event
+        self.tail = tail + 1
+        return True
+
+    def drain(self, on_event, max_events=None):
+        head = first = self.head
+        tail = self.tail
+        if max_events is not None:
+            tail = min(tail, head + max_events)
+        while head != tail:
+            idx = head & self.mask
+            event = self.slots[idx]
+            self.slots[idx] = None
+            head += 1
+            self.head = head  # Free the slot before handling the event, the producer can reuse it straight away
+            on_event(*event)
+        return head - first
+
+    def __len__(self):
+        return self.tail - self.head
@@ -0,0 +1,59 @@
+import unittest
+import threading
+from .event_ring import EventRing
+
+
+class EventRingTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+
+    def on_event(self, positions, speeds):
+        self.events.append((positions, speeds))
+
+    def test_drains_in_order(self):
+        ring = EventRing(4)
+        ring.push({'A': 1}, {'A': -5.0})
+        ring.push({'A': 2}, {'A': -6.0})
+        self.assertEqual(len(ring), 2)
+        self.assertEqual(ring.drain(self.on_event), 2)
+        self.assertEqual(self.events, [({'A': 1}, {'A': -5.0}), ({'A': 2}, {'A': -6.0})])
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.drain(self.on_event), 0)
+
+    def test_drops_when_full(self):
+        ring = EventRing(2)
+        self.assertTrue(ring.push(1, 1.0))
+        self.assertTrue(ring.push(2, 2.0))
+        self.assertFalse(ring.push(3, 3.0))
+        self.assertEqual(ring.num_dropped, 1)
+        ring.drain(self.on_event, max_events=1)
+        self.assertTrue(ring.push(4, 4.0))
+        ring.drain(self.on_event)
+        self.assertEqual([positions for positions, _ in self.events], [1, 2, 4])
+
+    def test_wraps_around(self):
+        ring = EventRing(4)
+        for idx in range(10):
+            ring.push(idx, 0.0)
+            ring.drain(self.on_event)
+        self.assertEqual([positions for positions, _ in self.events], list(range(10)))
+
+    def test_capacity_must_be_a_power_of_2(self):
+        with self.assertRaises(AssertionError):
+            EventRing(6)
+
+    def test_producer_thread(self):
+        ring = EventRing(256)
+        num_events = 5000
+
+        def produce():
+            idx = 0
+            while idx < num_events:
+                if ring.push(idx, 0.0):
+                    idx += 1
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while len(self.events) < num_events:
+            ring.drain(self.on_event)
+        producer.join()
+        self.assertEqual([positions for positions, _ in self.events], list(range(num_events)))
@@ -2,7 +2,8 @@ import json
 import asyncio
 
 
-def create_http_app(storage, http_server_input_message_queue, get_compilation_errors_for_json, is_program_running, run_program, stop_program, device_names, set_motor_power, reset_motors):
+def create_http_app(storage, http_server_input_message_queue, get_compilation_errors_for_json, is_program_running, run_program, stop_program, device_names, set_motor_power, reset_motors,
+                    get_sensors_health_for_json, reset_sensors_health, calibrate_bands, calibrate_power):
     from quart import Quart, websocket, request, jsonify, Response
 
     app = Quart('boost')
@@ -23,9 +24,17 @@ def create_http_app(storage, http_server_input_message_queue, get_compilation_er
             'constants': {
                 'power_definitions': motors_constants.power_definitions,
                 'ramp_up_time_from_zero_to_max_in_sec': motors_constants.ramp_up_time_from_zero_to_max_in_sec,
+                'speed_definitions': motors_constants.speed_definitions,
+                'speed_gains': motors_constants.speed_gains,
+                'motion_profile': motors_constants.motion_profile,
+                'jerk_time_in_sec': motors_constants.jerk_time_in_sec,
             },
         })
 
+    @app.route('/sensors_health')
+    async def sensors_health():
+        return jsonify(get_sensors_health_for_json())
+
     @app.route('/command/savePrograms', methods=['POST'])
     async def command_save_programs():
         programs = await request.json
@@ -65,6 +74,29 @@ def create_http_app(storage, http_server_input_message_queue, get_compilation_er
         reset_motors()
         return Response('Ok', mimetype='text/plain')
 
+    @app.route('/command/resetSensorsHealth', methods=['POST'])
+    async def command_reset_sensors_health():
+        reset_sensors_health()
+        return Response('Ok', mimetype='text/plain')
+
+    @app.route('/command/calibrateBands', methods=['POST'])
+    async def command_calibrate_bands():
+        data = await request.json
+        error = calibrate_bands(data.get('device'), data.get('power'))
+        if error is None:
+            return Response('Ok', mimetype='text/plain')
+        else:
+            return Response(error, status=400, mimetype='text/plain')
+
+    @app.route('/command/calibratePower', methods=['POST'])
+    async def command_calibrate_power():
+        data = await request.json
+        error = calibrate_power(data.get('device'))
+        if error is None:
+            return Response('Ok', mimetype='text/plain')
+        else:
+            return Response(error, status=400, mimetype='text/plain')
+
     @app.route('/command/saveConstants', methods=['POST'])
     async def command_save_constants():
         data = await request.json
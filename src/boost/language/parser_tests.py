@@ -180,6 +180,25 @@ class ParserTestSuite(unittest.TestCase):
         self.assertEqual(errors, [])
         self.assertEqual(command, CommandTurn(direction='left', target='X', to=12, speed=1))
 
+    def test_parsing_command_with_turns(self):
+        errors = []
+        command = parse_program_line(ProgramLine(text='left(A, to=12, speed=1, turns=2)', indentation=1, line_num=4), {}, self.local_variables, self.runtime_parameters, errors)
+        self.assertEqual(errors, [])
+        self.assertEqual(command, CommandTurn(direction='left', target='A', to=12, speed=1, turns=2))
+
+    def test_parsing_command_with_invalid_turns(self):
+        errors = []
+        parse_program_line(ProgramLine(text='left(A, to=12, speed=1, turns=-1)', indentation=1, line_num=4), {}, self.local_variables, self.runtime_parameters, errors)
+        self.assertEqual(errors, [ProgramSyntaxError(line_num=4, message='"turns" parameter must not be negative')])
+
+    def test_parsing_command_with_per_motor_resolution(self):
+        errors = []
+        runtime_parameters = RuntimeParameters({'A': 64, 'B': 256}, 5)
+        parse_program_line(ProgramLine(text='left(B, to=200, speed=1)', indentation=1, line_num=4), {}, self.local_variables, runtime_parameters, errors)
+        self.assertEqual(errors, [])
+        parse_program_line(ProgramLine(text='left(A, to=200, speed=1)', indentation=1, line_num=5), {}, self.local_variables, runtime_parameters, errors)
+        self.assertEqual(errors, [ProgramSyntaxError(line_num=5, message='"to" parameter must be in range 1-64')])
+
     def test_parsing_function_call(self):
         errors = []
         command = parse_program_line(ProgramLine(text='foo(A)', indentation=1, line_num=4), {'foo'}, self.local_variables, self.runtime_parameters, errors)
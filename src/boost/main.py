@@ -2,7 +2,10 @@ from .http.application import create_http_app, run_http_app
 from .storage import Storage, SAMPLE_PROGRAM
 from .sensors.shaft_encoder import ShaftEncoders
 from .motors.motors_controller import MotorsController
+from .motors.motors_health import MotorsHealthMonitor
 from .planner import Planner
+from .event_ring import EventRing
+from .calibration import BandCalibration, PowerCalibration, compute_shared_power_definitions
 from .clock import Clock
 from .language.parser import parse_program
 from .executor import ExecutionContext, WarningRuntimeMessage
@@ -35,24 +38,48 @@ class Motor(object):
         self.device = device
         self.planner = planner
 
-    def turn(self, direction, to, speed):
-        self.planner.set_plan(self.device, to, speed, 'cw' if direction == 'left' else 'ccw')
+    def turn(self, direction, to, speed, turns=None):
+        self.planner.set_plan(self.device, to, speed, 'cw' if direction == 'left' else 'ccw', turns)
 
     def stop(self):
         self.planner.set_stop_plan(self.device)
 
 
-def build_hardare_adapters(config):
-    if getattr(config, 'mock_hardware', False):
+def build_hardare_adapters(config, clock):
+    if getattr(config, 'simulate_hardware', False):
+        from .simulation import HardwareSimulator
+        simulator = HardwareSimulator(clock, config.sensor_devices, len(config.sensor_pins))
+        sensors_adapter = simulator.sensors_adapter
+        motors_adapter = simulator.motors_adapter
+    elif getattr(config, 'mock_hardware', False):
         from .sensors.sensors_mock import MockSensorsAdapter
         from .motors.motors_mock import MockMotorsAdapter
-        sensors_adapter = MockSensorsAdapter(config.sensor_pins)
+        sensors_adapter = MockSensorsAdapter(config.sensor_pins, config.sensors_deliver_word)
         motors_adapter = MockMotorsAdapter(print)
     else:
-        from .sensors.sensors_adapter import GPIOSensorsAdapter
-        from .motors.motors_adapter import ThunderBorgAdapter
-        sensors_adapter = GPIOSensorsAdapter(config.sensor_pins, config.gpio_read_delay_in_ms)
-        motors_adapter = ThunderBorgAdapter(print)
+        from .motors.motor_registry import MultiBoardMotorsAdapter, MotorChannel
+        if getattr(config, 'gpio_sample_rate_in_hz', None):
+            from .sensors.sensors_mmap import MmapGPIOSensorsAdapter
+            sensors_adapter = MmapGPIOSensorsAdapter(config.sensor_pins, clock, config.gpio_sample_rate_in_hz)
+        elif getattr(config, 'gpio_char_device', None):
+            from .sensors.sensors_gpiod import GPIOCharDeviceSensorsAdapter, GpiodLineProvider
+            sensors_adapter = GPIOCharDeviceSensorsAdapter(config.sensor_pins, clock, GpiodLineProvider(config.gpio_char_device))
+        else:
+            from .sensors.sensors_adapter import GPIOSensorsAdapter
+            sensors_adapter = GPIOSensorsAdapter(config.sensor_pins, config.gpio_read_delay_in_ms, config.sensors_deliver_word,
+                                                 clock, config.gpio_min_settle_window_in_ms)
+        motor_channels = getattr(config, 'motor_channels', None)
+        registry = dict((motor, MotorChannel(*channel)) for motor, channel in motor_channels.items()) if motor_channels else None
+        motors_adapter = MultiBoardMotorsAdapter(config.sensor_devices.keys(), print, registry)
+        if getattr(config, 'motors_io_thread', False):
+            from .motors.motors_worker import MotorsWorker
+            motors_adapter = MotorsWorker(motors_adapter, print, clock)
+    if getattr(config, 'replay_sensors_from', None):
+        from .sensors.sensors_replay import ReplaySensorsAdapter
+        sensors_adapter = ReplaySensorsAdapter(config.replay_sensors_from, clock)
+    if getattr(config, 'record_sensors_to', None):
+        from .sensors.recording import RecordingSensorsAdapter
+        sensors_adapter = RecordingSensorsAdapter(sensors_adapter, clock, config.record_sensors_to)
     return sensors_adapter, motors_adapter
 
 
@@ -61,17 +88,27 @@ class Application(object):
         self.config = config
         self.clock = Clock()
         self.storage = Storage({})
-        self.sensors_adapter, self.motors_adapter = build_hardare_adapters(config)
+        self.sensors_adapter, self.motors_adapter = build_hardare_adapters(config, self.clock)
         self.shaft_encoder = ShaftEncoders(self.sensors_adapter, config.sensor_devices, self.clock, config.stasis_timeout_in_sec, config.max_speed_in_deg_per_sec, print)
-        self.motors_controller = MotorsController(self.clock, config.sensor_devices.keys())
-        self.planner = Planner(self.shaft_encoder, self.motors_controller)
-        self.symbols = {'A': Motor('A', self.planner), 'B': Motor('B', self.planner)}
+        self.motors_controller = MotorsController(self.clock, config.sensor_devices.keys(), config.motors_heartbeat_every_ms / 1000.0,
+                                                  lambda device: self.shaft_encoder.get_velocity(device).velocity)
+        self.motors_health = MotorsHealthMonitor(self.motors_adapter, self.clock, nominal_voltage=getattr(config, 'nominal_battery_voltage', None))
+        self.planner = Planner(self.shaft_encoder, self.motors_controller, getattr(config, 'motor_time_constant_in_sec', 0.3),
+                               config.motors_apply_power_every_ms / 1000.0, getattr(config, 'motor_dead_band_power', 0.0),
+                               getattr(config, 'coast_deceleration_in_deg_per_sec2', None))
+        # Shaft position changes are handed over from the sensors thread, so that the planner and the motors controller
+        # are only ever touched by the asyncio loop
+        self.shaft_events = EventRing(getattr(config, 'shaft_events_ring_size', 256))
+        self.symbols = dict((device, Motor(device, self.planner)) for device in config.sensor_devices.keys())
         self.loop = asyncio.get_event_loop()
         self.http_server_input_message_queue = HttpServerInputMessageQueue(self.loop)
         device_names = list(config.sensor_devices.keys())
         self.http_app = create_http_app(self.storage, self.http_server_input_message_queue, self.get_compilation_errors_for_json,
-                                        self.is_program_running, self.run_program, self.stop_program, device_names, self.set_motor_power, self.reset_motors)
+                                        self.is_program_running, self.run_program, self.stop_program, device_names, self.set_motor_power, self.reset_motors,
+                                        self.get_sensors_health_for_json, self.shaft_encoder.reset_sensors_health, self.calibrate_bands,
+                                        self.calibrate_power)
         self.execution_context = None
+        self.calibration_task = None
 
     def run(self):
         print('Starting up application.')
@@ -87,7 +124,10 @@ class Application(object):
         self.storage.initialize(self.on_program_changed)
         if not self.motors_adapter.initialize():
             raise Exception('Error initializing the ThunderBorgAdapter')
-        self.shaft_encoder.start(self.planner.on_shaft_position)
+        for device, band_offsets in self.storage.get_band_offsets().items():
+            if device in self.shaft_encoder.devices and len(band_offsets) == len(self.shaft_encoder.devices[device]):
+                self.shaft_encoder.set_band_offsets(device, band_offsets)
+        self.shaft_encoder.start(self.shaft_events.push)
         self.compile_program()
         if self.storage.should_auto_run_current_program():
             self.run_program()
@@ -101,9 +141,10 @@ class Application(object):
     def _compile_program(self):
         motors_constants = self.storage.get_motors_constants()
         self.planner.set_constants(motors_constants)
+        self.motors_controller.set_constants(motors_constants)
         program_code = self.storage.get_current_program()['code']
         errors = []
-        runtime_parameters = RuntimeParameters(self.shaft_encoder.num_codes, len(motors_constants.power_definitions))
+        runtime_parameters = RuntimeParameters(dict(self.shaft_encoder.num_codes), len(motors_constants.power_definitions))
         program = parse_program(program_code, self.symbols.keys(), runtime_parameters, errors)
         return program, errors
 
@@ -121,6 +162,35 @@ class Application(object):
     def _format_compilation_errors_for_json(self, errors):
         return {'errors': [error.to_json() for error in errors]}
 
+    def get_sensors_health_for_json(self):
+        sensor_devices = dict((sensor_idx, device) for device, sensor_indexes in self.config.sensor_devices.items() for sensor_idx in sensor_indexes)
+        return {'sensors': [{
+            'sensor': health.sensor,
+            'pin': self.config.sensor_pins[health.sensor],
+            'device': sensor_devices.get(health.sensor),
+            'toggles': health.num_toggles,
+            'seconds_since_last_toggle': health.seconds_since_last_toggle,
+            'rejected_transitions': health.num_rejected,
+            'stuck': health.stuck,
+            'chattering': health.chattering,
+        } for health in self.shaft_encoder.get_sensors_health()]}
+
+    def get_motors_health_for_json(self):
+        health = self.motors_health.get_health()
+        return {
+            'values': {
+                'faulty': health.faulty,
+                'battery_voltage': round(health.battery_voltage, 1) if health.battery_voltage is not None else None,
+                'motor_levels': dict((motor, round(level, 2) if level is not None else None) for motor, level in (health.motor_levels or {}).items()),
+                'power_scale': round(self.motors_health.get_power_scale(), 3),
+            },
+            'read_at': {
+                'faulty': health.faulty_time.isoformat() if health.faulty_time else None,
+                'battery_voltage': health.battery_voltage_time.isoformat() if health.battery_voltage_time else None,
+                'motor_levels': health.motor_levels_time.isoformat() if health.motor_levels_time else None,
+            },
+        }
+
     def log_message(self, message):
         print(message)
         self.send_redux_message('SERVER_LOG', message)
@@ -141,19 +211,123 @@ class Application(object):
         self.http_server_input_message_queue.send_message(type=type, payload=payload)
 
     def set_motor_power(self, device, power):
-        if not self.is_program_running():
+        if not self.is_program_running() and not self.is_calibrating():
             self.motors_controller.set_power_manually(device, power)
 
     def reset_motors(self):
         if not self.is_program_running():
             self.motors_controller.stop_all_motors(self.storage.get_motors_constants())
 
+    def is_calibrating(self):
+        return self.calibration_task is not None and not self.calibration_task.done()
+
+    def start_calibration(self, device, coroutine):
+        """
+        Returns None if the calibration started, otherwise why it did not: only one calibration at a time drives the
+        motors, and never while a program is running.
+        """
+        if self.is_program_running():
+            coroutine.close()
+            return 'Program running'
+        if self.is_calibrating():
+            coroutine.close()
+            return 'Calibration running'
+        self.calibration_task = asyncio.ensure_future(coroutine)
+        self.calibration_task.add_done_callback(lambda task: self.on_calibration_done(device, task))
+        return None
+
+    def on_calibration_done(self, device, task):
+        if task.cancelled() or task.exception() is None:
+            return
+        self.motors_controller.set_power_manually(device, 0)
+        self.log_message('Calibration of device {0} failed: {1!r}'.format(device, task.exception()))
+
+    def calibrate_bands(self, device, power):
+        if device not in self.config.sensor_devices:
+            return 'Invalid device {0}'.format(device)
+        if not isinstance(power, (int, float)) or isinstance(power, bool) or not 0 < abs(power) <= 1:
+            return 'Invalid power {0}'.format(power)
+        return self.start_calibration(device, self.calibrate_bands_task(device, power))
+
+    async def calibrate_bands_task(self, device, power):
+        self.log_message('Calibrating the bands of device {0}'.format(device))
+        calibration = BandCalibration(self.shaft_encoder, self.motors_controller, device, power)
+        calibration.spin()
+        await asyncio.sleep(self.config.calibration_spin_up_in_sec)
+        calibration.start_recording()
+        await asyncio.sleep(self.config.calibration_recording_in_sec)
+        band_offsets = calibration.finish()
+        if band_offsets is None:
+            self.log_message('Calibration of device {0} failed: not enough full turns in one direction'.format(device))
+            return
+        self.storage.set_band_offsets(device, band_offsets)
+        self.shaft_encoder.set_band_offsets(device, band_offsets)
+        self.log_message('Band offsets of device {0}: {1}'.format(device, ', '.join('{0:.2f}'.format(band_offset) for band_offset in band_offsets)))
+
+    def calibrate_power(self, device):
+        if device not in self.config.sensor_devices:
+            return 'Invalid device {0}'.format(device)
+        return self.start_calibration(device, self.calibrate_power_task(device))
+
+    async def calibrate_power_task(self, device):
+        self.log_message('Calibrating the speed-to-power curve of device {0}'.format(device))
+        calibration = PowerCalibration(self.shaft_encoder, self.motors_controller, device)
+        measure_every_in_sec = 0.1
+        while calibration.next_power():
+            await asyncio.sleep(self.config.power_calibration_settle_in_sec)
+            for _ in range(max(1, int(round(self.config.power_calibration_measure_in_sec / measure_every_in_sec)))):
+                calibration.measure()
+                await asyncio.sleep(measure_every_in_sec)
+        power_curves = calibration.finish()
+        if power_curves is None:
+            self.log_message('Calibration of device {0} failed: the shaft did not turn'.format(device))
+            return
+        # The definitions are shared by all the motors: the other calibrated devices are taken into account too
+        power_curves_by_device = dict(self.storage.get_power_curves())
+        power_curves_by_device[device] = power_curves
+        result = compute_shared_power_definitions(power_curves_by_device, len(self.storage.get_motors_constants().power_definitions))
+        if result is None:
+            self.log_message('Calibration of device {0} failed: the shaft did not turn'.format(device))
+            return
+        power_definitions, speed_definitions = result
+        self.storage.set_power_calibration(device, power_curves, power_definitions, speed_definitions)
+        motors_constants = self.storage.get_motors_constants()
+        self.planner.set_constants(motors_constants)
+        self.motors_controller.set_constants(motors_constants)
+        self.log_message('Power definitions from devices {0}: {1} (for {2} deg/sec)'.format(
+            ', '.join(sorted(power_curves_by_device.keys())), ', '.join('{0:.3f}'.format(power) for power in power_definitions), ', '.join('{0:.0f}'.format(speed) for speed in speed_definitions)))
+
+    async def dispatch_shaft_events_task(self):
+        reported_dropped = 0
+        while True:
+            self.shaft_events.drain(self.planner.on_shaft_position)
+            if self.shaft_events.num_dropped != reported_dropped:
+                reported_dropped = self.shaft_events.num_dropped
+                self.log_message('Shaft events ring full, {0} events dropped so far'.format(reported_dropped))
+            await asyncio.sleep(getattr(self.config, 'dispatch_shaft_events_every_ms', 5) / 1000.0)
+
     async def apply_motor_power_task(self):
         while True:
+            self.shaft_events.drain(self.planner.on_shaft_position)
+            self.planner.on_tick()
             self.motors_controller.apply_motor_power(self.motors_adapter)
             await asyncio.sleep(self.config.motors_apply_power_every_ms / 1000.0)
 
+    async def poll_motors_health_task(self):
+        was_faulty = False
+        while True:
+            if self.motors_health.poll() == 'is_faulty':
+                faulty = bool(self.motors_health.get_health().faulty)
+                if faulty and not was_faulty:
+                    self.log_message('Motors drive fault')
+                was_faulty = faulty
+            self.motors_controller.set_power_scale(self.motors_health.get_power_scale())
+            await asyncio.sleep(getattr(self.config, 'poll_motors_health_every_ms', 100) / 1000.0)
+
     def run_program(self):
+        if self.is_calibrating():
+            self.log_message('Calibration running, the program cannot start')
+            return False
         program = self.compile_program()
         if program:
             self.execution_context = ExecutionContext(program, self.clock, self.symbols, self.on_runtime_error, self.log_message)
@@ -171,18 +345,41 @@ class Application(object):
 
     async def report_hardware_levels_task(self):
         previous_motor_values = {}
-        previous_shaft_values = {}
+        previous_shaft_steps = {}
+        previous_velocity_values = {}
+        previous_angle_values = {}
+        previous_snapshot_version = None
+        previous_motors_health = None
         while True:
             for device, power in self.motors_controller.get_current_power().items():
                 previous_value = previous_motor_values.get(device, None)
                 if power != previous_value:
                     self.send_redux_message('MOTOR_POWER', {'device': device, 'power': power})
                 previous_motor_values[device] = power
-            for device, position in self.shaft_encoder.get_current_positions().items():
-                previous_value = previous_shaft_values.get(device, None)
-                if position != previous_value:
-                    self.send_redux_message('SHAFT_POSITION', {'device': device, 'position': position.position, 'angle': position.angle})
-                previous_shaft_values[device] = position
+            snapshot = self.shaft_encoder.get_snapshot()
+            for device, position in snapshot.positions.items():
+                if snapshot.version != previous_snapshot_version:
+                    odometry = self.shaft_encoder.get_odometry(device, snapshot)
+                    if odometry.steps != previous_shaft_steps.get(device, None):
+                        self.send_redux_message('SHAFT_POSITION', {'device': device, 'position': position.position, 'angle': position.angle,
+                                                                   'turns': odometry.turns, 'cumulative_angle': odometry.angle})
+                    previous_shaft_steps[device] = odometry.steps
+                angle = round(self.shaft_encoder.get_interpolated_angle(device, snapshot=snapshot) % 360.0, 1)
+                if angle != previous_angle_values.get(device, None):
+                    self.send_redux_message('SHAFT_ANGLE', {'device': device, 'angle': angle})
+                previous_angle_values[device] = angle
+            previous_snapshot_version = snapshot.version
+            for device in self.shaft_encoder.device_names:
+                estimate = self.shaft_encoder.get_velocity(device)
+                velocity = round(estimate.velocity, 1)
+                if velocity != previous_velocity_values.get(device, None):
+                    self.send_redux_message('SHAFT_VELOCITY', {'device': device, 'velocity': velocity, 'acceleration': round(estimate.acceleration, 1),
+                                                               'confidence': round(estimate.confidence, 2)})
+                previous_velocity_values[device] = velocity
+            motors_health = self.get_motors_health_for_json()
+            if motors_health['values'] != previous_motors_health:
+                self.send_redux_message('MOTORS_HEALTH', motors_health)
+            previous_motors_health = motors_health['values']
             await asyncio.sleep(self.config.monitor_motors_power_every_ms / 1000.0)
 
     def cleanup_terminated_program(self):
@@ -202,8 +399,10 @@ class Application(object):
     async def run_asyncio_tasks(self):
         await asyncio.wait([
             run_http_app(self.http_app, '0.0.0.0', self.config.server_port),
+            asyncio.create_task(self.dispatch_shaft_events_task()),
             asyncio.create_task(self.apply_motor_power_task()),
             asyncio.create_task(self.execute_program_task()),
             asyncio.create_task(self.report_hardware_levels_task()),
+            asyncio.create_task(self.poll_motors_health_task()),
         ], return_when=asyncio.FIRST_COMPLETED)
 
@@ -29,10 +29,9 @@ Downloaded from: http://forum.piborg.org/downloads/thunderborg/ThunderBorg3.py.t
 """
 
 # Import the libraries we need
-import io
-import fcntl
 import types
 import time
+from boost.motors.i2c_transport import I2CDevice, I2CTransport
 
 # Constant values
 I2C_SLAVE                   = 0x0703
@@ -107,6 +106,8 @@ The busNumber if supplied is which I
             raise
         except:
             pass
+    if bus.transport is not None:
+        bus.transport.close()
     if len(found) == 0:
         print('No ThunderBorg boards found, is bus #%d correct (should be 0 for Rev 1, 1 for Rev 2)' % (busNumber))
     elif len(found) == 1:
@@ -184,6 +185,7 @@ Warning, this new I
         print('New IC address of %02X set successfully' % (newAddress))
     else:
         print('Failed to set new IC address...')
+    bus.transport.close()
 
 
 # Class used to control ThunderBorg
@@ -203,8 +205,7 @@ printFunction           Function reference to call when printing text, if None "
     i2cAddress              = I2C_ID_THUNDERBORG    # IC address, override for a different address
     foundChip               = False
     printFunction           = None
-    i2cWrite                = None
-    i2cRead                 = None
+    transport               = None                  # I2CTransport, set before Init to use another device (e.g. ThunderBorgEmulator)
 
 
     def RawWrite(self, command, data):
@@ -216,10 +217,7 @@ Command codes can be found at the top of ThunderBorg.py, data is a list of 0 or
 
 Under most circumstances you should use the appropriate function instead of RawWrite
         """
-        rawOutput = [command]
-        rawOutput.extend(data)
-        rawOutput = bytes(rawOutput)
-        self.i2cWrite.write(rawOutput)
+        self.transport.write(command, data)
 
 
     def RawRead(self, command, length, retryCount = 3):
@@ -234,20 +232,21 @@ If it does not it will retry the request until retryCount is exhausted (default
 
 Under most circumstances you should use the appropriate function instead of RawRead
         """
-        while retryCount > 0:
-            self.RawWrite(command, [])
-            rawReply = self.i2cRead.read(length)
-            reply = []
-            for singleByte in rawReply:
-                reply.append(singleByte)
-            if command == reply[0]:
-                break
-            else:
-                retryCount -= 1
-        if retryCount > 0:
-            return reply
-        else:
-            raise IOError('I2C read for command %d failed' % (command))
+        # Write and read in one combined transaction, copied out of the reply buffer that the next command overwrites
+        return bytes(self.transport.read(command, length, retryCount))
+
+
+    def OpenTransport(self):
+        """
+OpenTransport()
+
+Opens the I2C bus for busNumber and i2cAddress, unless a transport to another device (e.g. an emulator) was set
+        """
+        if self.transport is not None and not isinstance(self.transport.device, I2CDevice):
+            return
+        if self.transport is not None:
+            self.transport.close()
+        self.transport = I2CTransport(I2CDevice(self.busNumber, self.i2cAddress))
 
 
     def InitBusOnly(self, busNumber, address):
@@ -259,10 +258,7 @@ This call does not check the board is present or working, under most circumstanc
         """
         self.busNumber = busNumber
         self.i2cAddress = address
-        self.i2cRead = io.open("/dev/i2c-" + str(self.busNumber), "rb", buffering = 0)
-        fcntl.ioctl(self.i2cRead, I2C_SLAVE, self.i2cAddress)
-        self.i2cWrite = io.open("/dev/i2c-" + str(self.busNumber), "wb", buffering = 0)
-        fcntl.ioctl(self.i2cWrite, I2C_SLAVE, self.i2cAddress)
+        self.OpenTransport()
 
 
     def Print(self, message):
@@ -300,10 +296,7 @@ If tryOtherBus is True, this function will attempt to use the other bus if the T
         self.Print('Loading ThunderBorg on bus %d, address %02X' % (self.busNumber, self.i2cAddress))
 
         # Open the bus
-        self.i2cRead = io.open("/dev/i2c-" + str(self.busNumber), "rb", buffering = 0)
-        fcntl.ioctl(self.i2cRead, I2C_SLAVE, self.i2cAddress)
-        self.i2cWrite = io.open("/dev/i2c-" + str(self.busNumber), "wb", buffering = 0)
-        fcntl.ioctl(self.i2cWrite, I2C_SLAVE, self.i2cAddress)
+        self.OpenTransport()
 
         # Check for ThunderBorg
         try:
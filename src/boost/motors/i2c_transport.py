@@ -0,0 +1,153 @@
+from collections import namedtuple
+import ctypes
+import fcntl
+import os
+import time
+
+
+# From linux/i2c-dev.h and linux/i2c.h
+I2C_SLAVE = 0x0703
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+MAX_MESSAGE_LEN = 32
+
+
+class I2CMessage(ctypes.Structure):
+    _fields_ = [('addr', ctypes.c_uint16), ('flags', ctypes.c_uint16), ('len', ctypes.c_uint16), ('buf', ctypes.POINTER(ctypes.c_uint8))]
+
+
+class I2CRdwrIoctlData(ctypes.Structure):
+    _fields_ = [('msgs', ctypes.POINTER(I2CMessage)), ('nmsgs', ctypes.c_uint32)]
+
+
+# Statistics of one command code, since the start (or the last reset):
+#  - num_transactions: number of calls, each one possibly retried
+#  - num_retries: number of replies that did not echo the command, and were requested again
+#  - num_failures: number of calls that ran out of retries, or failed on the bus
+#  - mean_latency_in_sec / max_latency_in_sec: duration of the calls, retries included
+CommandStats = namedtuple('CommandStats', 'command num_transactions num_retries num_failures mean_latency_in_sec max_latency_in_sec')
+
+
+class I2CDevice(object):
+    """
+    One device on a Linux I2C bus, through /dev/i2c-N.
+
+    A read is a single combined transaction (I2C_RDWR): the command is written and the reply read back with a repeated
+    start, in one syscall, so that no other master can get in between and the reply can not belong to another command.
+    """
+    def __init__(self, bus_number, address):
+        self.bus_number = bus_number
+        self.address = address
+        self.fd = os.open('/dev/i2c-{0}'.format(bus_number), os.O_RDWR)
+        fcntl.ioctl(self.fd, I2C_SLAVE, address)
+        self._messages = (I2CMessage * 2)()
+        self._ioctl_data = I2CRdwrIoctlData(self._messages, 2)
+        self._bound_buffers = None
+
+    def write(self, write_buffer, write_length):
+        written = os.write(self.fd, memoryview(write_buffer)[:write_length])
+        if written != write_length:
+            raise IOError('I2C write to {0:02X} sent {1} bytes out of {2}'.format(self.address, written, write_length))
+
+    def write_read(self, write_buffer, write_length, read_buffer, read_length):
+        if self._bound_buffers is None or self._bound_buffers[0] is not write_buffer or self._bound_buffers[1] is not read_buffer:
+            self._bind_buffers(write_buffer, read_buffer)
+        self._messages[0].len = write_length
+        self._messages[1].len = read_length
+        fcntl.ioctl(self.fd, I2C_RDWR, ctypes.addressof(self._ioctl_data))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _bind_buffers(self, write_buffer, read_buffer):
+        # The messages point straight into the (preallocated) buffers of the transport
+        write_array = (ctypes.c_uint8 * len(write_buffer)).from_buffer(write_buffer)
+        read_array = (ctypes.c_uint8 * len(read_buffer)).from_buffer(read_buffer)
+        self._messages[0].addr = self.address
+        self._messages[0].flags = 0
+        self._messages[0].buf = ctypes.cast(write_array, ctypes.POINTER(ctypes.c_uint8))
+        self._messages[1].addr = self.address
+        self._messages[1].flags = I2C_M_RD
+        self._messages[1].buf = ctypes.cast(read_array, ctypes.POINTER(ctypes.c_uint8))
+        self._bound_buffers = (write_buffer, read_buffer, write_array, read_array)
+
+
+class I2CTransport(object):
+    """
+    Command/reply transport to a board that echoes the command code as the first byte of the reply (e.g. ThunderBorg).
+
+    The buffers are allocated once, and the reply of "read" is a view on the read buffer: it is only valid until the next
+    call. Latency and retries are counted for each command code (see "get_stats").
+    The device is either an I2CDevice, or an emulator with the same "write" / "write_read" methods.
+    """
+    def __init__(self, device, monotonic=time.monotonic):
+        self.device = device
+        self.monotonic = monotonic
+        self.write_buffer = bytearray(MAX_MESSAGE_LEN)
+        self.read_buffer = bytearray(MAX_MESSAGE_LEN)
+        self._read_view = memoryview(self.read_buffer)
+        self.reset_stats()
+
+    def write(self, command, data):
+        write_length = 1 + len(data)
+        assert write_length <= MAX_MESSAGE_LEN, 'I2C message too long'
+        stats = self._command_stats(command)
+        start_time = self.monotonic()
+        self.write_buffer[0] = command
+        self.write_buffer[1:write_length] = bytes(data)
+        try:
+            self.device.write(self.write_buffer, write_length)
+        except IOError:
+            stats[2] += 1
+            raise
+        finally:
+            self._add_latency(stats, self.monotonic() - start_time)
+
+    def read(self, command, length, retry_count=3):
+        assert length <= MAX_MESSAGE_LEN, 'I2C message too long'
+        stats = self._command_stats(command)
+        start_time = self.monotonic()
+        self.write_buffer[0] = command
+        try:
+            while retry_count > 0:
+                try:
+                    self.device.write_read(self.write_buffer, 1, self.read_buffer, length)
+                except IOError:
+                    stats[2] += 1
+                    raise
+                if self.read_buffer[0] == command:
+                    return self._read_view[:length]
+                retry_count -= 1
+                if retry_count > 0:
+                    stats[1] += 1
+            stats[2] += 1
+            raise IOError('I2C read for command {0} failed'.format(command))
+        finally:
+            self._add_latency(stats, self.monotonic() - start_time)
+
+    def get_stats(self):
+        return [CommandStats(command, num_transactions, num_retries, num_failures, total_latency / num_transactions, max_latency)
+                for command, (num_transactions, num_retries, num_failures, total_latency, max_latency) in sorted(self.stats.items())]
+
+    def reset_stats(self):
+        self.stats = {}  # command -> [num_transactions, num_retries, num_failures, total_latency, max_latency]
+
+    def close(self):
+        close = getattr(self.device, 'close', None)
+        if close:
+            close()
+
+    def _command_stats(self, command):
+        stats = self.stats.get(command)
+        if stats is None:
+            stats = self.stats[command] = [0, 0, 0, 0.0, 0.0]
+        stats[0] += 1
+        return stats
+
+    def _add_latency(self, stats, latency):
+        stats[3] += latency
+        if latency > stats[4]:
+            stats[4] = latency
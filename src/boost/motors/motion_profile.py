@@ -0,0 +1,87 @@
+import math
+
+
+TRAPEZOIDAL = 'trapezoidal'
+S_CURVE = 's_curve'
+MOTION_PROFILES = (TRAPEZOIDAL, S_CURVE)
+
+NUM_SAMPLES = 32  # Intervals of a sample table
+MAX_CACHED_TABLES = 256
+
+
+# NOTE: the ramps are of the power (or of the target speed), and the power sets the speed of the motor: a trapezoidal
+# profile ramps the power linearly (constant acceleration, which starts and stops abruptly), an S-curve profile limits
+# the jerk, making the rate of change of the power build up and wind down linearly over "jerk_time_in_sec".
+
+
+def get_ramp_time(diff, max_rate, profile=TRAPEZOIDAL, jerk_time_in_sec=0.0):
+    """
+    Seconds to ramp by "diff", changing at no more than "max_rate" per second.
+    """
+    diff = abs(diff)
+    if profile != S_CURVE or not jerk_time_in_sec:
+        return diff / max_rate
+    if diff >= max_rate * jerk_time_in_sec:
+        # Reaches the max rate: the corners add a jerk time in all
+        return diff / max_rate + jerk_time_in_sec
+    # Too short to reach the max rate: the rate only builds up to half way, and winds down
+    jerk = max_rate / jerk_time_in_sec
+    return 2 * math.sqrt(diff / jerk)
+
+
+def get_s_curve_table(diff, max_rate, jerk_time_in_sec, num_samples=NUM_SAMPLES):
+    """
+    Fraction of the ramp done at "num_samples + 1" evenly spaced times from start to end.
+    """
+    diff = abs(diff)
+    ramp_time = get_ramp_time(diff, max_rate, S_CURVE, jerk_time_in_sec)
+    jerk_time = min(jerk_time_in_sec, ramp_time / 2.0)
+    jerk = max_rate / jerk_time_in_sec
+    peak_rate = jerk * jerk_time
+    table = []
+    for idx in range(num_samples + 1):
+        time = ramp_time * idx / num_samples
+        if time < jerk_time:
+            done = jerk * time * time / 2.0
+        elif time <= ramp_time - jerk_time:
+            done = peak_rate * jerk_time / 2.0 + peak_rate * (time - jerk_time)
+        else:
+            done = diff - jerk * (ramp_time - time) ** 2 / 2.0
+        table.append(min(1.0, done / diff))
+    table[-1] = 1.0
+    return tuple(table)
+
+
+def interpolate(table, fraction):
+    position = fraction * (len(table) - 1)
+    idx = min(int(position), len(table) - 2)
+    return table[idx] + (table[idx + 1] - table[idx]) * (position - idx)
+
+
+class MotionProfiles(object):
+    """
+    Ramps of one profile, with the sample tables of the S-curves cached: the shape of a ramp depends only on how far it
+    goes and how fast, and the same few ramps (between speed values) come up over and over.
+    """
+    def __init__(self, profile=None, jerk_time_in_sec=None):
+        profile = profile or TRAPEZOIDAL
+        assert profile in MOTION_PROFILES, 'Invalid motion profile {0}'.format(profile)
+        self.profile = profile
+        self.jerk_time_in_sec = jerk_time_in_sec or 0.0
+        self.tables = {}
+
+    def get_ramp(self, start, target, max_rate):
+        """
+        Returns the seconds the ramp takes, and its sample table (None for a linear ramp).
+        """
+        diff = target - start
+        ramp_time = get_ramp_time(diff, max_rate, self.profile, self.jerk_time_in_sec)
+        if self.profile != S_CURVE or not self.jerk_time_in_sec or not diff:
+            return ramp_time, None
+        key = (abs(diff), max_rate)
+        table = self.tables.get(key)
+        if table is None:
+            if len(self.tables) >= MAX_CACHED_TABLES:
+                self.tables.clear()
+            table = self.tables[key] = get_s_curve_table(diff, max_rate, self.jerk_time_in_sec)
+        return ramp_time, table
@@ -0,0 +1,44 @@
+import unittest
+from .motion_profile import MotionProfiles, get_ramp_time, get_s_curve_table, interpolate
+
+
+class MotionProfileTestSuite(unittest.TestCase):
+    def test_ramp_time(self):
+        self.assertAlmostEqual(get_ramp_time(0.5, 2.0), 0.25)
+        self.assertAlmostEqual(get_ramp_time(-0.5, 2.0), 0.25)
+        # The corners add a jerk time
+        self.assertAlmostEqual(get_ramp_time(1.0, 2.0, 's_curve', 0.1), 0.6)
+        # Too short to reach the max rate: 0.1 = jerk * t^2 with jerk = 20/sec^2
+        self.assertAlmostEqual(get_ramp_time(0.1, 2.0, 's_curve', 0.1), 2 * (0.1 / 20.0) ** 0.5)
+
+    def test_s_curve_table(self):
+        for diff in (1.0, 0.1):
+            table = get_s_curve_table(diff, 2.0, 0.1)
+            self.assertEqual(table[0], 0.0)
+            self.assertEqual(table[-1], 1.0)
+            self.assertEqual(sorted(table), list(table))
+            # Symmetric about the middle
+            for idx in range(len(table)):
+                self.assertAlmostEqual(table[idx] + table[-1 - idx], 1.0)
+        # Smooth start: slower than the linear ramp of the same length, then at the max rate
+        table = get_s_curve_table(1.0, 2.0, 0.1)
+        self.assertLess(interpolate(table, 1 / 12.0), 1 / 12.0)
+        # Power per second in the middle, over 5% of the 0.6 sec of the ramp
+        rate = (interpolate(table, 0.5) - interpolate(table, 0.45)) * 1.0 / (0.05 * 0.6)
+        self.assertAlmostEqual(rate, 2.0)
+
+    def test_interpolate(self):
+        table = (0.0, 0.25, 1.0)
+        self.assertEqual(interpolate(table, 0.0), 0.0)
+        self.assertAlmostEqual(interpolate(table, 0.25), 0.125)
+        self.assertAlmostEqual(interpolate(table, 0.75), 0.625)
+        self.assertEqual(interpolate(table, 1.0), 1.0)
+
+    def test_tables_are_cached(self):
+        profiles = MotionProfiles('s_curve', 0.1)
+        ramp_time, table = profiles.get_ramp(0.2, 0.6, 2.0)
+        self.assertAlmostEqual(ramp_time, 0.3)
+        self.assertIs(profiles.get_ramp(0.6, 0.2, 2.0)[1], table)
+        self.assertIsNone(MotionProfiles().get_ramp(0.2, 0.6, 2.0)[1])
+        with self.assertRaises(AssertionError):
+            MotionProfiles('cubic')
@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+from boost.motors import ThunderBorg
+from boost.motors.motors_adapter import ThunderBorgAdapter
+
+
+# Where a motor is wired: I2C bus and address of the ThunderBorg board, and channel on the board (1 or 2)
+MotorChannel = namedtuple('MotorChannel', 'bus address channel')
+
+CHANNELS_PER_BOARD = 2
+CHANNEL_MOTORS = {1: 'A', 2: 'B'}  # Motor names of the channels, for ThunderBorgAdapter
+
+
+def build_motor_registry(motor_names, boards):
+    """
+    Motor name -> MotorChannel, filling the channels of the boards ((bus, address), in the given order) with the motors,
+    in alphabetical order. Returns None if there are not enough channels.
+    """
+    channels = [MotorChannel(bus, address, channel) for bus, address in boards for channel in range(1, CHANNELS_PER_BOARD + 1)]
+    motor_names = sorted(motor_names)
+    if len(channels) < len(motor_names):
+        return None
+    return dict(zip(motor_names, channels))
+
+
+class MultiBoardMotorsAdapter(object):
+    """
+    Motors adapter for any number of motors, across several ThunderBorg boards.
+
+    The registry maps each motor to a MotorChannel. Without one, the boards are discovered at "initialize" by scanning
+    the I2C bus, and the motors are assigned to their channels by address (see build_motor_registry): with the single
+    board at the default address, motor "A" is on channel 1 and "B" on channel 2.
+    "set_motors_power" groups the writes per board: the two channels of a board set to the same power take one write.
+    """
+    def __init__(self, motor_names, log_message, registry=None, bus_number=1, scan=ThunderBorg.ScanForThunderBorg, transport_factory=None):
+        self.motor_names = list(motor_names)
+        self.log_message = log_message
+        self.registry = registry
+        self.bus_number = bus_number
+        self.scan = scan
+        self.transport_factory = transport_factory  # (bus, address) -> I2CTransport, None to open the I2C bus
+        self.boards = {}  # (bus, address) -> ThunderBorgAdapter
+
+    def initialize(self):
+        if self.registry is None:
+            addresses = sorted(self.scan(self.bus_number))
+            self.registry = build_motor_registry(self.motor_names, [(self.bus_number, address) for address in addresses])
+            if self.registry is None:
+                self.log_message('Found {0} ThunderBorg boards, not enough for {1} motors'.format(len(addresses), len(self.motor_names)))
+                return False
+        for motor_name, motor_channel in sorted(self.registry.items()):
+            self.log_message('Motor {0}: bus {1}, address {2:02X}, channel {3}'.format(motor_name, *motor_channel))
+        for motor_channel in self.registry.values():
+            board_key = (motor_channel.bus, motor_channel.address)
+            if board_key not in self.boards:
+                transport = self.transport_factory(*board_key) if self.transport_factory else None
+                self.boards[board_key] = ThunderBorgAdapter(self.log_message, transport, *board_key)
+        return all([board.initialize() for board in self.boards.values()])
+
+    def is_faulty(self):
+        return any([board.is_faulty() for board in self.boards.values()])
+
+    def get_voltage_reading(self):
+        # The lowest, if the boards have separate batteries
+        readings = [reading for reading in (board.get_voltage_reading() for board in self.boards.values()) if reading is not None]
+        return min(readings) if readings else None
+
+    def get_motor_levels(self):
+        levels = {}
+        for board_key, board in self.boards.items():
+            board_levels = board.get_motor_levels()
+            for motor_name, motor_channel in self.registry.items():
+                if (motor_channel.bus, motor_channel.address) == board_key:
+                    levels[motor_name] = board_levels[CHANNEL_MOTORS[motor_channel.channel]]
+        return levels
+
+    def set_motor_power(self, motor, power):
+        motor_channel = self.registry[motor]
+        self.boards[(motor_channel.bus, motor_channel.address)].set_motor_power(CHANNEL_MOTORS[motor_channel.channel], power)
+
+    def set_motors_power(self, power_by_motor):
+        power_by_board = {}
+        for motor, power in power_by_motor.items():
+            motor_channel = self.registry[motor]
+            power_by_board.setdefault((motor_channel.bus, motor_channel.address), {})[CHANNEL_MOTORS[motor_channel.channel]] = power
+        for board_key, power_by_channel in power_by_board.items():
+            self.boards[board_key].set_motors_power(power_by_channel)
+
+    def set_all_motors_power(self, power):
+        self.set_motors_power(dict((motor, power) for motor in self.registry))
+
+    def stop(self):
+        for board in self.boards.values():
+            board.stop()
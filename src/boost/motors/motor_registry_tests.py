@@ -0,0 +1,72 @@
+import unittest
+from .i2c_transport import I2CTransport
+from .motor_registry import MultiBoardMotorsAdapter, MotorChannel, build_motor_registry
+from .thunderborg_emulator import ThunderBorgEmulator
+
+
+class MotorRegistryTestSuite(unittest.TestCase):
+    def test_fills_the_boards_in_order(self):
+        registry = build_motor_registry(['C', 'A', 'B'], [(1, 0x15), (1, 0x16)])
+        self.assertEqual(registry, {
+            'A': MotorChannel(1, 0x15, 1),
+            'B': MotorChannel(1, 0x15, 2),
+            'C': MotorChannel(1, 0x16, 1),
+        })
+
+    def test_not_enough_channels(self):
+        self.assertIsNone(build_motor_registry(['A', 'B', 'C'], [(1, 0x15)]))
+
+
+class MultiBoardMotorsAdapterTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.emulators = {}
+        self.transports = {}
+        self.messages = []
+
+    def transport_factory(self, bus, address):
+        self.emulators[address] = ThunderBorgEmulator()
+        self.transports[address] = I2CTransport(self.emulators[address])
+        return self.transports[address]
+
+    def build_adapter(self, motor_names, registry=None, addresses=(0x15, 0x16)):
+        return MultiBoardMotorsAdapter(motor_names, self.messages.append, registry, scan=lambda bus_number: list(addresses),
+                                       transport_factory=self.transport_factory)
+
+    def test_discovers_the_boards(self):
+        adapter = self.build_adapter(['A', 'B', 'C'], addresses=[0x16, 0x15])
+        self.assertTrue(adapter.initialize())
+        self.assertEqual(sorted(self.emulators.keys()), [0x15, 0x16])
+        self.assertTrue(all(emulator.failsafe for emulator in self.emulators.values()))
+        adapter.set_motor_power('C', -1.0)
+        self.assertEqual(self.emulators[0x16].get_motor_power('A'), -1.0)
+        self.assertEqual(adapter.get_motor_levels(), {'A': 0.0, 'B': 0.0, 'C': -1.0})
+
+    def test_not_enough_boards(self):
+        adapter = self.build_adapter(['A', 'B', 'C'], addresses=[0x15])
+        self.assertFalse(adapter.initialize())
+
+    def test_writes_grouped_per_board(self):
+        registry = {'X': MotorChannel(1, 0x15, 2), 'Y': MotorChannel(1, 0x15, 1), 'Z': MotorChannel(1, 0x20, 2)}
+        adapter = self.build_adapter(registry.keys(), registry)
+        self.assertTrue(adapter.initialize())
+        for transport in self.transports.values():
+            transport.reset_stats()
+        adapter.set_motors_power({'X': 0.2, 'Y': 0.2, 'Z': -0.2})
+        self.assertAlmostEqual(self.emulators[0x15].get_motor_power('B'), 51 / 255.0)
+        self.assertAlmostEqual(self.emulators[0x15].get_motor_power('A'), 51 / 255.0)
+        self.assertAlmostEqual(self.emulators[0x20].get_motor_power('B'), -51 / 255.0)
+        # One write on the first board for both channels
+        self.assertEqual([stats.num_transactions for stats in self.transports[0x15].get_stats()], [1])
+        self.assertEqual([stats.num_transactions for stats in self.transports[0x20].get_stats()], [1])
+
+    def test_faults_and_battery_of_all_the_boards(self):
+        adapter = self.build_adapter(['A', 'B', 'C'])
+        adapter.initialize()
+        self.assertFalse(adapter.is_faulty())
+        self.emulators[0x16].drive_faults['B'] = True
+        self.assertTrue(adapter.is_faulty())
+        self.emulators[0x15].battery_voltage = 10.0
+        self.assertAlmostEqual(adapter.get_voltage_reading(), 10.0, delta=0.05)
+        adapter.set_all_motors_power(0.5)
+        adapter.stop()
+        self.assertEqual(adapter.get_motor_levels(), {'A': 0.0, 'B': 0.0, 'C': 0.0})
@@ -2,10 +2,13 @@ from boost.motors import ThunderBorg
 
 
 class ThunderBorgAdapter(object):
-    def __init__(self, log_message):
+    def __init__(self, log_message, transport=None, bus_number=1, address=ThunderBorg.I2C_ID_THUNDERBORG):
         self.log_message = log_message
         self.TB = ThunderBorg.ThunderBorg()
         self.TB.printFunction = log_message
+        self.TB.busNumber = bus_number
+        self.TB.i2cAddress = address
+        self.TB.transport = transport  # None to open the I2C bus, or an I2CTransport (e.g. to a ThunderBorgEmulator)
 
     def initialize(self):
         # Set the board up (checks the board is connected)
@@ -39,6 +42,10 @@ class ThunderBorgAdapter(object):
     def get_voltage_reading(self):
         return self.TB.GetBatteryReading()
 
+    def get_motor_levels(self):
+        # The power the board is actually applying (e.g. zero after the failsafe kicked in)
+        return {'A': self.TB.GetMotor1(), 'B': self.TB.GetMotor2()}
+
     def set_motor_power(self, motor, power):
         assert motor in ('A', 'B'), 'Unknown motor {0}'.format(motor)
         if motor == 'A':
@@ -46,6 +53,21 @@ class ThunderBorgAdapter(object):
         if motor == 'B':
             self.TB.SetMotor2(power)
 
+    def set_motors_power(self, power_by_motor):
+        power_values = set(power_by_motor.values())
+        if len(power_by_motor) == 2 and len(power_values) == 1:
+            self.set_all_motors_power(power_values.pop())
+        else:
+            for motor, power in power_by_motor.items():
+                self.set_motor_power(motor, power)
+
+    def set_all_motors_power(self, power):
+        # One I2C write for both motors
+        self.TB.SetMotors(power)
+
+    def get_transport_stats(self):
+        return self.TB.transport.get_stats() if self.TB.transport else []
+
     def stop(self):
         self.TB.MotorsOff()
 
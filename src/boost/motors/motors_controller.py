@@ -1,4 +1,7 @@
+from array import array
 from datetime import timedelta
+from .motion_profile import MotionProfiles, interpolate
+from .speed_regulator import SpeedRegulator
 
 
 # NOTE:
@@ -6,79 +9,285 @@ from datetime import timedelta
 #  - negative speed = Clockwise (CW) rotation
 
 
+# The ThunderBorg stops the motors if it is not commanded at least once every 1/4 of a second
+COMMS_FAILSAFE_TIMEOUT_IN_SEC = 0.25
+
+# Written power of a motor that must be written: NaN is different from any power
+NOT_WRITTEN = float('nan')
+
+# Unit of the times of the ramps
+MICROSECOND = timedelta(microseconds=1)
+
+
 class MotorsController(object):
-    def __init__(self, clock, motor_names):
+    """
+    Power is written to the motors adapter only when it changes: all the changes of a tick at once if the adapter
+    supports it ("set_motors_power"), otherwise with one combined write when all the motors change to the same power.
+    When nothing changes, a heartbeat re-writes one motor every "heartbeat_interval_in_sec", to keep the comms failsafe
+    of the board from stopping the motors (all of them with "set_motors_power": the adapter may drive several boards).
+
+    With "speed_definitions" and "speed_gains" in the constants, and a "get_velocity" (motor -> degrees/sec), the speed
+    of a motor is closed-loop: the ramp of the power is the feed-forward, and a SpeedRegulator corrects it at every tick
+    so that the measured speed follows a target speed ramped in the same way.
+
+    The state of the motors is kept in arrays indexed by motor (see Ramps): a tick advances only the ramps in progress,
+    without datetime arithmetic nor objects per ramp, so that it stays cheap with many motors. The constants are
+    compiled once ("set_constants").
+
+    The ramps, of the power and of the closed-loop target speed alike, follow the "motion_profile" of the constants:
+    linear, or S-curves evaluated from sample tables that are worked out once per ramp (see motion_profile).
+    """
+    def __init__(self, clock, motor_names, heartbeat_interval_in_sec=0.15, get_velocity=None):
         self.clock = clock
-        self.current_power = dict((motor_name, 0) for motor_name in motor_names)
-        self.ramp_up = dict((motor_name, None) for motor_name in motor_names)
+        self.motor_names = list(motor_names)
+        self.motor_index = dict((motor_name, index) for index, motor_name in enumerate(self.motor_names))
+        num_motors = len(self.motor_names)
+        self.epoch = clock.now()
+        self._power = array('d', [0.0] * num_motors)
+        self.power_ramps = Ramps(self._power)
+        self._target_speed = array('d', [0.0] * num_motors)  # Degrees/sec, of the closed-loop motors
+        self.speed_ramps = Ramps(self._target_speed)
+        self.get_velocity = get_velocity
+        self.closed_loop = dict((motor_name, None) for motor_name in self.motor_names)
+        self.heartbeat_interval = timedelta(seconds=heartbeat_interval_in_sec)
+        self.power_scale = 1.0  # Applied to the power when written, e.g. to compensate for the battery voltage
+        self._written_power = array('d', [NOT_WRITTEN] * num_motors)  # Last power written to the adapter (scaled)
+        self.last_write_time = None
+        self.constants = None
+        self.compiled_constants = None
+
+    def set_constants(self, constants):
+        self.constants = constants
+        self.compiled_constants = CompiledConstants(constants)
 
     def set_power_manually(self, motor_name, power):
-        self.current_power[motor_name] = power
+        index = self.motor_index[motor_name]
+        self._power[index] = power
+        self.closed_loop[motor_name] = None
+        self.speed_ramps.stop(index)
 
     def set_target_speed(self, motor_name, speed, constants):
-        assert motor_name in self.current_power, 'Invalid motor {0}'.format(motor_name)
-        self.ramp_up[motor_name] = _get_ramp_up(constants, self.current_power[motor_name], speed, self.clock.now())
+        assert motor_name in self.motor_index, 'Invalid motor {0}'.format(motor_name)
+        if constants is not self.constants and constants != self.constants:
+            # Compared by value: storage builds new constants every time they are asked for
+            self.set_constants(constants)
+        compiled = self.compiled_constants
+        index = self.motor_index[motor_name]
+        time = self._get_time(self.clock.now())
+        gains = compiled.speed_gains.get(motor_name)
+        if not compiled.speed_definitions or not gains or self.get_velocity is None:
+            self.closed_loop[motor_name] = None
+            self.speed_ramps.stop(index)
+            self.power_ramps.start(index, self._power[index], compiled.get_power(speed), compiled.power_ramp_up_per_sec,
+                                   compiled.motion_profiles, time)
+            return
+        closed_loop = self.closed_loop[motor_name]
+        if closed_loop is None:
+            # Taking over from open-loop: start from where the motor is
+            closed_loop = self.closed_loop[motor_name] = ClosedLoop(SpeedRegulator(*gains), self._power[index])
+            self._target_speed[index] = self.get_velocity(motor_name)
+        self.power_ramps.start(index, closed_loop.feedforward_power, compiled.get_power(speed), compiled.power_ramp_up_per_sec,
+                               compiled.motion_profiles, time)
+        self.speed_ramps.start(index, self._target_speed[index], compiled.get_speed(speed), compiled.speed_ramp_up_per_sec,
+                               compiled.motion_profiles, time)
 
     def stop_motor_immediately(self, motor_name):
-        assert motor_name in self.current_power, 'Invalid motor {0}'.format(motor_name)
-        self.current_power[motor_name] = 0
-        self.ramp_up[motor_name] = None
+        assert motor_name in self.motor_index, 'Invalid motor {0}'.format(motor_name)
+        index = self.motor_index[motor_name]
+        self._power[index] = 0.0
+        self.power_ramps.stop(index)
+        self.speed_ramps.stop(index)
+        self.closed_loop[motor_name] = None
 
     def get_current_power(self):
-        return self.current_power
+        return dict(zip(self.motor_names, self._power))
+
+    def get_power_ahead(self, motor_name, seconds):
+        """
+        Power the ramp of the motor will have reached in "seconds" (the current power if it is not ramping).
+        """
+        index = self.motor_index[motor_name]
+        if index not in self.power_ramps.active:
+            return self._power[index]
+        return self.power_ramps.get_value(index, self._get_time(self.clock.now()) + int(round(seconds * 1e6)))
+
+    def is_ramping(self, motor_name):
+        return self.motor_index[motor_name] in self.power_ramps.active
+
+    def set_power_scale(self, power_scale):
+        self.power_scale = power_scale
 
     def stop_all_motors(self, constants):
-        for device, power in self.current_power.items():
-            if power != 0 or self.ramp_up[device]:
-                self.set_target_speed(device, 0, constants)
+        for index, motor_name in enumerate(self.motor_names):
+            if self._power[index] != 0 or index in self.power_ramps.active:
+                self.set_target_speed(motor_name, 0, constants)
 
     # To be called periodically to drive the motors adapter
     def apply_motor_power(self, adapter):
-        for motor_name, ramp_up in list(self.ramp_up.items()):
-            if ramp_up:
-                power, completed = ramp_up.calculate_power(self.clock.now())
-                self.current_power[motor_name] = power
-                if completed:
-                    self.ramp_up[motor_name] = None
-        for motor_name, power in self.current_power.items():
-            adapter.set_motor_power(motor_name, power)
+        now = self.clock.now()
+        time = self._get_time(now)
+        ramped = self.power_ramps.advance(time)
+        self.speed_ramps.advance(time)
+        for motor_name, closed_loop in self.closed_loop.items():
+            if closed_loop:
+                index = self.motor_index[motor_name]
+                if index in ramped:
+                    closed_loop.feedforward_power = self._power[index]
+                self._regulate_speed(motor_name, index, closed_loop, now)
+        if self.last_write_time is not None and (now - self.last_write_time).total_seconds() >= COMMS_FAILSAFE_TIMEOUT_IN_SEC:
+            # Too late, the failsafe may have stopped the motors: write them all again
+            self.invalidate_written_power()
+        power_scale = self.power_scale
+        output_power = self._power if power_scale == 1.0 else [_scale_power(power, power_scale) for power in self._power]
+        written_power = self._written_power
+        changed = [index for index, power in enumerate(output_power) if written_power[index] != power]
+        if changed:
+            self._write_power(adapter, changed, output_power)
+        elif now - self.last_write_time >= self.heartbeat_interval:
+            if getattr(adapter, 'set_motors_power', None):
+                self._write_power(adapter, range(len(output_power)), output_power)
+            else:
+                self._write_power(adapter, [0], output_power)
+        else:
+            return
+        self.last_write_time = now
+
+    def _get_time(self, now):
+        return (now - self.epoch) // MICROSECOND
+
+    def _regulate_speed(self, motor_name, index, closed_loop, now):
+        if self._target_speed[index] == 0 and index not in self.speed_ramps.active and index not in self.power_ramps.active:
+            # Stopped: no regulation around zero, the motor is switched off
+            self._power[index] = 0.0
+            self.closed_loop[motor_name] = None
+            return
+        self._power[index] = closed_loop.regulator.update(self._target_speed[index], self.get_velocity(motor_name),
+                                                          closed_loop.feedforward_power, now)
+
+    def invalidate_written_power(self):
+        """
+        To be called when the adapter may have lost the power it was given (e.g. after a reset of the board).
+        """
+        for index in range(len(self._written_power)):
+            self._written_power[index] = NOT_WRITTEN
+
+    def _write_power(self, adapter, indexes, output_power):
+        power_by_motor = dict((self.motor_names[index], output_power[index]) for index in indexes)
+        set_motors_power = getattr(adapter, 'set_motors_power', None)
+        set_all_motors_power = getattr(adapter, 'set_all_motors_power', None)
+        power_values = set(power_by_motor.values())
+        if set_motors_power:
+            # The adapter groups the writes itself (e.g. per board)
+            set_motors_power(power_by_motor)
+        elif set_all_motors_power and len(power_by_motor) == len(self.motor_names) and len(power_values) == 1:
+            set_all_motors_power(power_values.pop())
+        else:
+            for motor_name, power in power_by_motor.items():
+                adapter.set_motor_power(motor_name, power)
+        for index in indexes:
+            self._written_power[index] = output_power[index]
 
 
-def _get_power_from_speed(constants, speed):
+def _scale_power(power, power_scale):
+    if power_scale == 1.0:
+        return power
+    return min(1.0, max(-1.0, power * power_scale))
+
+
+def _get_speed_definition(definitions, speed):
     if speed == 0:
         return 0.0
-    speed_to_power_map = dict((idx+1, power_value) for idx, power_value in enumerate(constants.power_definitions))
-    assert speed in speed_to_power_map or -speed in speed_to_power_map, 'Invalid speed {0}'.format(speed)
-    return speed_to_power_map[speed] if speed > 0 else -speed_to_power_map[-speed]
-
-
-def _get_ramp_up(constants, current_power, speed, now):
-    maximum_power_value = constants.power_definitions[-1]
-    power_ramp_up_per_sec = maximum_power_value / constants.ramp_up_time_from_zero_to_max_in_sec
-    target_ramp_up_power = _get_power_from_speed(constants, speed)
-    return RampUp.calculate(current_power, target_ramp_up_power, now, power_ramp_up_per_sec)
-
-
-class RampUp(object):
-    @classmethod
-    def calculate(cls, start_power, target_power, start_time, power_ramp_up_per_sec):
-        power_diff = abs(target_power - start_power)
-        if power_diff == 0:
-            return None
-        ramp_up_time_in_sec = power_diff / power_ramp_up_per_sec
-        target_time = start_time + timedelta(seconds=ramp_up_time_in_sec)
-        return cls(start_power, target_power, start_time, target_time)
-
-    def __init__(self, start_power, target_power, start_time, target_time):
-        self.start_power = start_power
-        self.target_power = target_power
-        self.start_time = start_time
-        self.target_time = target_time
-        self.power_ramp_up_per_sec = (target_power - start_power) / (target_time - start_time).total_seconds()
-
-    def calculate_power(self, now):
-        if now > self.target_time:
-            return self.target_power, True
-        elapsed_time_in_sec = (now - self.start_time).total_seconds()
-        return self.start_power + self.power_ramp_up_per_sec * elapsed_time_in_sec, False
+    assert abs(speed) in range(1, len(definitions) + 1), 'Invalid speed {0}'.format(speed)
+    value = definitions[int(abs(speed)) - 1]
+    return value if speed > 0 else -value
+
+
+class CompiledConstants(object):
+    """
+    MotorControllerConstants, with what the ramps need worked out once.
+    """
+    def __init__(self, constants):
+        self.power_definitions = tuple(constants.power_definitions)
+        self.speed_definitions = tuple(constants.speed_definitions) if constants.speed_definitions else None
+        self.speed_gains = constants.speed_gains or {}
+        self.motion_profiles = MotionProfiles(constants.motion_profile, constants.jerk_time_in_sec)
+        ramp_up_time_in_sec = constants.ramp_up_time_from_zero_to_max_in_sec
+        self.power_ramp_up_per_sec = self.power_definitions[-1] / ramp_up_time_in_sec
+        self.speed_ramp_up_per_sec = None
+        if self.speed_definitions:
+            assert len(self.speed_definitions) == len(self.power_definitions), 'One speed definition per power definition'
+            self.speed_ramp_up_per_sec = self.speed_definitions[-1] / ramp_up_time_in_sec
+
+    def get_power(self, speed):
+        return _get_speed_definition(self.power_definitions, speed)
+
+    def get_speed(self, speed):
+        return _get_speed_definition(self.speed_definitions, speed)
+
+
+class ClosedLoop(object):
+    def __init__(self, regulator, feedforward_power):
+        self.regulator = regulator
+        self.feedforward_power = feedforward_power  # What the open-loop controller would apply
+
+
+class Ramps(object):
+    """
+    Ramps of a value of each motor (e.g. the power), kept in arrays indexed by motor, and written to "values".
+
+    Times are integer microseconds since the epoch of the controller: the end of a ramp is exact, as it is with datetimes,
+    and does not drift with the rounding of floating point seconds.
+    """
+    def __init__(self, values):
+        num_motors = len(values)
+        self.values = values
+        self.active = set()  # Indexes of the motors that are ramping
+        self.start_value = array('d', [0.0] * num_motors)
+        self.target_value = array('d', [0.0] * num_motors)
+        self.start_time = array('q', [0] * num_motors)
+        self.target_time = array('q', [0] * num_motors)
+        self.slope = array('d', [0.0] * num_motors)  # Per microsecond
+        self.table = [None] * num_motors  # Sample table of the S-curve, None for a linear ramp
+
+    def start(self, index, start_value, target_value, max_rate_per_sec, motion_profiles, time):
+        diff = target_value - start_value
+        if diff == 0:
+            self.active.discard(index)
+            return
+        ramp_time_in_sec, self.table[index] = motion_profiles.get_ramp(start_value, target_value, max_rate_per_sec)
+        duration = max(1, int(round(ramp_time_in_sec * 1e6)))
+        self.start_value[index] = start_value
+        self.target_value[index] = target_value
+        self.start_time[index] = time
+        self.target_time[index] = time + duration
+        self.slope[index] = diff / duration
+        self.active.add(index)
+
+    def stop(self, index):
+        self.active.discard(index)
+
+    def get_value(self, index, time):
+        if time > self.target_time[index]:
+            return self.target_value[index]
+        fraction = (time - self.start_time[index]) / (self.target_time[index] - self.start_time[index])
+        if self.table[index] is not None:
+            fraction = interpolate(self.table[index], fraction)
+        return self.start_value[index] + (self.target_value[index] - self.start_value[index]) * fraction
 
+    def advance(self, time):
+        """
+        Updates the values of all the motors that are ramping. Returns the indexes of those motors.
+        """
+        active = list(self.active)
+        values, start_value, target_value = self.values, self.start_value, self.target_value
+        start_time, target_time, slope, table = self.start_time, self.target_time, self.slope, self.table
+        for index in active:
+            if time > target_time[index]:
+                values[index] = target_value[index]
+                self.active.discard(index)
+            elif table[index] is None:
+                values[index] = start_value[index] + slope[index] * (time - start_time[index])
+            else:
+                fraction = (time - start_time[index]) / (target_time[index] - start_time[index])
+                values[index] = start_value[index] + (target_value[index] - start_value[index]) * interpolate(table[index], fraction)
+        return active
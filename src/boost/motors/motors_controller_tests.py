@@ -76,3 +76,239 @@ class MotorsControllerTestSuite(unittest.TestCase):
         self.clock.add(timedelta(seconds=1))
         self.controller.apply_motor_power(self)
         self.assertEqual(self.motor_power, {'A': 1.0, 'B': -1.0})
+
+    def test_many_motors(self):
+        motor_names = ['M{0}'.format(idx) for idx in range(40)]
+        controller = MotorsController(self.clock, motor_names)
+        for idx, motor_name in enumerate(motor_names):
+            controller.set_target_speed(motor_name, idx % 5 + 1 if idx % 2 else -(idx % 5 + 1), self.constants)
+        self.assertTrue(controller.is_ramping('M1'))
+        self.clock.add(timedelta(seconds=0.1))
+        controller.apply_motor_power(self)
+        self.assertAlmostEqual(self.motor_power['M1'], 0.1)
+        self.assertAlmostEqual(self.motor_power['M2'], -0.1)
+        self.assertAlmostEqual(self.motor_power['M9'], 0.1)
+        self.clock.add(timedelta(seconds=1))
+        controller.apply_motor_power(self)
+        self.assertEqual(self.motor_power['M4'], -1.0)
+        self.assertEqual(self.motor_power['M5'], 0.2)
+        self.assertEqual(self.motor_power['M39'], 1.0)
+        self.assertFalse(controller.is_ramping('M1'))
+        controller.stop_motor_immediately('M39')
+        self.assertEqual(controller.get_current_power()['M39'], 0)
+
+    def test_s_curve_ramp(self):
+        constants = MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 1.0, motion_profile='s_curve', jerk_time_in_sec=0.2)
+        self.controller.set_target_speed('A', 5, constants)
+        # Takes a jerk time longer than the linear ramp, and starts gently
+        self.clock.add(timedelta(seconds=0.1))
+        self.controller.apply_motor_power(self)
+        self.assertAlmostEqual(self.motor_power['A'], 0.025, delta=0.001)
+        self.clock.add(timedelta(seconds=0.5))
+        self.controller.apply_motor_power(self)
+        self.assertAlmostEqual(self.motor_power['A'], 0.5)
+        self.clock.add(timedelta(seconds=0.6))
+        self.controller.apply_motor_power(self)
+        self.assertEqual(self.motor_power['A'], 1.0)
+        self.assertTrue(self.controller.is_ramping('A'))
+        self.clock.add(timedelta(milliseconds=1))
+        self.controller.apply_motor_power(self)
+        self.assertFalse(self.controller.is_ramping('A'))
+
+    def test_power_ahead(self):
+        self.assertEqual(self.controller.get_power_ahead('A', 0.5), 0.0)
+        self.controller.set_target_speed('A', 5, self.constants)
+        self.clock.add(timedelta(seconds=0.25))
+        self.controller.apply_motor_power(self)
+        self.assertAlmostEqual(self.controller.get_power_ahead('A', 0.5), 0.75)
+        self.assertEqual(self.controller.get_power_ahead('A', 2.0), 1.0)
+        self.assertAlmostEqual(self.controller.get_current_power()['A'], 0.25)
+
+    def test_constants_are_compiled_once(self):
+        self.controller.set_target_speed('A', 5, self.constants)
+        compiled_constants = self.controller.compiled_constants
+        self.controller.set_target_speed('B', 5, MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 1.0))
+        self.assertIs(self.controller.compiled_constants, compiled_constants)
+        self.controller.set_target_speed('B', 5, MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 2.0))
+        self.assertIsNot(self.controller.compiled_constants, compiled_constants)
+
+    def test_invalid_speed(self):
+        with self.assertRaises(AssertionError):
+            self.controller.set_target_speed('A', 6, self.constants)
+
+
+class RecordingMotorsAdapter(object):
+    def __init__(self):
+        self.writes = []
+
+    def set_motor_power(self, motor, power):
+        self.writes.append((motor, power))
+
+    def set_all_motors_power(self, power):
+        self.writes.append(('ALL', power))
+
+
+class MotorsControllerWritesTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.controller = MotorsController(self.clock, ['A', 'B'], heartbeat_interval_in_sec=0.15)
+        self.adapter = RecordingMotorsAdapter()
+
+    def tick(self, ms=50):
+        self.clock.add(timedelta(milliseconds=ms))
+        self.controller.apply_motor_power(self.adapter)
+        writes = self.adapter.writes
+        self.adapter.writes = []
+        return writes
+
+    def test_writes_only_on_change(self):
+        self.assertEqual(self.tick(), [('ALL', 0)])
+        self.assertEqual(self.tick(), [])
+        self.controller.set_power_manually('A', 0.5)
+        self.assertEqual(self.tick(), [('A', 0.5)])
+        self.assertEqual(self.tick(), [])
+        self.controller.set_power_manually('A', 0.7)
+        self.controller.set_power_manually('B', -0.7)
+        self.assertEqual(self.tick(), [('A', 0.7), ('B', -0.7)])
+        self.controller.set_power_manually('A', 0)
+        self.controller.set_power_manually('B', 0)
+        self.assertEqual(self.tick(), [('ALL', 0)])
+
+    def test_heartbeat_before_the_failsafe(self):
+        self.controller.set_power_manually('B', 0.5)
+        self.assertEqual(self.tick(), [('A', 0), ('B', 0.5)])
+        self.assertEqual(self.tick(), [])
+        self.assertEqual(self.tick(), [])
+        self.assertEqual(self.tick(), [('A', 0)])
+        self.assertEqual(self.tick(), [])
+
+    def test_rewrites_all_when_late(self):
+        self.controller.set_power_manually('B', 0.5)
+        self.tick()
+        # The loop stalled longer than the failsafe timeout: the board may have stopped the motors
+        self.assertEqual(self.tick(300), [('A', 0), ('B', 0.5)])
+
+    def test_adapters_without_combined_writes(self):
+        self.adapter.set_all_motors_power = None
+        self.assertEqual(self.tick(), [('A', 0), ('B', 0)])
+
+    def test_power_scale(self):
+        self.controller.set_power_manually('A', 0.5)
+        self.controller.set_power_manually('B', -0.8)
+        self.assertEqual(self.tick(), [('A', 0.5), ('B', -0.8)])
+        self.controller.set_power_scale(1.5)
+        self.assertEqual(self.tick(), [('A', 0.75), ('B', -1.0)])
+        self.assertEqual(self.controller.get_current_power(), {'A': 0.5, 'B': -0.8})
+        self.assertEqual(self.tick(), [])
+
+
+class FakeMotor(object):
+    """
+    First order response to the power, at "efficiency" of the nominal 360 degrees/sec at full power.
+    """
+    def __init__(self, efficiency, time_constant_in_sec=0.1):
+        self.efficiency = efficiency
+        self.time_constant_in_sec = time_constant_in_sec
+        self.velocity = 0.0
+
+    def step(self, power, dt):
+        target_velocity = 360.0 * self.efficiency * power
+        self.velocity += (target_velocity - self.velocity) * min(1.0, dt / self.time_constant_in_sec)
+
+
+class MotorsControllerClosedLoopTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.constants = MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.5, [72.0, 144.0, 216.0, 288.0, 360.0], {'A': [0.002, 0.01, 0.0]})
+        self.motors = {'A': FakeMotor(0.7), 'B': FakeMotor(0.7)}
+        self.controller = MotorsController(self.clock, ['A', 'B'], get_velocity=lambda motor: self.motors[motor].velocity)
+        self.adapter = RecordingMotorsAdapter()
+
+    def run_for(self, seconds, dt=0.02):
+        for _ in range(int(round(seconds / dt))):
+            self.clock.add(timedelta(seconds=dt))
+            self.controller.apply_motor_power(self.adapter)
+            for motor_name, motor in self.motors.items():
+                motor.step(self.controller.get_current_power()[motor_name], dt)
+
+    def test_reaches_the_target_speed_despite_the_load(self):
+        self.controller.set_target_speed('A', 3, self.constants)
+        self.controller.set_target_speed('B', 3, self.constants)
+        self.run_for(5)
+        self.assertAlmostEqual(self.motors['A'].velocity, 216.0, delta=2.0)
+        # B has no gains: open-loop, slower than asked
+        self.assertAlmostEqual(self.motors['B'].velocity, 216.0 * 0.7, delta=2.0)
+        self.assertGreater(self.controller.get_current_power()['A'], 0.6)
+
+    def test_reverse_and_stop(self):
+        self.controller.set_target_speed('A', -2, self.constants)
+        self.run_for(5)
+        self.assertAlmostEqual(self.motors['A'].velocity, -144.0, delta=2.0)
+        self.controller.set_target_speed('A', 0, self.constants)
+        self.run_for(0.1)
+        self.assertLess(self.controller.get_current_power()['A'], 0)  # Still ramping down
+        self.run_for(0.2)
+        self.assertEqual(self.controller.get_current_power()['A'], 0)
+        self.assertIsNone(self.controller.closed_loop['A'])
+
+    def test_anti_windup(self):
+        # Far too weak to ever reach the target: the output saturates, and the integral must not keep growing
+        self.motors['A'].efficiency = 0.3
+        self.controller.set_target_speed('A', 5, self.constants)
+        self.run_for(5)
+        self.assertEqual(self.controller.get_current_power()['A'], 1.0)
+        self.motors['A'].efficiency = 1.0
+        self.controller.set_target_speed('A', 3, self.constants)
+        self.run_for(0.5)
+        # Without anti-windup, the accumulated integral would keep the power at the maximum for a long time
+        self.assertLess(self.controller.get_current_power()['A'], 0.9)
+        self.run_for(5)
+        self.assertAlmostEqual(self.motors['A'].velocity, 216.0, delta=2.0)
+
+    def test_s_curve_target_speed(self):
+        constants = self.constants._replace(motion_profile='s_curve', jerk_time_in_sec=0.2)
+        self.controller.set_target_speed('A', 5, constants)
+        self.run_for(0.1)
+        # 720 degrees/sec^2 at most, reached in 0.2 sec: 3600 * 0.1^2 / 2 degrees/sec after 0.1 sec (72 if linear)
+        self.assertAlmostEqual(self.controller._target_speed[0], 18.0, delta=0.5)
+        self.run_for(5)
+        self.assertAlmostEqual(self.motors['A'].velocity, 360.0 * 0.7, delta=2.0)  # Saturated at full power
+
+    def test_manual_power_leaves_closed_loop(self):
+        self.controller.set_target_speed('A', 3, self.constants)
+        self.run_for(1)
+        self.controller.set_power_manually('A', 0.1)
+        self.run_for(1)
+        self.assertEqual(self.controller.get_current_power()['A'], 0.1)
+
+
+
+class GroupingMotorsAdapter(RecordingMotorsAdapter):
+    def set_motors_power(self, power_by_motor):
+        self.writes.append(('GROUP', power_by_motor))
+
+
+class MotorsControllerGroupedWritesTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.controller = MotorsController(self.clock, ['A', 'B', 'C'], heartbeat_interval_in_sec=0.15)
+        self.adapter = GroupingMotorsAdapter()
+
+    def tick(self, ms=50):
+        self.clock.add(timedelta(milliseconds=ms))
+        self.controller.apply_motor_power(self.adapter)
+        writes = self.adapter.writes
+        self.adapter.writes = []
+        return writes
+
+    def test_changes_of_a_tick_in_one_call(self):
+        self.assertEqual(self.tick(), [('GROUP', {'A': 0, 'B': 0, 'C': 0})])
+        self.controller.set_power_manually('A', 0.5)
+        self.controller.set_power_manually('C', 0.5)
+        self.assertEqual(self.tick(), [('GROUP', {'A': 0.5, 'C': 0.5})])
+
+    def test_heartbeat_writes_all_the_motors(self):
+        self.tick()
+        self.assertEqual(self.tick(), [])
+        self.assertEqual(self.tick(), [])
+        self.assertEqual(self.tick(), [('GROUP', {'A': 0, 'B': 0, 'C': 0})])
@@ -0,0 +1,89 @@
+from collections import namedtuple
+from datetime import timedelta
+
+
+# Last readings from the motors board, each with the time it was taken (None if never read):
+#  - faulty: drive fault flag of any motor
+#  - battery_voltage: as read, not smoothed
+#  - motor_levels: motor -> power the board is actually applying
+MotorsHealth = namedtuple('MotorsHealth', 'faulty faulty_time battery_voltage battery_voltage_time motor_levels motor_levels_time')
+
+# Adapter method of each reading -> seconds between two reads
+DEFAULT_POLL_INTERVALS_IN_SEC = {
+    'is_faulty': 0.5,
+    'get_voltage_reading': 2.0,
+    'get_motor_levels': 1.0,
+}
+
+
+class MotorsHealthMonitor(object):
+    """
+    Low-priority poller of the health of the motors board, with the readings cached.
+
+    Each call to "poll" reads at most one value, the most overdue one, so that the bus time spent on health is bounded
+    by how often "poll" is called. With a MotorsWorker in front of the board, the reads are served only when no power is
+    waiting to be written: "poll" gets the value the worker read last, with the time it was actually read, and the
+    worker reads a fresh one for the next time.
+
+    With a "nominal_voltage", the power can be compensated for the battery (see "get_power_scale"): the power that gives
+    a speed at the nominal voltage is scaled up as the battery sags, so that a speed value keeps the same rotation rate.
+    """
+    def __init__(self, adapter, clock, poll_intervals_in_sec=None, nominal_voltage=None, voltage_smoothing=0.2,
+                 power_scale_range=(0.5, 2.0)):
+        self.adapter = adapter
+        self.clock = clock
+        self.poll_intervals_in_sec = poll_intervals_in_sec or DEFAULT_POLL_INTERVALS_IN_SEC
+        self.nominal_voltage = nominal_voltage
+        self.voltage_smoothing = voltage_smoothing  # Weight of a new reading in the smoothed voltage
+        self.power_scale_range = power_scale_range
+        self.readings = dict((reading, None) for reading in self.poll_intervals_in_sec)
+        self.reading_times = dict((reading, None) for reading in self.poll_intervals_in_sec)
+        self.next_due_times = dict((reading, None) for reading in self.poll_intervals_in_sec)  # None: due now
+        self.smoothed_voltage = None
+
+    def poll(self):
+        """
+        Reads the most overdue value, if any is due. Returns the name of the reading, or None.
+        """
+        now = self.clock.now()
+        due_reading = None
+        max_overdue = None
+        for reading, next_due_time in self.next_due_times.items():
+            overdue = float('inf') if next_due_time is None else (now - next_due_time).total_seconds()
+            if overdue >= 0 and (max_overdue is None or overdue > max_overdue):
+                due_reading, max_overdue = reading, overdue
+        if due_reading is None:
+            return None
+        # On a fixed schedule: a read delayed by the others does not delay the next ones
+        interval = timedelta(seconds=self.poll_intervals_in_sec[due_reading])
+        next_due_time = (self.next_due_times[due_reading] or now) + interval
+        self.next_due_times[due_reading] = next_due_time if next_due_time > now else now + interval
+        get_timed_reading = getattr(self.adapter, 'get_timed_reading', None)
+        if get_timed_reading:
+            value, read_time = get_timed_reading(due_reading)
+        else:
+            value, read_time = getattr(self.adapter, due_reading)(), now
+        if read_time is None or read_time == self.reading_times[due_reading]:
+            return due_reading  # Nothing read since the last time
+        self.readings[due_reading] = value
+        self.reading_times[due_reading] = read_time
+        if due_reading == 'get_voltage_reading' and value:
+            if self.smoothed_voltage is None:
+                self.smoothed_voltage = value
+            else:
+                self.smoothed_voltage += (value - self.smoothed_voltage) * self.voltage_smoothing
+        return due_reading
+
+    def get_health(self):
+        return MotorsHealth(self.readings.get('is_faulty'), self.reading_times.get('is_faulty'),
+                            self.readings.get('get_voltage_reading'), self.reading_times.get('get_voltage_reading'),
+                            self.readings.get('get_motor_levels'), self.reading_times.get('get_motor_levels'))
+
+    def get_power_scale(self):
+        """
+        Factor to apply to the power for the current battery voltage (1.0 without a nominal voltage, or a reading).
+        """
+        if not self.nominal_voltage or not self.smoothed_voltage:
+            return 1.0
+        min_scale, max_scale = self.power_scale_range
+        return min(max_scale, max(min_scale, self.nominal_voltage / self.smoothed_voltage))
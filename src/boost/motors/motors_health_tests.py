@@ -0,0 +1,134 @@
+import unittest
+from datetime import datetime, timedelta
+from .motors_health import MotorsHealthMonitor
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class FakeMotorsAdapter(object):
+    def __init__(self):
+        self.reads = []
+        self.faulty = False
+        self.voltage = 12.0
+
+    def is_faulty(self):
+        self.reads.append('is_faulty')
+        return self.faulty
+
+    def get_voltage_reading(self):
+        self.reads.append('get_voltage_reading')
+        return self.voltage
+
+    def get_motor_levels(self):
+        self.reads.append('get_motor_levels')
+        return {'A': 0.5, 'B': 0.0}
+
+
+class MotorsHealthMonitorTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.adapter = FakeMotorsAdapter()
+        self.monitor = MotorsHealthMonitor(self.adapter, self.clock, nominal_voltage=12.0, voltage_smoothing=0.5)
+
+    def poll_for(self, seconds, every_ms=100):
+        for _ in range(int(seconds * 1000 / every_ms)):
+            self.clock.add(timedelta(milliseconds=every_ms))
+            self.monitor.poll()
+
+    def test_one_reading_per_poll(self):
+        self.assertIsNotNone(self.monitor.poll())
+        self.assertIsNotNone(self.monitor.poll())
+        self.assertIsNotNone(self.monitor.poll())
+        self.assertEqual(sorted(self.adapter.reads), ['get_motor_levels', 'get_voltage_reading', 'is_faulty'])
+        self.assertIsNone(self.monitor.poll())
+        del self.adapter.reads[:]
+        self.poll_for(4.3)
+        # Every 0.5, 2 and 1 seconds (the last ones due at the same time, at 4 seconds, are read one after the other)
+        self.assertEqual(self.adapter.reads.count('is_faulty'), 8)
+        self.assertEqual(self.adapter.reads.count('get_voltage_reading'), 2)
+        self.assertEqual(self.adapter.reads.count('get_motor_levels'), 4)
+
+    def test_cached_readings(self):
+        self.poll_for(1.0)
+        health = self.monitor.get_health()
+        self.assertFalse(health.faulty)
+        self.assertEqual(health.battery_voltage, 12.0)
+        self.assertEqual(health.motor_levels, {'A': 0.5, 'B': 0.0})
+        self.adapter.faulty = True
+        self.poll_for(0.5)
+        health = self.monitor.get_health()
+        self.assertTrue(health.faulty)
+        self.assertGreater(health.faulty_time, health.battery_voltage_time)
+
+    def test_power_scale(self):
+        self.assertEqual(self.monitor.get_power_scale(), 1.0)  # No reading yet
+        self.poll_for(0.3)
+        self.assertEqual(self.monitor.get_power_scale(), 1.0)
+        self.adapter.voltage = 8.0
+        self.poll_for(2.0)
+        self.assertAlmostEqual(self.monitor.get_power_scale(), 12.0 / 10.0)  # Smoothed
+        self.poll_for(20.0)
+        self.assertAlmostEqual(self.monitor.get_power_scale(), 12.0 / 8.0, places=2)
+        self.adapter.voltage = 3.0
+        self.poll_for(20.0)
+        self.assertEqual(self.monitor.get_power_scale(), 2.0)
+
+    def test_no_compensation_without_nominal_voltage(self):
+        monitor = MotorsHealthMonitor(self.adapter, self.clock)
+        monitor.poll()
+        monitor.poll()
+        self.assertEqual(monitor.get_power_scale(), 1.0)
+
+
+class CachingMotorsAdapter(object):
+    """
+    Readings as a MotorsWorker serves them: the last value read, with the time it was read.
+    """
+    def __init__(self, read_time):
+        self.timed_readings = {
+            'is_faulty': (False, read_time),
+            'get_voltage_reading': (12.0, read_time),
+            'get_motor_levels': (None, None),  # Never read
+        }
+
+    def get_timed_reading(self, reading):
+        return self.timed_readings[reading]
+
+
+class MotorsHealthMonitorWithCachedReadingsTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.read_time = self.clock.now() - timedelta(seconds=3)
+        self.adapter = CachingMotorsAdapter(self.read_time)
+        self.monitor = MotorsHealthMonitor(self.adapter, self.clock, nominal_voltage=12.0, voltage_smoothing=0.5)
+
+    def test_readings_keep_the_time_they_were_read(self):
+        for _ in range(3):
+            self.monitor.poll()
+        health = self.monitor.get_health()
+        self.assertEqual(health.faulty_time, self.read_time)
+        self.assertEqual(health.battery_voltage_time, self.read_time)
+        self.assertIsNone(health.motor_levels_time)
+
+    def test_a_stale_voltage_is_not_smoothed_in_again(self):
+        for _ in range(3):
+            self.monitor.poll()
+        self.assertEqual(self.monitor.get_power_scale(), 1.0)
+        # Same reading as before, with a value that could not have been read then
+        self.adapter.timed_readings['get_voltage_reading'] = (6.0, self.read_time)
+        self.clock.add(timedelta(seconds=2))
+        self.assertIn('get_voltage_reading', [self.monitor.poll() for _ in range(3)])
+        self.assertEqual(self.monitor.get_power_scale(), 1.0)
+        self.adapter.timed_readings['get_voltage_reading'] = (8.0, self.clock.now())
+        self.clock.add(timedelta(seconds=2))
+        self.assertIn('get_voltage_reading', [self.monitor.poll() for _ in range(3)])
+        self.assertAlmostEqual(self.monitor.get_power_scale(), 12.0 / 10.0)
@@ -12,9 +12,15 @@ class MockMotorsAdapter(object):
     def get_voltage_reading(self):
         return 12.0
 
+    def get_motor_levels(self):
+        return {}
+
     def set_motor_power(self, motor, power):
         pass
 
+    def set_all_motors_power(self, power):
+        pass
+
     def stop(self):
         pass
 
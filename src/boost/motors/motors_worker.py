@@ -0,0 +1,133 @@
+from collections import deque
+import threading
+from ..clock import Clock
+
+
+# Readings polled in the background, with the adapter method that reads them
+READINGS = ('is_faulty', 'get_voltage_reading', 'get_motor_levels')
+
+
+class MotorsWorker(object):
+    """
+    Motors adapter that moves the I2C traffic of another adapter to a dedicated thread, so that the asyncio loop never
+    blocks on the bus.
+
+    Power is handed over through latest-value-wins mailboxes, one per motor (plus one for all the motors together): a
+    setpoint that was not written yet is replaced by the new one instead of being queued behind it. Readings (drive
+    faults, battery, motor levels) are a low-priority queue, served only when no power is waiting to be written: the
+    reading methods return the last value read, and ask for a fresh one ("get_timed_reading" also tells when the value
+    was read).
+    """
+    def __init__(self, adapter, log_message, clock=None):
+        self.adapter = adapter
+        self.log_message = log_message
+        self.clock = clock or Clock()
+        self.num_calls = 0  # Adapter calls made on the thread
+        self.num_overwritten = 0  # Setpoints replaced before they were written
+        self.num_errors = 0
+        self._condition = threading.Condition()
+        self._motor_mailboxes = {}  # motor -> power not written yet
+        self._all_motors_mailbox = None
+        self._read_requests = deque()
+        self._readings = dict((reading, (None, None)) for reading in READINGS)  # reading -> (value, read time)
+        self._running = False
+        self._thread = None
+
+    def initialize(self):
+        # Before the thread starts: nothing else is using the adapter
+        if not self.adapter.initialize():
+            return False
+        for reading in READINGS:
+            self._readings[reading] = (getattr(self.adapter, reading)(), self.clock.now())
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='motors-io', daemon=True)
+        self._thread.start()
+        return True
+
+    def set_motor_power(self, motor, power):
+        with self._condition:
+            if motor in self._motor_mailboxes:
+                self.num_overwritten += 1
+            self._motor_mailboxes[motor] = power
+            self._condition.notify()
+
+    def set_motors_power(self, power_by_motor):
+        with self._condition:
+            for motor, power in power_by_motor.items():
+                if motor in self._motor_mailboxes:
+                    self.num_overwritten += 1
+                self._motor_mailboxes[motor] = power
+            self._condition.notify()
+
+    def set_all_motors_power(self, power):
+        with self._condition:
+            if self._all_motors_mailbox is not None:
+                self.num_overwritten += 1
+            self.num_overwritten += len(self._motor_mailboxes)
+            # Older setpoints of single motors are superseded
+            self._motor_mailboxes.clear()
+            self._all_motors_mailbox = power
+            self._condition.notify()
+
+    def is_faulty(self):
+        return self.get_timed_reading('is_faulty')[0]
+
+    def get_voltage_reading(self):
+        return self.get_timed_reading('get_voltage_reading')[0]
+
+    def get_motor_levels(self):
+        return self.get_timed_reading('get_motor_levels')[0]
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._motor_mailboxes.clear()
+            self._all_motors_mailbox = None
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.adapter.stop()
+
+    def get_timed_reading(self, reading):
+        """
+        Returns the last value of the reading and when it was read (None if never), and asks for a fresh one.
+        """
+        with self._condition:
+            if reading not in self._read_requests:
+                self._read_requests.append(reading)
+                self._condition.notify()
+            return self._readings[reading]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._all_motors_mailbox is None and not self._motor_mailboxes and not self._read_requests:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                all_motors_power, self._all_motors_mailbox = self._all_motors_mailbox, None
+                motor_power, self._motor_mailboxes = self._motor_mailboxes, {}
+                reading = self._read_requests.popleft() if all_motors_power is None and not motor_power and self._read_requests else None
+            # The bus is used out of the lock: new setpoints keep landing in the mailboxes meanwhile
+            if all_motors_power is not None:
+                self._call(self.adapter.set_all_motors_power, all_motors_power)
+            if motor_power and hasattr(self.adapter, 'set_motors_power'):
+                self._call(self.adapter.set_motors_power, motor_power)
+            else:
+                for motor, power in motor_power.items():
+                    self._call(self.adapter.set_motor_power, motor, power)
+            if reading:
+                value = self._call(getattr(self.adapter, reading))
+                read_time = self.clock.now()
+                with self._condition:
+                    self._readings[reading] = (value, read_time)
+
+    def _call(self, method, *args):
+        try:
+            result = method(*args)
+            self.num_calls += 1
+            return result
+        except Exception as e:
+            self.num_errors += 1
+            self.log_message('Motors I/O error: {0}'.format(e))
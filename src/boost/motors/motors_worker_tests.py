@@ -0,0 +1,136 @@
+import unittest
+import threading
+from .motors_worker import MotorsWorker
+
+
+class BlockingAdapter(object):
+    """
+    Records the calls, and blocks on the bus until "release" (when "blocking").
+    """
+    def __init__(self):
+        self.calls = []
+        self.blocking = False
+        self.in_call = threading.Event()
+        self.released = threading.Event()
+        self.faulty = False
+        self.voltage = 12.0
+
+    def initialize(self):
+        return True
+
+    def _bus(self, call):
+        self.calls.append(call)
+        if self.blocking:
+            self.in_call.set()
+            self.released.wait()
+            self.released.clear()
+
+    def set_motor_power(self, motor, power):
+        self._bus(('set_motor_power', motor, power))
+
+    def set_all_motors_power(self, power):
+        self._bus(('set_all_motors_power', power))
+
+    def is_faulty(self):
+        self._bus(('is_faulty',))
+        return self.faulty
+
+    def get_voltage_reading(self):
+        self._bus(('get_voltage_reading',))
+        return self.voltage
+
+    def get_motor_levels(self):
+        self._bus(('get_motor_levels',))
+        return {'A': 0.0, 'B': 0.0}
+
+    def stop(self):
+        self.calls.append(('stop',))
+
+
+class MotorsWorkerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.adapter = BlockingAdapter()
+        self.messages = []
+        self.worker = MotorsWorker(self.adapter, self.messages.append)
+        self.assertTrue(self.worker.initialize())
+        del self.adapter.calls[:]
+
+    def tearDown(self):
+        self.adapter.blocking = False
+        self.adapter.released.set()
+        self.worker.stop()
+
+    def wait_until_idle(self):
+        for _ in range(1000):
+            with self.worker._condition:
+                if not self.worker._motor_mailboxes and self.worker._all_motors_mailbox is None and not self.worker._read_requests:
+                    break
+            threading.Event().wait(0.001)
+        threading.Event().wait(0.01)
+
+    def test_writes_on_the_thread(self):
+        self.worker.set_motor_power('A', 0.5)
+        self.wait_until_idle()
+        self.assertEqual(self.adapter.calls, [('set_motor_power', 'A', 0.5)])
+
+    def test_stale_setpoints_are_overwritten(self):
+        self.adapter.blocking = True
+        self.worker.set_motor_power('B', 0.1)
+        self.assertTrue(self.adapter.in_call.wait(1))
+        # The bus is stuck: these do not block, and only the last value of each motor is kept
+        for power in (0.2, 0.3, 0.4):
+            self.worker.set_motor_power('A', power)
+        self.worker.set_motor_power('B', -0.2)
+        self.assertEqual(self.worker.num_overwritten, 2)
+        self.adapter.blocking = False
+        self.adapter.released.set()
+        self.wait_until_idle()
+        self.assertEqual(self.adapter.calls[0], ('set_motor_power', 'B', 0.1))
+        self.assertEqual(sorted(self.adapter.calls[1:]), [('set_motor_power', 'A', 0.4), ('set_motor_power', 'B', -0.2)])
+
+    def test_all_motors_supersedes_older_single_motor_setpoints(self):
+        self.adapter.blocking = True
+        self.worker.set_motor_power('B', 0.1)
+        self.assertTrue(self.adapter.in_call.wait(1))
+        self.worker.set_motor_power('A', 0.2)
+        self.worker.set_all_motors_power(0.0)
+        self.worker.set_motor_power('B', 0.3)
+        self.adapter.blocking = False
+        self.adapter.released.set()
+        self.wait_until_idle()
+        self.assertEqual(self.adapter.calls[1:], [('set_all_motors_power', 0.0), ('set_motor_power', 'B', 0.3)])
+
+    def test_readings_are_cached_and_refreshed(self):
+        self.assertFalse(self.worker.is_faulty())  # Read by "initialize"
+        self.adapter.faulty = True
+        self.adapter.voltage = 11.0
+        self.assertEqual(self.worker.get_voltage_reading(), 12.0)
+        self.worker.is_faulty()
+        self.wait_until_idle()
+        self.assertTrue(self.worker.is_faulty())
+        self.assertEqual(self.worker.get_voltage_reading(), 11.0)
+
+    def test_readings_tell_when_they_were_read(self):
+        value, initial_read_time = self.worker.get_timed_reading('get_voltage_reading')
+        self.assertEqual(value, 12.0)
+        self.adapter.voltage = 11.0
+        self.wait_until_idle()
+        value, read_time = self.worker.get_timed_reading('get_voltage_reading')
+        self.assertEqual(value, 11.0)
+        self.assertGreater(read_time, initial_read_time)
+
+    def test_readings_wait_for_the_setpoints(self):
+        self.adapter.blocking = True
+        self.worker.set_motor_power('A', 0.1)
+        self.assertTrue(self.adapter.in_call.wait(1))
+        self.worker.is_faulty()
+        self.worker.set_motor_power('A', 0.2)
+        self.adapter.blocking = False
+        self.adapter.released.set()
+        self.wait_until_idle()
+        self.assertEqual(self.adapter.calls[1:], [('set_motor_power', 'A', 0.2), ('is_faulty',)])
+
+    def test_stop(self):
+        self.worker.stop()
+        self.assertEqual(self.adapter.calls[-1], ('stop',))
+        self.assertIsNone(self.worker._thread)
@@ -0,0 +1,37 @@
+class SpeedRegulator(object):
+    """
+    PID regulator of the speed of one motor (degrees/sec), on top of a feed-forward power.
+
+    The feed-forward power is what the open-loop controller would apply, the regulator only corrects for what makes the
+    actual speed drift from it (battery voltage, friction, load). The derivative is taken on the measured speed, so that
+    a change of target does not kick the output. Anti-windup: the integral stops growing while the output is saturated
+    in the direction of the error, and is clamped to what the output range can use.
+    """
+    def __init__(self, kp, ki, kd, max_power=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_power = max_power
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_speed = None
+        self.last_time = None
+
+    def update(self, target_speed, speed, feedforward_power, now):
+        error = target_speed - speed
+        dt = (now - self.last_time).total_seconds() if self.last_time is not None else 0.0
+        derivative = (speed - self.last_speed) / dt if dt > 0 else 0.0
+        self.last_speed = speed
+        self.last_time = now
+
+        power = feedforward_power + self.kp * error + self.ki * self.integral - self.kd * derivative
+        saturated_up = power >= self.max_power and error > 0
+        saturated_down = power <= -self.max_power and error < 0
+        if self.ki and dt > 0 and not saturated_up and not saturated_down:
+            self.integral += error * dt
+            integral_limit = 2 * self.max_power / abs(self.ki)
+            self.integral = min(integral_limit, max(-integral_limit, self.integral))
+            power = feedforward_power + self.kp * error + self.ki * self.integral - self.kd * derivative
+        return min(self.max_power, max(-self.max_power, power))
@@ -0,0 +1,147 @@
+import time
+
+from boost.motors import ThunderBorg as TB
+
+
+FAILSAFE_TIMEOUT_IN_SEC = 0.25
+
+
+class ThunderBorgEmulator(object):
+    """
+    In-process emulation of the registers of a ThunderBorg board, behind the same "write" / "write_read" methods as an
+    I2CDevice: plugged into an I2CTransport, the driver and ThunderBorgAdapter run unchanged without the board.
+
+    Emulated: motor drive levels (single and all motors, all off), communications failsafe, drive faults, battery reading
+    and limits, LEDs, board identifier. With the failsafe enabled, the motors are switched off when no command is received
+    for a quarter of a second, as on the board.
+    "num_corrupt_replies" replies from now on will not echo the command, to exercise the retries.
+    """
+    def __init__(self, monotonic=time.monotonic, battery_voltage=12.0):
+        self.monotonic = monotonic
+        self.battery_voltage = battery_voltage
+        self.motor_levels = {'A': (TB.COMMAND_VALUE_FWD, 0), 'B': (TB.COMMAND_VALUE_FWD, 0)}  # (direction, pwm)
+        self.drive_faults = {'A': False, 'B': False}
+        self.failsafe = False
+        self.battery_limits = (0, 0xFF)
+        self.leds = {1: (0, 0, 0), 2: (0, 0, 0)}
+        self.led_show_battery = False
+        self.num_corrupt_replies = 0
+        self.num_writes = 0
+        self.num_reads = 0
+        self.last_command_time = self.monotonic()
+
+    def get_motor_power(self, motor):
+        self._check_failsafe()
+        direction, pwm = self.motor_levels[motor]
+        power = pwm / float(TB.PWM_MAX)
+        return -power if direction == TB.COMMAND_VALUE_REV else power
+
+    def write(self, write_buffer, write_length):
+        self.num_writes += 1
+        self._check_failsafe()
+        command = write_buffer[0]
+        data = write_buffer[1:write_length]
+        if command in (TB.COMMAND_SET_A_FWD, TB.COMMAND_SET_A_REV):
+            self._set_motor('A', command == TB.COMMAND_SET_A_REV, data)
+        elif command in (TB.COMMAND_SET_B_FWD, TB.COMMAND_SET_B_REV):
+            self._set_motor('B', command == TB.COMMAND_SET_B_REV, data)
+        elif command in (TB.COMMAND_SET_ALL_FWD, TB.COMMAND_SET_ALL_REV):
+            self._set_motor('A', command == TB.COMMAND_SET_ALL_REV, data)
+            self._set_motor('B', command == TB.COMMAND_SET_ALL_REV, data)
+        elif command == TB.COMMAND_ALL_OFF:
+            self._motors_off()
+        elif command == TB.COMMAND_SET_FAILSAFE:
+            self.failsafe = self._data_byte(data) != TB.COMMAND_VALUE_OFF
+        elif command == TB.COMMAND_SET_BATT_LIMITS:
+            self.battery_limits = (self._data_byte(data, 0), self._data_byte(data, 1))
+        elif command in (TB.COMMAND_SET_LED1, TB.COMMAND_SET_LED2, TB.COMMAND_SET_LEDS):
+            colour = tuple(self._data_byte(data, idx) for idx in range(3))
+            if command != TB.COMMAND_SET_LED2:
+                self.leds[1] = colour
+            if command != TB.COMMAND_SET_LED1:
+                self.leds[2] = colour
+        elif command == TB.COMMAND_SET_LED_BATT_MON:
+            self.led_show_battery = self._data_byte(data) != TB.COMMAND_VALUE_OFF
+        # Other commands (and GET commands with no read) are accepted and ignored, as on the board
+
+    def write_read(self, write_buffer, write_length, read_buffer, read_length):
+        self.num_reads += 1
+        self._check_failsafe()
+        command = write_buffer[0]
+        reply = [command] + self._reply_values(command)
+        if self.num_corrupt_replies:
+            self.num_corrupt_replies -= 1
+            reply[0] = (command + 1) & 0xFF
+        for idx in range(read_length):
+            read_buffer[idx] = reply[idx] if idx < len(reply) else 0
+
+    def _reply_values(self, command):
+        if command == TB.COMMAND_GET_ID:
+            return [TB.I2C_ID_THUNDERBORG]
+        if command == TB.COMMAND_GET_A:
+            return list(self.motor_levels['A'])
+        if command == TB.COMMAND_GET_B:
+            return list(self.motor_levels['B'])
+        if command == TB.COMMAND_GET_FAILSAFE:
+            return [TB.COMMAND_VALUE_ON if self.failsafe else TB.COMMAND_VALUE_OFF]
+        if command == TB.COMMAND_GET_DRIVE_A_FAULT:
+            return [TB.COMMAND_VALUE_ON if self.drive_faults['A'] else TB.COMMAND_VALUE_OFF]
+        if command == TB.COMMAND_GET_DRIVE_B_FAULT:
+            return [TB.COMMAND_VALUE_ON if self.drive_faults['B'] else TB.COMMAND_VALUE_OFF]
+        if command == TB.COMMAND_GET_BATT_VOLT:
+            raw = int(round((self.battery_voltage - TB.VOLTAGE_PIN_CORRECTION) / TB.VOLTAGE_PIN_MAX * TB.COMMAND_ANALOG_MAX))
+            raw = max(0, min(TB.COMMAND_ANALOG_MAX, raw))
+            return [raw >> 8, raw & 0xFF]
+        if command == TB.COMMAND_GET_BATT_LIMITS:
+            return list(self.battery_limits)
+        if command == TB.COMMAND_GET_LED1:
+            return list(self.leds[1])
+        if command == TB.COMMAND_GET_LED2:
+            return list(self.leds[2])
+        if command == TB.COMMAND_GET_LED_BATT_MON:
+            return [TB.COMMAND_VALUE_ON if self.led_show_battery else TB.COMMAND_VALUE_OFF]
+        return []
+
+    def _set_motor(self, motor, reverse, data):
+        pwm = min(self._data_byte(data), TB.PWM_MAX)
+        self.motor_levels[motor] = (TB.COMMAND_VALUE_REV if reverse else TB.COMMAND_VALUE_FWD, pwm)
+
+    def _motors_off(self):
+        for motor in self.motor_levels:
+            self.motor_levels[motor] = (TB.COMMAND_VALUE_FWD, 0)
+
+    def _check_failsafe(self):
+        now = self.monotonic()
+        if self.failsafe and now - self.last_command_time > FAILSAFE_TIMEOUT_IN_SEC:
+            self._motors_off()
+        self.last_command_time = now
+
+    @staticmethod
+    def _data_byte(data, idx=0):
+        return data[idx] if idx < len(data) else 0
+
+
+if __name__ == '__main__':
+    def main():
+        from boost.motors.i2c_transport import I2CTransport
+        from boost.motors.motors_adapter import ThunderBorgAdapter
+
+        num_iterations = 10000
+        transport = I2CTransport(ThunderBorgEmulator())
+        adapter = ThunderBorgAdapter(print, transport)
+        adapter.initialize()
+        start_time = time.monotonic()
+        for idx in range(num_iterations):
+            adapter.set_motor_power('A', (idx % 200 - 100) / 100.0)
+            adapter.set_all_motors_power(0.5)
+            if idx % 10 == 0:
+                adapter.is_faulty()
+                adapter.get_voltage_reading()
+        elapsed = time.monotonic() - start_time
+        print('{0} iterations in {1:.3f} s'.format(num_iterations, elapsed))
+        for stats in transport.get_stats():
+            print('Command {0:3d}: {1:6d} transactions, {2} retries, {3} failures, mean {4:.1f} us, max {5:.1f} us'.format(
+                stats.command, stats.num_transactions, stats.num_retries, stats.num_failures,
+                stats.mean_latency_in_sec * 1e6, stats.max_latency_in_sec * 1e6))
+        adapter.stop()
+    main()
@@ -0,0 +1,86 @@
+import unittest
+from .i2c_transport import I2CTransport
+from .motors_adapter import ThunderBorgAdapter
+from .thunderborg_emulator import ThunderBorgEmulator
+from . import ThunderBorg as TB
+
+
+class FakeMonotonic(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def add(self, seconds):
+        self.now += seconds
+
+
+class ThunderBorgEmulatorTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.monotonic = FakeMonotonic()
+        self.emulator = ThunderBorgEmulator(self.monotonic, battery_voltage=11.1)
+        self.transport = I2CTransport(self.emulator, self.monotonic)
+        self.messages = []
+        self.adapter = ThunderBorgAdapter(self.messages.append, self.transport)
+
+    def test_initialize_and_drive(self):
+        self.assertTrue(self.adapter.initialize())
+        self.assertTrue(self.emulator.failsafe)
+        self.adapter.set_motor_power('A', 0.5)
+        self.adapter.set_motor_power('B', -1.0)
+        self.assertAlmostEqual(self.emulator.get_motor_power('A'), 127 / 255.0)
+        self.assertEqual(self.emulator.get_motor_power('B'), -1.0)
+        self.assertAlmostEqual(self.adapter.TB.GetMotor1(), 127 / 255.0)
+        self.assertEqual(self.adapter.TB.GetMotor2(), -1.0)
+        self.adapter.set_all_motors_power(-0.2)
+        self.assertEqual(self.adapter.TB.GetMotor1(), self.adapter.TB.GetMotor2())
+        self.adapter.stop()
+        self.assertEqual(self.emulator.get_motor_power('A'), 0)
+        self.assertEqual(self.emulator.get_motor_power('B'), 0)
+
+    def test_faults_and_battery(self):
+        self.adapter.initialize()
+        self.assertFalse(self.adapter.is_faulty())
+        self.emulator.drive_faults['B'] = True
+        self.assertTrue(self.adapter.is_faulty())
+        self.assertEqual(self.messages[-1], 'Motor B is faulty')
+        self.assertAlmostEqual(self.adapter.get_voltage_reading(), 11.1, delta=TB.VOLTAGE_PIN_MAX / TB.COMMAND_ANALOG_MAX)
+
+    def test_failsafe_switches_the_motors_off(self):
+        self.adapter.initialize()
+        self.adapter.set_motor_power('A', 1.0)
+        self.monotonic.add(0.2)
+        self.assertEqual(self.emulator.get_motor_power('A'), 1.0)
+        self.monotonic.add(0.3)
+        self.assertEqual(self.emulator.get_motor_power('A'), 0)
+
+    def test_retries_and_stats(self):
+        self.adapter.initialize()
+        self.transport.reset_stats()
+        self.emulator.num_corrupt_replies = 2
+        self.assertEqual(self.adapter.TB.GetMotor1(), 0)
+        self.emulator.num_corrupt_replies = 3
+        self.assertIsNone(self.adapter.TB.GetMotor1())  # Out of retries, the driver prints and returns None
+        self.assertEqual(self.messages[-1], 'Failed reading motor 1 drive level!')
+        self.adapter.set_motor_power('A', 0.3)
+        stats = dict((stats.command, stats) for stats in self.adapter.get_transport_stats())
+        self.assertEqual(stats[TB.COMMAND_GET_A].num_transactions, 2)
+        self.assertEqual(stats[TB.COMMAND_GET_A].num_retries, 4)
+        self.assertEqual(stats[TB.COMMAND_GET_A].num_failures, 1)
+        self.assertEqual(stats[TB.COMMAND_SET_A_FWD].num_transactions, 1)
+        self.assertEqual(stats[TB.COMMAND_SET_A_FWD].num_failures, 0)
+
+    def test_reply_reuses_the_read_buffer(self):
+        first = self.transport.read(TB.COMMAND_GET_ID, TB.I2C_MAX_LEN)
+        self.assertEqual(len(first), TB.I2C_MAX_LEN)
+        self.assertEqual(first[1], TB.I2C_ID_THUNDERBORG)
+        self.transport.read(TB.COMMAND_GET_FAILSAFE, TB.I2C_MAX_LEN)
+        self.assertEqual(first[0], TB.COMMAND_GET_FAILSAFE)
+
+    def test_raw_read_outlives_the_next_command(self):
+        self.adapter.initialize()
+        reply = self.adapter.TB.RawRead(TB.COMMAND_GET_ID, TB.I2C_MAX_LEN)
+        self.adapter.TB.RawRead(TB.COMMAND_GET_FAILSAFE, TB.I2C_MAX_LEN)
+        self.assertEqual(reply[0], TB.COMMAND_GET_ID)
+        self.assertEqual(reply[1], TB.I2C_ID_THUNDERBORG)
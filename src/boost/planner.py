@@ -1,21 +1,158 @@
+import math
+from .motors.motion_profile import NUM_SAMPLES, interpolate
+
+
+class Target(object):
+    def __init__(self, steps, direction):
+        self.steps = steps  # Odometry steps of the target sector
+        self.direction = direction  # 1 if the steps grow on the way to the target (clockwise), -1 otherwise
+        self.stopping = False  # The motor was told to stop, in time to come to rest in the target sector
+
+
 class Planner(object):
-    def __init__(self, shaft_encoder, motors_controller):
+    """
+    Moves the heads to target sectors.
+
+    The motor is told to stop before the target, at the tick that brings it to rest closest to the middle of the target
+    sector: the distance it takes to stop is predicted from the velocity, the power and the ramp constants, for a stop
+    now and for one a tick later.
+    The target is checked for being crossed, not hit, so a skipped sector can not make the head spin forever, and a
+    target is only acted upon once: repeated edges do not restart the ramp. If the head comes to rest short of the
+    target, it moves on at the lowest speed.
+    """
+    def __init__(self, shaft_encoder, motors_controller, motor_time_constant_in_sec=0.0, tick_interval_in_sec=0.0,
+                 motor_dead_band_power=0.0, coast_deceleration_in_deg_per_sec2=None):
         self.shaft_encoder = shaft_encoder
         self.motors_controller = motors_controller
-        self.current_target_position = {}
+        self.motor_time_constant_in_sec = motor_time_constant_in_sec
+        self.tick_interval_in_sec = tick_interval_in_sec
+        self.motor_dead_band_power = motor_dead_band_power  # Power below which the motor does not turn the shaft
+        # Deceleration of the shaft when the motor does not drive it (None: it follows the power with the lag all the way)
+        self.coast_deceleration_in_deg_per_sec2 = coast_deceleration_in_deg_per_sec2
+        self.targets = {}  # Targets are in odometry steps, to tell apart the same sector on different turns
         self.motors_constants = None
+        self.speed_curve = None  # (power, steady state speed) points, from the calibrated speed definitions
 
     def set_constants(self, motors_constants):
         self.motors_constants = motors_constants
+        self.speed_curve = None
+        if motors_constants.speed_definitions:
+            # Still up to the dead band, then the calibrated speeds
+            speed_curve = [(self.motor_dead_band_power, 0.0)] + [
+                (power, speed) for power, speed in zip(motors_constants.power_definitions, motors_constants.speed_definitions)
+                if power > self.motor_dead_band_power]
+            if len(speed_curve) > 1:
+                self.speed_curve = speed_curve
 
     def on_shaft_position(self, positions, speeds):
-        for device, position in positions.items():
-            target_position = self.current_target_position.get(device, None)
-            if target_position:
-                if position.position == target_position:
-                    self.motors_controller.set_target_speed(device, 0, self.motors_constants)
+        snapshot = self.shaft_encoder.get_snapshot()
+        for device in positions.keys():
+            self._check_target(device, snapshot)
+
+    # To be called periodically: between edges, the interpolated angle tells when to start slowing down
+    def on_tick(self):
+        snapshot = self.shaft_encoder.get_snapshot()
+        for device in list(self.targets.keys()):
+            self._check_target(device, snapshot)
 
-    def set_plan(self, device, target_position, speed, direction):
+    def _check_target(self, device, snapshot):
+        target = self.targets.get(device)
+        if target is None:
+            return
+        if (snapshot.odometry_steps[device] - target.steps) * target.direction >= 0:
+            # In the target sector, or past it
+            self.targets[device] = None
+            if not target.stopping:
+                self.motors_controller.set_target_speed(device, 0, self.motors_constants)
+            return
+        estimate = self.shaft_encoder.get_velocity(device)
+        if not target.stopping:
+            target_top_angle, target_bottom_angle = self.shaft_encoder.get_sector_bounds(device, target.steps)
+            angle = self.shaft_encoder.get_interpolated_angle(device, snapshot=snapshot)
+            # The angle decreases when the steps grow
+            distance_left = (angle - (target_top_angle + target_bottom_angle) / 2.0) * target.direction
+            stopping_distance, next_stopping_distance = self._get_stopping_distances(device, estimate)
+            # Stop at the tick that gets closest: waiting for the next one stops further on
+            if distance_left - stopping_distance <= next_stopping_distance - distance_left:
+                target.stopping = True
+                self.motors_controller.set_target_speed(device, 0, self.motors_constants)
+        elif estimate.velocity == 0 and self.motors_controller.get_current_power()[device] == 0 and not self.motors_controller.is_ramping(device):
+            # Came to rest short of the target
+            target.stopping = False
+            self.motors_controller.set_target_speed(device, -target.direction, self.motors_constants)
+
+    def _get_stopping_distances(self, device, estimate):
+        """
+        Distances to come to rest, stopping now and stopping at the next tick (including the travel until then).
+        """
+        power = abs(self.motors_controller.get_current_power()[device])
+        speed = abs(estimate.velocity)
+        speed_per_power = 0.0
+        if self.speed_curve is None and power > self.motor_dead_band_power:
+            # The speed the current power is heading to, extrapolated from the acceleration
+            power_speed = abs(estimate.velocity + estimate.acceleration * self.motor_time_constant_in_sec)
+            speed_per_power = power_speed / (power - self.motor_dead_band_power)
+        stopping_distance = self._get_stopping_distance(power, speed, speed_per_power)
+        if not self.tick_interval_in_sec:
+            return stopping_distance, stopping_distance
+        next_power = abs(self.motors_controller.get_power_ahead(device, self.tick_interval_in_sec))
+        travel, next_speed = self._step(power, speed, speed_per_power, self.tick_interval_in_sec)
+        return stopping_distance, travel + self._get_stopping_distance(next_power, next_speed, speed_per_power)
+
+    def _get_stopping_distance(self, power, speed, speed_per_power):
+        """
+        Distance covered while the power ramps down from "power" to zero, tick by tick: the power is written at every
+        tick, and held in between. The ramp is the one the motors controller will run, S-curves from the same cached
+        sample table.
+        """
+        compiled = self.motors_controller.compiled_constants
+        ramp_time_in_sec, table = compiled.motion_profiles.get_ramp(power, 0.0, compiled.power_ramp_up_per_sec)
+        dt = self.tick_interval_in_sec or ramp_time_in_sec / NUM_SAMPLES
+        distance = 0.0
+        time = 0.0
+        while time < ramp_time_in_sec and speed > 0:
+            fraction = time / ramp_time_in_sec
+            if table is not None:
+                fraction = interpolate(table, fraction)
+            travel, speed = self._step(power * (1.0 - fraction), speed, speed_per_power, dt)
+            distance += travel
+            time += dt
+        if self.coast_deceleration_in_deg_per_sec2 is None:
+            return distance + speed * self.motor_time_constant_in_sec
+        return distance + speed * speed / (2.0 * self.coast_deceleration_in_deg_per_sec2)
+
+    def _step(self, power, speed, speed_per_power, dt):
+        """
+        Distance covered and speed reached in "dt", at constant power. Above the dead band, the shaft speed follows the
+        power with a first order lag ("motor_time_constant_in_sec"), below it the shaft coasts and friction stops it.
+        """
+        friction = self.coast_deceleration_in_deg_per_sec2
+        if power <= self.motor_dead_band_power and friction is not None:
+            if speed <= friction * dt:
+                return speed * speed / (2.0 * friction), 0.0
+            return (speed - friction * dt / 2.0) * dt, speed - friction * dt
+        target_speed = self._get_steady_state_speed(power, speed_per_power)
+        time_constant = self.motor_time_constant_in_sec
+        decay = math.exp(-dt / time_constant) if time_constant else 0.0
+        return (target_speed * dt + (speed - target_speed) * time_constant * (1.0 - decay),
+                target_speed + (speed - target_speed) * decay)
+
+    def _get_steady_state_speed(self, power, speed_per_power):
+        dead_band = self.motor_dead_band_power
+        if power <= dead_band:
+            return 0.0
+        curve = self.speed_curve
+        if curve is None:
+            return speed_per_power * (power - dead_band)
+        for idx in range(1, len(curve) - 1):
+            if power <= curve[idx][0]:
+                break
+        else:
+            idx = len(curve) - 1
+        (low_power, low_speed), (high_power, high_speed) = curve[idx - 1], curve[idx]
+        return low_speed + (high_speed - low_speed) * (power - low_power) / (high_power - low_power)
+
+    def set_plan(self, device, target_position, speed, direction, turns=None):
         assert device in self.shaft_encoder.devices, 'Invalid device {0}'.format(device)
         assert direction in ('cw', 'ccw'), 'Invalid direction {0}'.format(direction)
         assert speed > 0, 'Speed must be a positive value'
@@ -25,12 +162,30 @@ class Planner(object):
         if direction == 'cw':
             speed = -speed
 
-        self.current_target_position[device] = target_position
-        if self.shaft_encoder.get_current_position(device).position != target_position:
+        # Position and odometry from the same snapshot, even if the shaft moves in the meantime
+        snapshot = self.shaft_encoder.get_snapshot()
+        current_steps = snapshot.odometry_steps[device]
+        target_steps = None
+        if target_position is not None or turns:
+            # Clockwise rotation makes the position values grow
+            num_codes = self.shaft_encoder.num_codes[device]
+            current_position = snapshot.positions[device].position
+            if target_position is None:
+                target_position = current_position
+            if direction == 'cw':
+                distance = (target_position - current_position) % num_codes
+            else:
+                distance = (current_position - target_position) % num_codes
+            distance += (turns or 0) * num_codes
+            target_steps = current_steps + (distance if direction == 'cw' else -distance)
+
+        # Clockwise (negative speed) makes the steps grow
+        self.targets[device] = Target(target_steps, -1 if speed > 0 else 1) if target_steps not in (None, current_steps) else None
+        if target_steps != current_steps:
             self.motors_controller.set_target_speed(device, speed, self.motors_constants)
 
     def set_stop_plan(self, device):
         assert device in self.shaft_encoder.devices, 'Invalid device {0}'.format(device)
 
-        self.current_target_position[device] = None
+        self.targets[device] = None
         self.motors_controller.set_target_speed(device, 0, self.motors_constants)
@@ -0,0 +1,129 @@
+import unittest
+from collections import namedtuple
+from .planner import Planner
+from .constants import MotorControllerConstants
+from .motors.motors_controller import CompiledConstants
+from .sensors.velocity import VelocityEstimate, STILL
+
+
+FakePosition = namedtuple('FakePosition', 'position')
+
+
+class FakeSnapshot(object):
+    def __init__(self, steps):
+        self.odometry_steps = {'A': steps}
+        self.positions = {'A': FakePosition(steps % 64)}
+
+
+class FakeShaftEncoder(object):
+    """
+    64 sectors of 5.625 degrees, odometry steps grow clockwise (angle = 360 - steps * sector).
+    """
+    devices = {'A': [0, 1, 2, 3, 4, 5]}
+    num_codes = {'A': 64}
+
+    def __init__(self):
+        self.steps = 0
+        self.angle_in_sector = 0.5  # From the top of the sector
+        self.estimate = STILL
+
+    def get_snapshot(self):
+        return FakeSnapshot(self.steps)
+
+    def get_sector_bounds(self, device, steps):
+        return 360.0 - 5.625 * steps, 360.0 - 5.625 * (steps + 1)
+
+    def get_interpolated_angle(self, device, snapshot=None):
+        return 360.0 - 5.625 * (self.steps + self.angle_in_sector)
+
+    def get_velocity(self, device):
+        return self.estimate
+
+
+class FakeMotorsController(object):
+    def __init__(self):
+        self.speeds = []
+        self.power = {'A': 0}
+        self.ramping = False
+        self.compiled_constants = None
+
+    def set_target_speed(self, device, speed, constants):
+        self.speeds.append(speed)
+        self.compiled_constants = CompiledConstants(constants)
+
+    def get_current_power(self):
+        return self.power
+
+    def get_power_ahead(self, device, seconds):
+        return self.power[device]
+
+    def is_ramping(self, device):
+        return self.ramping
+
+
+class PlannerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.shaft_encoder = FakeShaftEncoder()
+        self.motors_controller = FakeMotorsController()
+        self.planner = Planner(self.shaft_encoder, self.motors_controller, motor_time_constant_in_sec=0.1)
+        self.planner.set_constants(MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.5))
+
+    def move_to(self, steps, velocity=-100.0, power=-0.4):
+        self.shaft_encoder.steps = steps
+        self.shaft_encoder.estimate = VelocityEstimate(velocity, 0.0, 1.0)
+        self.motors_controller.power['A'] = power
+        self.planner.on_shaft_position({'A': None}, {'A': None})
+
+    def test_starts_slowing_down_before_the_target(self):
+        self.planner.set_plan('A', 20, 2, 'cw')
+        self.assertEqual(self.motors_controller.speeds, [-2])
+        # Stopping from 100 deg/sec and 0.4 power: 100 * 0.2 / 2 + 100 * 0.1 = 20 degrees, 3.6 sectors
+        self.move_to(15)
+        self.assertEqual(self.motors_controller.speeds, [-2])
+        self.move_to(17)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0])
+
+    def test_coasts_below_the_dead_band(self):
+        self.planner = Planner(self.shaft_encoder, self.motors_controller, motor_time_constant_in_sec=0.1,
+                               motor_dead_band_power=0.2, coast_deceleration_in_deg_per_sec2=1000.0)
+        self.planner.set_constants(MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.5))
+        self.planner.set_plan('A', 20, 2, 'cw')
+        # The motor stops driving the shaft half way down the ramp, and friction stops it in under 2 sectors
+        self.move_to(18)
+        self.assertEqual(self.motors_controller.speeds, [-2])
+        self.move_to(19)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0])
+
+    def test_stops_only_once(self):
+        self.planner.set_plan('A', 20, 2, 'cw')
+        for steps in (17, 18, 19, 20, 21, 20):
+            self.move_to(steps)
+            self.planner.on_tick()
+        self.assertEqual(self.motors_controller.speeds, [-2, 0])
+
+    def test_skipped_target_sector(self):
+        self.planner.set_plan('A', 20, 2, 'cw')
+        # Too fast to stop in time, and the edge of the target is missed
+        self.move_to(18, velocity=-1000.0)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0])
+        self.shaft_encoder.steps = 42
+        self.planner.set_plan('A', 40, 2, 'ccw')
+        self.move_to(39, velocity=0.0, power=0.4)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0, 2, 0])
+        self.assertIsNone(self.planner.targets['A'])
+
+    def test_moves_on_when_at_rest_short_of_the_target(self):
+        self.planner.set_plan('A', 20, 2, 'cw')
+        self.move_to(17)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0])
+        self.move_to(18, velocity=0.0, power=0)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0, -1])
+        self.move_to(19, velocity=-20.0, power=-0.2)
+        self.move_to(20, velocity=-20.0, power=-0.2)
+        self.assertEqual(self.motors_controller.speeds, [-2, 0, -1, 0])
+
+    def test_no_target(self):
+        self.planner.set_plan('A', None, 3, 'ccw')
+        self.move_to(-50, velocity=200.0, power=0.6)
+        self.planner.on_tick()
+        self.assertEqual(self.motors_controller.speeds, [3])
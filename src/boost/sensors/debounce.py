@@ -0,0 +1,97 @@
+import threading
+import time
+
+
+class EdgeDebouncer(object):
+    """
+    Coalesces edges from all the sensor pins into one consolidated sensor snapshot per settle window.
+
+    The first edge opens a window, edges arriving while the window is open are absorbed by it, and when the window
+    expires all the sensors are read at once and the resulting sensor word is emitted (if it changed).
+    "on_edge" never sleeps, so it can be called straight from the GPIO callback thread: the waiting happens in a
+    separate flusher thread.
+
+    The window adapts to the observed edge rate: a fraction of the average interval between windows, bounded by
+    [min_window_in_sec, max_window_in_sec]. The faster the shaft spins, the shorter the window.
+    """
+    def __init__(self, read_sensor_word, emit, clock, min_window_in_sec, max_window_in_sec, window_to_interval_ratio=0.25, monotonic=time.monotonic):
+        self.read_sensor_word = read_sensor_word
+        self.emit = emit
+        self.clock = clock
+        self.min_window_in_sec = min_window_in_sec
+        self.max_window_in_sec = max_window_in_sec
+        self.window_to_interval_ratio = window_to_interval_ratio
+        self.monotonic = monotonic
+
+        self.window_in_sec = max_window_in_sec
+        self.sensor_word = None
+        self._window_deadline = None
+        self._window_timestamp = None
+        self._last_window_opened_at = None
+        self._average_interval = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self, initial_sensor_word):
+        self.sensor_word = initial_sensor_word
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='sensors-debounce', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def on_edge(self, *args):
+        if self._window_deadline is not None:
+            return  # A window is already open: this edge will be part of its snapshot
+        now = self.monotonic()
+        self._adapt_window(now)
+        self._window_timestamp = self.clock.now()
+        with self._condition:
+            self._window_deadline = now + self.window_in_sec
+            self._condition.notify()
+
+    def poll(self, now):
+        """
+        Take and emit the snapshot if the current window has expired. Returns True if the window was closed.
+        """
+        deadline = self._window_deadline
+        if deadline is None or now < deadline:
+            return False
+        timestamp = self._window_timestamp
+        # Close the window before reading, so that an edge arriving during the read opens a new one
+        self._window_deadline = None
+        sensor_word = self.read_sensor_word()
+        if sensor_word != self.sensor_word:
+            self.sensor_word = sensor_word
+            self.emit(sensor_word, timestamp)
+        return True
+
+    def _adapt_window(self, now):
+        if self._last_window_opened_at is not None:
+            interval = now - self._last_window_opened_at
+            if self._average_interval is None:
+                self._average_interval = interval
+            else:
+                self._average_interval = 0.8 * self._average_interval + 0.2 * interval
+            self.window_in_sec = min(self.max_window_in_sec, max(self.min_window_in_sec, self._average_interval * self.window_to_interval_ratio))
+        self._last_window_opened_at = now
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._window_deadline is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                deadline = self._window_deadline
+            delay = deadline - self.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.poll(self.monotonic())
@@ -0,0 +1,88 @@
+import unittest
+import threading
+from datetime import datetime, timedelta
+from .debounce import EdgeDebouncer
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class FakeMonotonic(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class EdgeDebouncerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.monotonic = FakeMonotonic()
+        self.sensor_word = 0
+        self.num_reads = 0
+        self.emitted = []
+        self.debouncer = EdgeDebouncer(self.read_sensor_word, self.emit, self.clock, 0.0005, 0.005, monotonic=self.monotonic)
+        self.debouncer.sensor_word = 0
+
+    def read_sensor_word(self):
+        self.num_reads += 1
+        return self.sensor_word
+
+    def emit(self, sensor_word, timestamp):
+        self.emitted.append((sensor_word, timestamp))
+
+    def test_edges_within_window_are_coalesced(self):
+        first_edge_time = self.clock.now()
+        self.sensor_word = 0b01
+        self.debouncer.on_edge(11)
+        self.clock.add(timedelta(milliseconds=1))
+        self.monotonic.now += 0.001
+        self.sensor_word = 0b11
+        self.debouncer.on_edge(9)
+        self.assertFalse(self.debouncer.poll(self.monotonic.now))
+        self.assertEqual(self.num_reads, 0)
+
+        self.monotonic.now += 0.004
+        self.assertTrue(self.debouncer.poll(self.monotonic.now))
+        self.assertEqual(self.num_reads, 1)
+        self.assertEqual(self.emitted, [(0b11, first_edge_time)])
+
+    def test_glitch_reverting_within_window_is_not_emitted(self):
+        self.debouncer.on_edge(11)
+        self.monotonic.now += 0.005
+        self.assertTrue(self.debouncer.poll(self.monotonic.now))
+        self.assertEqual(self.emitted, [])
+
+    def test_window_adapts_to_edge_rate(self):
+        self.assertEqual(self.debouncer.window_in_sec, 0.005)
+        for _ in range(50):
+            self.debouncer.on_edge(11)
+            self.monotonic.now += 0.004
+            self.debouncer.poll(self.monotonic.now)
+        self.assertAlmostEqual(self.debouncer.window_in_sec, 0.001)
+
+        for _ in range(50):
+            self.debouncer.on_edge(11)
+            self.monotonic.now += 0.001
+            self.debouncer.poll(self.monotonic.now)
+        self.assertAlmostEqual(self.debouncer.window_in_sec, 0.0005)
+
+    def test_flusher_thread(self):
+        emitted = threading.Event()
+        debouncer = EdgeDebouncer(self.read_sensor_word, lambda word, ts: emitted.set(), self.clock, 0.0005, 0.005)
+        debouncer.start(0)
+        try:
+            self.sensor_word = 0b100
+            debouncer.on_edge(10)
+            self.assertTrue(emitted.wait(timeout=1.0))
+        finally:
+            debouncer.stop()
@@ -0,0 +1,111 @@
+from array import array
+from collections import namedtuple
+
+
+# Health of one sensor:
+#  - num_toggles: number of level changes since the start (or the last reset)
+#  - seconds_since_last_toggle: None if it never toggled
+#  - num_rejected: number of rejected transitions the sensor took part in
+#  - stuck / chattering: the sensor is flagged, and masked out of the decoding
+SensorHealth = namedtuple('SensorHealth', 'sensor num_toggles seconds_since_last_toggle num_rejected stuck chattering')
+
+
+class SensorHealthMonitor(object):
+    """
+    Cheap per-sensor counters, updated from the sensors thread, to spot failing reflective sensors.
+
+    A sensor is flagged as chattering when, within one window, it toggles more often than the shaft can make it toggle
+    at full speed, or it takes part in too many rejected transitions. It is flagged as stuck when its device turns back,
+    right after a missed edge, where that sensor should have toggled (a stuck bit makes the gray code reflect), a few
+    times in a row without the sensor ever toggling in between.
+
+    Flags are sticky until "reset": a sensor that failed once is not trusted again during a show.
+    """
+    def __init__(self, num_sensors, max_toggles_per_sec, window_in_sec=1.0, max_rejected_per_window=5, stuck_after_fast_reversals=3):
+        self.num_sensors = num_sensors
+        self.window_in_sec = window_in_sec
+        self.max_toggles_per_window = [max_toggles * window_in_sec for max_toggles in max_toggles_per_sec]  # One value per sensor
+        self.max_rejected_per_window = max_rejected_per_window
+        self.stuck_after_fast_reversals = stuck_after_fast_reversals
+        self.reset(None)
+
+    def reset(self, timestamp):
+        self.num_toggles = array('L', [0] * self.num_sensors)
+        self.num_rejected = array('L', [0] * self.num_sensors)
+        self.last_toggle_ts = [None] * self.num_sensors
+        self.fast_reversals = array('L', [0] * self.num_sensors)  # Since the last toggle
+        self.window_toggles = array('L', [0] * self.num_sensors)
+        self.window_rejected = array('L', [0] * self.num_sensors)
+        self.window_start = timestamp
+        self.stuck_sensors = 0  # Bit N = sensor N
+        self.chattering_sensors = 0
+
+    @property
+    def flagged_sensors(self):
+        return self.stuck_sensors | self.chattering_sensors
+
+    def on_toggles(self, toggled_sensors, timestamp):
+        """
+        "toggled_sensors" has bit N set if sensor N changed level. Returns True if a sensor was just flagged.
+        """
+        self._roll_window(timestamp)
+        newly_flagged = False
+        while toggled_sensors:
+            lowest_bit = toggled_sensors & -toggled_sensors
+            toggled_sensors ^= lowest_bit
+            sensor = lowest_bit.bit_length() - 1
+            self.num_toggles[sensor] += 1
+            self.last_toggle_ts[sensor] = timestamp
+            self.fast_reversals[sensor] = 0
+            self.window_toggles[sensor] += 1
+            if self.window_toggles[sensor] > self.max_toggles_per_window[sensor]:
+                newly_flagged = self._flag_chattering(lowest_bit) or newly_flagged
+        return newly_flagged
+
+    def on_rejected_transition(self, sensors, timestamp):
+        """
+        "sensors" has bit N set if sensor N disagrees with the last good position. Returns True if a sensor was just flagged.
+        """
+        self._roll_window(timestamp)
+        newly_flagged = False
+        while sensors:
+            lowest_bit = sensors & -sensors
+            sensors ^= lowest_bit
+            sensor = lowest_bit.bit_length() - 1
+            self.num_rejected[sensor] += 1
+            self.window_rejected[sensor] += 1
+            if self.window_rejected[sensor] > self.max_rejected_per_window:
+                newly_flagged = self._flag_chattering(lowest_bit) or newly_flagged
+        return newly_flagged
+
+    def on_fast_reversal(self, sensor):
+        """
+        The device turned back, right after a missed edge, where "sensor" should have toggled. Returns True if it was just flagged.
+        """
+        self.fast_reversals[sensor] += 1
+        if self.fast_reversals[sensor] >= self.stuck_after_fast_reversals and not self.stuck_sensors & (1 << sensor):
+            self.stuck_sensors |= 1 << sensor
+            return True
+        return False
+
+    def get_health(self, timestamp):
+        result = []
+        for sensor in range(self.num_sensors):
+            last_toggle_ts = self.last_toggle_ts[sensor]
+            seconds_since_last_toggle = (timestamp - last_toggle_ts).total_seconds() if last_toggle_ts is not None else None
+            result.append(SensorHealth(sensor, self.num_toggles[sensor], seconds_since_last_toggle, self.num_rejected[sensor],
+                                       bool(self.stuck_sensors & (1 << sensor)), bool(self.chattering_sensors & (1 << sensor))))
+        return result
+
+    def _flag_chattering(self, sensor_bit):
+        if self.chattering_sensors & sensor_bit:
+            return False
+        self.chattering_sensors |= sensor_bit
+        return True
+
+    def _roll_window(self, timestamp):
+        if self.window_start is None or (timestamp - self.window_start).total_seconds() >= self.window_in_sec:
+            self.window_start = timestamp
+            for sensor in range(self.num_sensors):
+                self.window_toggles[sensor] = 0
+                self.window_rejected[sensor] = 0
@@ -0,0 +1,88 @@
+import struct
+import threading
+from .shaft_encoder import sensor_values_to_word
+
+# Binary recording of raw sensor snapshots:
+#  - header: magic (4 bytes), format version (1 byte), number of sensors (1 byte)
+#  - one record per snapshot: seconds since the start of the recording (float64) and sensor word (uint32), little endian
+# The first record is the initial snapshot, at time 0.
+
+RECORDING_MAGIC = b'BSNS'
+RECORDING_VERSION = 1
+HEADER_STRUCT = struct.Struct('<4sBB')
+RECORD_STRUCT = struct.Struct('<dI')
+
+
+class SensorRecordingWriter(object):
+    def __init__(self, fileobj, num_sensors):
+        self.fileobj = fileobj
+        self.fileobj.write(HEADER_STRUCT.pack(RECORDING_MAGIC, RECORDING_VERSION, num_sensors))
+
+    def write(self, seconds, sensor_word):
+        self.fileobj.write(RECORD_STRUCT.pack(seconds, sensor_word))
+
+    def close(self):
+        self.fileobj.close()
+
+
+def read_sensor_recording(fileobj):
+    """
+    Returns the number of sensors and the list of (seconds, sensor word) records.
+    """
+    magic, version, num_sensors = HEADER_STRUCT.unpack(fileobj.read(HEADER_STRUCT.size))
+    if magic != RECORDING_MAGIC:
+        raise ValueError('Not a sensors recording')
+    if version != RECORDING_VERSION:
+        raise ValueError('Unsupported sensors recording version {0}'.format(version))
+    data = fileobj.read()
+    num_records = len(data) // RECORD_STRUCT.size
+    records = list(RECORD_STRUCT.iter_unpack(data[:num_records * RECORD_STRUCT.size]))
+    return num_sensors, records
+
+
+class RecordingSensorsAdapter(object):
+    """
+    Wraps another sensors adapter (typically the GPIOSensorsAdapter) and records every snapshot it delivers.
+
+    The initial snapshot is only known when the wrapped adapter has started, and its reader thread may deliver edges by
+    then: those are held back, and recorded after the initial snapshot.
+    """
+    def __init__(self, sensors_adapter, clock, filepath):
+        self.sensors_adapter = sensors_adapter
+        self.clock = clock
+        self.filepath = filepath
+        self.on_edge_callback = None
+        self.writer = None
+        self.start_time = None
+        self._lock = threading.Lock()
+        self._pending_records = None  # Edges delivered before the initial snapshot was recorded
+
+    def start(self, on_edge_callback):
+        self.on_edge_callback = on_edge_callback
+        self.writer = SensorRecordingWriter(open(self.filepath, 'wb'), len(self.sensors_adapter.sensor_pins))
+        self.start_time = self.clock.now()
+        self._pending_records = []
+        initial_values = self.sensors_adapter.start(self._on_edge)
+        with self._lock:
+            self._record(initial_values, self.start_time)
+            for values, timestamp in self._pending_records:
+                self._record(values, timestamp)
+            self._pending_records = None
+        return initial_values
+
+    def stop(self):
+        self.sensors_adapter.stop()
+        self.writer.close()
+
+    def _on_edge(self, values, timestamp=None):
+        record_timestamp = timestamp if timestamp is not None else self.clock.now()
+        with self._lock:
+            if self._pending_records is not None:
+                self._pending_records.append((values, record_timestamp))
+            else:
+                self._record(values, record_timestamp)
+        self.on_edge_callback(values, timestamp)
+
+    def _record(self, values, timestamp):
+        sensor_word = values if isinstance(values, int) else sensor_values_to_word(values)
+        self.writer.write((timestamp - self.start_time).total_seconds(), sensor_word)
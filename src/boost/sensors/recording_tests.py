@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from .recording import RecordingSensorsAdapter, read_sensor_recording
+from .sensors_replay import ReplaySensorsAdapter
+from .shaft_encoder import ShaftEncoders
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class FakeSensorsAdapter(object):
+    def __init__(self, initial_values, early_edges=()):
+        self.sensor_pins = list(range(12))
+        self.initial_values = initial_values
+        self.early_edges = early_edges  # Delivered by the reader thread before "start" returns
+        self.on_edge_callback = None
+        self.stopped = False
+
+    def start(self, on_edge_callback):
+        self.on_edge_callback = on_edge_callback
+        for values, timestamp in self.early_edges:
+            on_edge_callback(values, timestamp)
+        return self.initial_values
+
+    def stop(self):
+        self.stopped = True
+
+
+class SensorsRecordingTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, 'recording.bin')
+        self.edges = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _record(self):
+        fake_adapter = FakeSensorsAdapter(['0'] * 12)
+        adapter = RecordingSensorsAdapter(fake_adapter, self.clock, self.filepath)
+        self.assertEqual(adapter.start(lambda values, timestamp=None: self.edges.append((values, timestamp))), ['0'] * 12)
+        self.clock.add(timedelta(milliseconds=10))
+        fake_adapter.on_edge_callback(0b100000)
+        fake_adapter.on_edge_callback(0b110000, self.clock.now() + timedelta(milliseconds=5))
+        adapter.stop()
+        self.assertTrue(fake_adapter.stopped)
+
+    def test_recording_passes_snapshots_through(self):
+        self._record()
+        self.assertEqual(self.edges, [(0b100000, None), (0b110000, self.clock.now() + timedelta(milliseconds=5))])
+
+    def test_recording_format(self):
+        self._record()
+        with open(self.filepath, 'rb') as fileobj:
+            num_sensors, records = read_sensor_recording(fileobj)
+        self.assertEqual(num_sensors, 12)
+        self.assertEqual(records, [(0.0, 0), (0.01, 0b100000), (0.015, 0b110000)])
+
+    def test_initial_snapshot_is_recorded_first(self):
+        fake_adapter = FakeSensorsAdapter(0, [(0b1, self.clock.now() + timedelta(milliseconds=1))])
+        adapter = RecordingSensorsAdapter(fake_adapter, self.clock, self.filepath)
+        adapter.start(lambda values, timestamp=None: self.edges.append((values, timestamp)))
+        fake_adapter.on_edge_callback(0b11, self.clock.now() + timedelta(milliseconds=2))
+        adapter.stop()
+        with open(self.filepath, 'rb') as fileobj:
+            num_sensors, records = read_sensor_recording(fileobj)
+        self.assertEqual(records, [(0.0, 0), (0.001, 0b1), (0.002, 0b11)])
+
+    def test_replay_into_shaft_encoders(self):
+        self._record()
+        adapter = ReplaySensorsAdapter(self.filepath, self.clock, speed_factor=None)
+        changes = []
+        shaft_encoders = ShaftEncoders(adapter, {'A': [0, 1, 2, 3, 4, 5], 'B': [6, 7, 8, 9, 10, 11]}, self.clock, 1.0, 800, self.fail)
+        shaft_encoders.start(lambda positions, speeds: changes.append(dict((device, position.position) for device, position in positions.items())))
+        self.assertTrue(adapter.finished.wait(timeout=1.0))
+        shaft_encoders.stop()
+        self.assertEqual(changes, [{'A': 1}, {'A': 2}])
@@ -1,26 +1,48 @@
 from RPi import GPIO
 import time
+from .debounce import EdgeDebouncer
 
 
 class GPIOSensorsAdapter(object):
-    def __init__(self, sensor_pins, read_delay):
+    def __init__(self, sensor_pins, read_delay, deliver_word=False, clock=None, min_settle_window=None):
         self.sensor_pins = sensor_pins
         self.sensor_indexes = dict([(sensor_pin, idx) for idx, sensor_pin in enumerate(sensor_pins)])
         self.read_delay = read_delay
+        # When True, sensor values are delivered as one integer word (bit N = sensor N) instead of a list of '0'/'1'
+        self.deliver_word = deliver_word
         self.on_edge_callback = None
         self.sensor_values = None
+        # With a minimum settle window (in ms), edges are coalesced without sleeping in the GPIO callback thread,
+        # and "read_delay" becomes the maximum settle window. Implies delivering sensor words.
+        self.debouncer = None
+        if min_settle_window is not None:
+            self.deliver_word = True
+            self.debouncer = EdgeDebouncer(self._read_sensor_word, self._on_debounced_sensor_word, clock,
+                                           min_settle_window / 1000.0, read_delay / 1000.0)
 
     def start(self, on_edge_callback):
         self.on_edge_callback = on_edge_callback
         GPIO.setmode(GPIO.BCM)
         for sensor_pin in self.sensor_pins:
             GPIO.setup(sensor_pin, GPIO.IN)
-        self.sensor_values = [self._read_sensor(sensor_pin) for sensor_pin in self.sensor_pins]
+        if self.deliver_word:
+            self.sensor_values = self._read_sensor_word()
+        else:
+            self.sensor_values = [self._read_sensor(sensor_pin) for sensor_pin in self.sensor_pins]
+        if self.debouncer:
+            self.debouncer.start(self.sensor_values)
+            edge_callback = self.debouncer.on_edge
+        elif self.deliver_word:
+            edge_callback = self._on_edge_word
+        else:
+            edge_callback = self._on_edge
         for sensor_pin in self.sensor_pins:
-            GPIO.add_event_detect(sensor_pin, GPIO.BOTH, callback=self._on_edge)
+            GPIO.add_event_detect(sensor_pin, GPIO.BOTH, callback=edge_callback)
         return self.sensor_values
 
     def stop(self):
+        if self.debouncer:
+            self.debouncer.stop()
         GPIO.cleanup()
 
     def _on_edge(self, sensor_pin):
@@ -36,6 +58,34 @@ class GPIOSensorsAdapter(object):
         if call_callback:
             self.on_edge_callback(self.sensor_values)
 
+    def _on_edge_word(self, sensor_pin):
+        if self.sensor_values is None:
+            return
+        time.sleep(self.read_delay / 1000.0)
+        sensor_bit = 1 << self.sensor_indexes[sensor_pin]
+        if self._read_sensor_bit(sensor_pin):
+            word = self.sensor_values | sensor_bit
+        else:
+            word = self.sensor_values & ~sensor_bit
+        if word != self.sensor_values:
+            self.sensor_values = word
+            self.on_edge_callback(word)
+
+    def _on_debounced_sensor_word(self, word, timestamp):
+        self.sensor_values = word
+        self.on_edge_callback(word, timestamp)
+
+    def _read_sensor_word(self):
+        word = 0
+        for idx, sensor_pin in enumerate(self.sensor_pins):
+            if self._read_sensor_bit(sensor_pin):
+                word |= 1 << idx
+        return word
+
+    def _read_sensor_bit(self, sensor_pin):
+        # Same inversion as in _read_sensor, below
+        return 1 - GPIO.input(sensor_pin)
+
     def _read_sensor(self, sensor_pin):
         # The sensor returns a high value (1) for black, and a low value (0) for white, which is what we want
         # But the actual LED on the sensor is ON for white (i.e. 0) and OFF for black (i.e. 1)
@@ -0,0 +1,147 @@
+from collections import namedtuple
+from datetime import timedelta
+import threading
+import time
+
+
+# Edge event as read from a line request: the kernel timestamp is in nanoseconds on the CLOCK_MONOTONIC time base
+EdgeEvent = namedtuple('EdgeEvent', 'line_offset rising timestamp_ns')
+
+
+class GpiodLineProvider(object):
+    """
+    Line provider backed by the Linux GPIO character device, through libgpiod (v2 python bindings).
+    """
+    def __init__(self, chip_path):
+        self.chip_path = chip_path
+
+    def request_lines(self, line_offsets, consumer):
+        import gpiod
+        from gpiod.line import Direction, Edge
+        settings = gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.BOTH)
+        request = gpiod.request_lines(self.chip_path, consumer=consumer, config={tuple(line_offsets): settings})
+        return GpiodLineRequest(request, line_offsets)
+
+    @staticmethod
+    def monotonic_ns():
+        return time.monotonic_ns()
+
+
+class GpiodLineRequest(object):
+    def __init__(self, request, line_offsets):
+        self.request = request
+        self.line_offsets = line_offsets
+
+    def get_values(self):
+        return [value.value for value in self.request.get_values(self.line_offsets)]
+
+    def wait_edge_events(self, timeout_in_sec):
+        return self.request.wait_edge_events(timeout_in_sec)
+
+    def read_edge_events(self):
+        from gpiod import EdgeEvent as GpiodEdgeEvent
+        return [EdgeEvent(event.line_offset, event.event_type == GpiodEdgeEvent.Type.RISING_EDGE, event.timestamp_ns)
+                for event in self.request.read_edge_events()]
+
+    def release(self):
+        self.request.release()
+
+
+class GPIOCharDeviceSensorsAdapter(object):
+    """
+    Sensors adapter built on GPIO character device line requests with edge detection.
+
+    The edge events carry the level of the line after the edge, so there is no need to wait and read the pin again,
+    and each edge is stamped with the kernel timestamp instead of the time the callback happened to run.
+    Sensor values are always delivered as an integer word (bit N = sensor N), together with the edge timestamp.
+    """
+    def __init__(self, sensor_pins, clock, line_provider, wait_timeout_in_sec=0.1):
+        self.sensor_pins = sensor_pins
+        self.sensor_bits = dict((sensor_pin, 1 << idx) for idx, sensor_pin in enumerate(sensor_pins))
+        self.clock = clock
+        self.line_provider = line_provider
+        self.wait_timeout_in_sec = wait_timeout_in_sec
+        self.on_edge_callback = None
+        self.sensor_values = None
+        self._request = None
+        self._thread = None
+        self._running = False
+        self._reference_time = None
+        self._reference_ns = None
+
+    def start(self, on_edge_callback):
+        self.on_edge_callback = on_edge_callback
+        self._request = self.line_provider.request_lines(self.sensor_pins, 'boost')
+        # Anchor the kernel (monotonic) time base to the application clock
+        self._reference_time = self.clock.now()
+        self._reference_ns = self.line_provider.monotonic_ns()
+        initial_sensor_word = self._read_sensor_word()
+        self.sensor_values = initial_sensor_word
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='gpio-edges', daemon=True)
+        self._thread.start()
+        return initial_sensor_word
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._request:
+            self._request.release()
+            self._request = None
+
+    def _run(self):
+        while self._running:
+            if self._request.wait_edge_events(self.wait_timeout_in_sec):
+                self._process_edge_events(self._request.read_edge_events())
+
+    def _process_edge_events(self, events):
+        word = self.sensor_values
+        last_timestamp = None
+        for event in events:
+            sensor_bit = self.sensor_bits[event.line_offset]
+            # Same inversion as in GPIOSensorsAdapter: a low level means the sensor sees black, i.e. a 1
+            if event.rising:
+                new_word = word & ~sensor_bit
+            else:
+                new_word = word | sensor_bit
+            last_timestamp = self._event_timestamp(event.timestamp_ns)
+            if new_word != word:
+                word = new_word
+                self.sensor_values = word
+                self.on_edge_callback(word, last_timestamp)
+        # Re-synchronise with one batched read, in case the kernel dropped events from a full buffer
+        actual_word = self._read_sensor_word()
+        if actual_word != word and last_timestamp is not None:
+            self.sensor_values = actual_word
+            self.on_edge_callback(actual_word, last_timestamp)
+
+    def _event_timestamp(self, timestamp_ns):
+        return self._reference_time + timedelta(microseconds=(timestamp_ns - self._reference_ns) / 1000.0)
+
+    def _read_sensor_word(self):
+        word = 0
+        for idx, level in enumerate(self._request.get_values()):
+            if not level:
+                word |= 1 << idx
+        return word
+
+
+if __name__ == '__main__':
+    def main():
+        import sys
+        from ..clock import Clock
+
+        def print_values(sensor_word, timestamp=None):
+            print('Sensors: {0} {1}'.format(''.join([('.' if sensor_word & (1 << idx) else 'O') for idx in range(12)]), timestamp))
+        adapter = GPIOCharDeviceSensorsAdapter([11, 9, 10, 22, 27, 17, 14, 15, 18, 25, 8, 7], Clock(),
+                                               GpiodLineProvider(sys.argv[-1] if len(sys.argv) > 1 else '/dev/gpiochip0'))
+        print_values(adapter.start(print_values))
+        try:
+            while True:
+                time.sleep(1)
+        except:
+            pass
+        adapter.stop()
+    main()
@@ -0,0 +1,106 @@
+import unittest
+import queue
+import threading
+from datetime import datetime, timedelta
+from .sensors_gpiod import GPIOCharDeviceSensorsAdapter, EdgeEvent
+
+
+SENSOR_PINS = [11, 9, 10, 22, 27, 17, 14, 15, 18, 25, 8, 7]
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+
+class FakeLineProvider(object):
+    """
+    Stands in for the GPIO character device: line levels are set by the test, edge events are queued by the test.
+    """
+    def __init__(self, levels):
+        self.levels = dict(levels)
+        self.events = queue.Queue()
+        self.pending_events = []
+        self.released = False
+        self.now_ns = 1000000000
+
+    def request_lines(self, line_offsets, consumer):
+        self.line_offsets = line_offsets
+        return self
+
+    def monotonic_ns(self):
+        return self.now_ns
+
+    def get_values(self):
+        return [self.levels[line_offset] for line_offset in self.line_offsets]
+
+    def wait_edge_events(self, timeout_in_sec):
+        try:
+            self.pending_events = self.events.get(timeout=timeout_in_sec)
+            return True
+        except queue.Empty:
+            return False
+
+    def read_edge_events(self):
+        return self.pending_events
+
+    def release(self):
+        self.released = True
+
+    def push_edges(self, events):
+        for event in events:
+            self.levels[event.line_offset] = 1 if event.rising else 0
+        self.events.put(events)
+
+
+class GPIOCharDeviceSensorsAdapterTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        # All lines high, i.e. all sensors see white (0)
+        self.line_provider = FakeLineProvider(dict((pin, 1) for pin in SENSOR_PINS))
+        self.adapter = GPIOCharDeviceSensorsAdapter(SENSOR_PINS, self.clock, self.line_provider, wait_timeout_in_sec=0.01)
+        self.edges = []
+        self.received = threading.Semaphore(0)
+
+    def tearDown(self):
+        self.adapter.stop()
+
+    def on_edge(self, sensor_word, timestamp):
+        self.edges.append((sensor_word, timestamp))
+        self.received.release()
+
+    def wait_for_edges(self, count):
+        for _ in range(count):
+            self.assertTrue(self.received.acquire(timeout=1.0))
+
+    def test_initial_values_read_in_one_batch(self):
+        self.line_provider.levels[9] = 0
+        self.assertEqual(self.adapter.start(self.on_edge), 0b10)
+
+    def test_edges_are_stamped_with_kernel_timestamps(self):
+        self.adapter.start(self.on_edge)
+        self.line_provider.push_edges([
+            EdgeEvent(17, False, self.line_provider.now_ns + 2000000),  # Sensor 5 goes black, 2 ms after start
+            EdgeEvent(11, False, self.line_provider.now_ns + 3500000),  # Sensor 0 goes black, 3.5 ms after start
+        ])
+        self.wait_for_edges(2)
+        start_time = self.clock.now()
+        self.assertEqual(self.edges, [
+            (0b100000, start_time + timedelta(milliseconds=2)),
+            (0b100001, start_time + timedelta(milliseconds=3.5)),
+        ])
+
+    def test_resync_after_dropped_events(self):
+        self.adapter.start(self.on_edge)
+        self.line_provider.levels[7] = 0  # This edge never makes it to the event buffer
+        self.line_provider.push_edges([EdgeEvent(11, False, self.line_provider.now_ns + 1000000)])
+        self.wait_for_edges(2)
+        self.assertEqual([sensor_word for sensor_word, _ in self.edges], [0b1, 0b100000000001])
+
+    def test_stop_releases_lines(self):
+        self.adapter.start(self.on_edge)
+        self.adapter.stop()
+        self.assertTrue(self.line_provider.released)
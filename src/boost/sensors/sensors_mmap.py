@@ -0,0 +1,150 @@
+from datetime import timedelta
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+# BCM283x GPIO registers, as exposed (without root privileges) by /dev/gpiomem
+GPIO_REGISTERS_FILE = '/dev/gpiomem'
+GPIO_REGISTERS_SIZE = 4096
+GPFSEL0_OFFSET = 0x00  # Function select registers, 3 bits per pin, 10 pins per register (000: input)
+GPLEV0_OFFSET = 0x34  # Pin level register for GPIO 0-31, one bit per pin
+
+# Every sample wakes up a Python thread: the CPU cost grows with the rate, and this is as far as it goes
+MAX_SAMPLE_RATE_IN_HZ = 20000
+
+# Number of register bits gathered into the sensor word with one table lookup
+GATHER_CHUNK_BITS = 8
+GATHER_CHUNK_MASK = (1 << GATHER_CHUNK_BITS) - 1
+
+
+class MmapGPIOSensorsAdapter(object):
+    """
+    Sensors adapter that samples the GPIO level register at a fixed rate, through the memory-mapped register file,
+    instead of relying on interrupts.
+
+    With all the sensors toggling together at speed, interrupt delivery falls behind and edges are read late or lost.
+    Sampling reads all the pins at once, at a known rate: the latency is bounded by the sampling period and the CPU cost
+    does not depend on how fast the shafts turn. Sensor words are delivered only when they change, together with the
+    time of the sample.
+
+    At "start", the sensor pins are switched to input mode. Their pulls are left alone, as GPIOSensorsAdapter does: the
+    sensors drive the lines.
+    """
+    def __init__(self, sensor_pins, clock, sample_rate_in_hz=10000, register_file=GPIO_REGISTERS_FILE, register_offset=GPLEV0_OFFSET,
+                 monotonic=time.monotonic):
+        assert all(0 <= sensor_pin < 32 for sensor_pin in sensor_pins), 'Only GPIO 0-31 are in the first level register'
+        assert 0 < sample_rate_in_hz <= MAX_SAMPLE_RATE_IN_HZ, 'The sample rate must be at most {0} Hz'.format(MAX_SAMPLE_RATE_IN_HZ)
+        self.sensor_pins = sensor_pins
+        self.clock = clock
+        self.sample_period = 1.0 / sample_rate_in_hz
+        self.register_file = register_file
+        self.register_offset = register_offset
+        self.monotonic = monotonic
+        self.gather_tables = [(chunk_shift, self._build_gather_table(chunk_shift)) for chunk_shift in range(0, 32, GATHER_CHUNK_BITS)]
+        self.on_edge_callback = None
+        self.sensor_values = None
+        self.num_samples = 0
+        self.num_overruns = 0  # Samples taken late by more than one period
+        self._registers = None
+        self._reference_time = None
+        self._reference_monotonic = None
+        self._running = False
+        self._thread = None
+
+    def start(self, on_edge_callback, run_thread=True):
+        self.on_edge_callback = on_edge_callback
+        fd = os.open(self.register_file, os.O_RDWR | os.O_SYNC)
+        try:
+            self._registers = mmap.mmap(fd, GPIO_REGISTERS_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self._set_input_mode()
+        self._reference_time = self.clock.now()
+        self._reference_monotonic = self.monotonic()
+        initial_sensor_word = self._read_sensor_word()
+        self.sensor_values = initial_sensor_word
+        if run_thread:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='gpio-sampler', daemon=True)
+            self._thread.start()
+        return initial_sensor_word
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._registers:
+            self._registers.close()
+            self._registers = None
+
+    def sample(self, sample_monotonic):
+        self.num_samples += 1
+        word = self._read_sensor_word()
+        if word != self.sensor_values:
+            self.sensor_values = word
+            self.on_edge_callback(word, self._reference_time + timedelta(seconds=sample_monotonic - self._reference_monotonic))
+
+    def _run(self):
+        next_sample_at = self.monotonic()
+        while self._running:
+            now = self.monotonic()
+            if now < next_sample_at:
+                time.sleep(next_sample_at - now)
+                now = next_sample_at
+            elif now - next_sample_at > self.sample_period:
+                # Late (e.g. preempted): skip the missed samples instead of catching up with a burst
+                self.num_overruns += 1
+                next_sample_at = now
+            self.sample(now)
+            next_sample_at += self.sample_period
+
+    def _set_input_mode(self):
+        for sensor_pin in self.sensor_pins:
+            offset = GPFSEL0_OFFSET + (sensor_pin // 10) * 4
+            shift = (sensor_pin % 10) * 3
+            function_select = struct.unpack_from('<I', self._registers, offset)[0]
+            if function_select & (0b111 << shift):
+                struct.pack_into('<I', self._registers, offset, function_select & ~(0b111 << shift))
+
+    def _read_sensor_word(self):
+        # A low level means the sensor sees black, i.e. a 1 (same inversion as in GPIOSensorsAdapter)
+        levels = ~struct.unpack_from('<I', self._registers, self.register_offset)[0]
+        word = 0
+        for chunk_shift, table in self.gather_tables:
+            word |= table[(levels >> chunk_shift) & GATHER_CHUNK_MASK]
+        return word
+
+    def _build_gather_table(self, chunk_shift):
+        # Sensor word bits set by each value of the register chunk
+        bit_moves = [(sensor_pin - chunk_shift, idx) for idx, sensor_pin in enumerate(self.sensor_pins)
+                     if chunk_shift <= sensor_pin < chunk_shift + GATHER_CHUNK_BITS]
+        table = []
+        for chunk_value in range(1 << GATHER_CHUNK_BITS):
+            word = 0
+            for chunk_bit, word_bit in bit_moves:
+                if chunk_value & (1 << chunk_bit):
+                    word |= 1 << word_bit
+            table.append(word)
+        return table
+
+
+if __name__ == '__main__':
+    def main():
+        from ..clock import Clock
+
+        def print_values(sensor_word, timestamp=None):
+            print('Sensors: {0} {1}'.format(''.join([('.' if sensor_word & (1 << idx) else 'O') for idx in range(12)]), timestamp))
+        adapter = MmapGPIOSensorsAdapter([11, 9, 10, 22, 27, 17, 14, 15, 18, 25, 8, 7], Clock())
+        print_values(adapter.start(print_values))
+        try:
+            while True:
+                time.sleep(1)
+                print('{0} samples, {1} overruns'.format(adapter.num_samples, adapter.num_overruns))
+        except:
+            pass
+        adapter.stop()
+    main()
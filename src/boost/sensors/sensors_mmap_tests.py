@@ -0,0 +1,93 @@
+import unittest
+import mmap
+import os
+import queue
+import struct
+import tempfile
+from datetime import datetime, timedelta
+from .sensors_mmap import MmapGPIOSensorsAdapter, GPIO_REGISTERS_SIZE, GPFSEL0_OFFSET, GPLEV0_OFFSET
+
+
+SENSOR_PINS = [11, 9, 10, 22, 27, 17, 14, 15, 18, 25, 8, 7]
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+
+class FakeRegisterFile(object):
+    """
+    Stands in for /dev/gpiomem: a file of the same size, mapped by the test to set the pin levels.
+    """
+    def __init__(self):
+        fd, self.filepath = tempfile.mkstemp()
+        os.write(fd, bytes(GPIO_REGISTERS_SIZE))
+        self.registers = mmap.mmap(fd, GPIO_REGISTERS_SIZE)
+        os.close(fd)
+        self.set_levels(0xffffffff)  # All white
+
+    def set_levels(self, levels):
+        struct.pack_into('<I', self.registers, GPLEV0_OFFSET, levels)
+
+    def set_black(self, sensor_pins):
+        levels = 0xffffffff
+        for sensor_pin in sensor_pins:
+            levels &= ~(1 << sensor_pin)
+        self.set_levels(levels)
+
+    def close(self):
+        self.registers.close()
+        os.remove(self.filepath)
+
+
+class MmapGPIOSensorsAdapterTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.register_file = FakeRegisterFile()
+        self.monotonic_now = 100.0
+        self.adapter = MmapGPIOSensorsAdapter(SENSOR_PINS, self.clock, 10000, self.register_file.filepath, monotonic=lambda: self.monotonic_now)
+        self.edges = []
+
+    def tearDown(self):
+        self.adapter.stop()
+        self.register_file.close()
+
+    def on_edge(self, word, timestamp=None):
+        self.edges.append((word, timestamp))
+
+    def test_initial_word_gathers_the_sensor_pins(self):
+        self.register_file.set_black([11, 7, 4])  # GPIO 4 is not a sensor
+        self.assertEqual(self.adapter.start(self.on_edge, run_thread=False), 0b100000000001)
+
+    def test_sensor_pins_are_set_to_input(self):
+        # GPIO 7 and 9 as outputs (001), GPIO 4 as alternate function 0 (100)
+        struct.pack_into('<I', self.register_file.registers, GPFSEL0_OFFSET, (0b001 << 21) | (0b001 << 27) | (0b100 << 12))
+        self.adapter.start(self.on_edge, run_thread=False)
+        self.assertEqual(struct.unpack_from('<I', self.register_file.registers, GPFSEL0_OFFSET)[0], 0b100 << 12)
+
+    def test_sample_rate_is_capped(self):
+        with self.assertRaises(AssertionError):
+            MmapGPIOSensorsAdapter(SENSOR_PINS, self.clock, 100000, self.register_file.filepath)
+
+    def test_emits_only_on_change(self):
+        self.adapter.start(self.on_edge, run_thread=False)
+        self.adapter.sample(100.0001)
+        self.assertEqual(self.edges, [])
+        self.register_file.set_black([10])
+        self.adapter.sample(100.0002)
+        self.adapter.sample(100.0003)
+        self.assertEqual(self.edges, [(0b100, datetime(2019, 4, 9, 22, 5, 0) + timedelta(microseconds=200))])
+        self.assertEqual(self.adapter.num_samples, 3)
+
+    def test_sampler_thread(self):
+        edges = queue.Queue()
+        self.adapter = MmapGPIOSensorsAdapter(SENSOR_PINS, self.clock, 2000, self.register_file.filepath)
+        self.adapter.start(lambda word, timestamp: edges.put(word))
+        self.register_file.set_black([9, 22])
+        self.assertEqual(edges.get(timeout=1.0), 0b1010)
+        self.register_file.set_black([])
+        self.assertEqual(edges.get(timeout=1.0), 0)
@@ -1,13 +1,17 @@
 
 class MockSensorsAdapter(object):
-    def __init__(self, sensor_pins):
+    def __init__(self, sensor_pins, deliver_word=False):
         self.sensor_pins = sensor_pins
+        self.deliver_word = deliver_word
         self.on_edge_callback = None
         self.sensor_values = None
 
     def start(self, on_edge_callback):
         self.on_edge_callback = on_edge_callback
-        self.sensor_values = [self._read_sensor(sensor_pin) for sensor_pin in self.sensor_pins]
+        if self.deliver_word:
+            self.sensor_values = 0
+        else:
+            self.sensor_values = [self._read_sensor(sensor_pin) for sensor_pin in self.sensor_pins]
         return self.sensor_values
 
     def stop(self):
@@ -0,0 +1,79 @@
+from datetime import timedelta
+import threading
+import time
+from .recording import read_sensor_recording
+
+
+class ReplaySensorsAdapter(object):
+    """
+    Feeds a sensors recording back, as sensor words, at 1x or at any speed-up factor (None: as fast as possible).
+
+    Snapshots carry their recorded timestamp (relative to when the replay starts), so that whatever is downstream
+    sees the same timing as the original run, regardless of the speed-up. That holds for the shaft encoders alone: the
+    app measures everything else (stasis, ramps, ticks) on the wall clock, so it must replay at 1x.
+    """
+    def __init__(self, filepath, clock, speed_factor=1.0):
+        self.filepath = filepath
+        self.clock = clock
+        self.speed_factor = speed_factor
+        with open(filepath, 'rb') as fileobj:
+            num_sensors, self.records = read_sensor_recording(fileobj)
+        self.sensor_pins = list(range(num_sensors))
+        self.on_edge_callback = None
+        self.sensor_values = None
+        self.finished = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self, on_edge_callback):
+        self.on_edge_callback = on_edge_callback
+        initial_sensor_word = self.records[0][1] if self.records else 0
+        self.sensor_values = initial_sensor_word
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(self.clock.now(),), name='sensors-replay', daemon=True)
+        self._thread.start()
+        return initial_sensor_word
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, start_time):
+        started_at = time.monotonic()
+        for seconds, sensor_word in self.records[1:]:
+            if not self._running:
+                break
+            if self.speed_factor:
+                delay = seconds / self.speed_factor - (time.monotonic() - started_at)
+                if delay > 0:
+                    time.sleep(delay)
+            self.sensor_values = sensor_word
+            self.on_edge_callback(sensor_word, start_time + timedelta(seconds=seconds))
+        self.finished.set()
+
+
+if __name__ == '__main__':
+    def main():
+        # Replay a recording through the shaft encoders as fast as possible, to profile the decoding path
+        import sys
+        from ..clock import Clock
+        from .shaft_encoder import ShaftEncoders
+
+        clock = Clock()
+        adapter = ReplaySensorsAdapter(sys.argv[1], clock, speed_factor=None)
+        num_changes = [0]
+
+        def count_changes(positions, speeds):
+            num_changes[0] += 1
+        shaft_encoders = ShaftEncoders(adapter, {'A': [0, 1, 2, 3, 4, 5], 'B': [6, 7, 8, 9, 10, 11]}, clock, 1.0, 800, lambda message: None)
+        started_at = time.perf_counter()
+        shaft_encoders.start(count_changes)
+        adapter.finished.wait()
+        elapsed = time.perf_counter() - started_at
+        shaft_encoders.stop()
+        print('{0} snapshots, {1} position changes in {2:.3f} sec ({3:.0f} snapshots/sec)'.format(
+            len(adapter.records), num_changes[0], elapsed, len(adapter.records) / elapsed))
+        print('Rejected transitions: {0}'.format(shaft_encoders.get_rejected_transitions()))
+    main()
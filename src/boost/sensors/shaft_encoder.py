@@ -1,10 +1,55 @@
 from collections import namedtuple
 from datetime import timedelta
+import threading
 from ..gray_code import generate_gray_codes
+from .transitions import GrayTransitionValidator
+from .velocity import VelocityEstimator
+from .health import SensorHealthMonitor
 
 
 WheelPosition = namedtuple('WheelPosition', 'position angle code')
 
+# Unwrapped position of a shaft, since the start:
+#  - steps: cumulative sector count (equal to the position value during the first turn, growing with it)
+#  - turns: number of full turns (negative when turning the other way)
+#  - angle: cumulative angle, same reference as the WheelPosition angle but not wrapped to 0-360
+Odometry = namedtuple('Odometry', 'steps turns angle')
+
+# Consistent view of all the devices, replaced as a whole (never modified) on each update, so that readers on other
+# threads need no locks. The version grows by one on each update, "timestamp" is the time of the last update.
+# The per-device dicts are:
+#  - positions: WheelPosition
+#  - odometry_steps: see Odometry
+#  - step_directions: +1 when the last transition made the position grow, -1 otherwise, 0 before any
+#  - edge_timestamps: time of the last accepted transition
+PositionsSnapshot = namedtuple('PositionsSnapshot', 'version timestamp positions odometry_steps step_directions edge_timestamps')
+
+
+# Number of sensors decoded with one table lookup
+DECODE_CHUNK_BITS = 8
+CHUNK_MASK = (1 << DECODE_CHUNK_BITS) - 1
+
+# A stuck sensor hides one edge and reflects the gray code: the device turns back after about two step intervals,
+# much quicker than the shaft could actually stop and turn back (and slower than a chattering sensor)
+STUCK_REVERSAL_INTERVAL_RANGE = (1.5, 4.0)
+# Toggles per second that always count as healthy, whatever the maximum speed
+MIN_CHATTER_TOGGLES_PER_SEC = 10
+
+
+def sensor_values_to_word(values):
+    """
+    Pack a list of '0'/'1' sensor values into an integer word: bit N is the value of sensor N.
+    """
+    word = 0
+    for idx, value in enumerate(values):
+        if value == '1':
+            word |= 1 << idx
+    return word
+
+
+def sensor_word_to_values(word, num_sensors):
+    return ['1' if word & (1 << idx) else '0' for idx in range(num_sensors)]
+
 
 class ShaftEncoders(object):
     def __init__(self, sensors_adapter, devices, clock, stasis_timeout, max_speed, log_error_message):
@@ -12,84 +57,384 @@ class ShaftEncoders(object):
         self.devices = devices
         self.clock = clock
         self.stasis_timeout = timedelta(seconds=stasis_timeout)
-        self.max_speed = max_speed  # Degrees per second
+        self.max_speed = max_speed  # Degrees per second, transitions requiring a higher speed are rejected
         self.log_error_message = log_error_message
 
         self._on_device_angle_changed = None
-        self.current_positions = None
-        self.last_position_ts = {}
+        self._started = threading.Event()
+        self.snapshot = None  # PositionsSnapshot, only ever replaced by the sensors thread
+        self.last_step_interval = {}  # Seconds between the last two accepted transitions
+
+        # Each device has its own resolution, given by the number of sensors reading its disk
+        self.device_names = sorted(devices.keys())
+        self.num_codes = dict((device, 1 << len(devices[device])) for device in self.device_names)
+
+        # Flyweight tables of pre-built positions, indexed by the integer value of the gray code (shared by the devices
+        # with the same resolution)
+        code_tables = {}
+        self.code_to_wheel_position = {}
+        for device in self.device_names:
+            num_bits = len(devices[device])
+            if num_bits not in code_tables:
+                code_tables[num_bits] = self._build_code_table(num_bits)
+            self.code_to_wheel_position[device] = code_tables[num_bits]
 
-        # Initialize gray code tables
-        num_bits_per_device = len(list(devices.values())[0])
-        all_codes = generate_gray_codes(num_bits_per_device)
-        self.gray_code_to_integer_map = dict((code, idx) for idx, code in enumerate(all_codes))
-        self.num_codes = len(all_codes)
+        # Band alignment: offset (in degrees, positive when the edge comes at a larger angle) of the edges of each band,
+        # in the same order as the sensors of the device (MSB to LSB). Applied to the boundaries of the sectors.
+        self.band_offsets = dict((device, [0.0] * len(devices[device])) for device in self.device_names)
+        self.boundary_offsets = dict((device, [0.0] * self.num_codes[device]) for device in self.device_names)  # Per position, top boundary
+        self.edge_recordings = {}  # device -> list of (seconds since epoch, boundary crossed), see "start_recording_edges"
+
+        # The gray codes of all the devices are packed in one integer, each in its own field (in "device_names" order),
+        # and the sensor word is turned into that integer with one table lookup per chunk of sensors, whatever the number
+        # of devices.
+        self.device_fields = []  # (device, shift, mask), the field of each device in the packed codes
+        shift = 0
+        for device in self.device_names:
+            self.device_fields.append((device, shift, self.num_codes[device] - 1))
+            shift += len(devices[device])
+        self.num_sensors = max(max(sensor_indexes) for sensor_indexes in devices.values()) + 1
+        self.sensor_word_mask = (1 << self.num_sensors) - 1
+        self.chunk_decode_tables = [(chunk_shift, self._build_chunk_decode_table(chunk_shift))
+                                    for chunk_shift in range(0, self.num_sensors, DECODE_CHUNK_BITS)]
+        self.current_packed_codes = None  # Packed codes of the positions in the snapshot
+
+        # Sensor health: flagged sensors are masked out of the packed codes, and the positions of their devices are
+        # decoded from the remaining bits
+        self.code_bit_sensors = dict((device, list(reversed(devices[device]))) for device in self.device_names)  # LSB first
+        self.sensor_health = SensorHealthMonitor(self.num_sensors, self._max_toggles_per_sec(max_speed))
+        self.last_sensor_word = None
+        self.masked_code_bits = dict((device, 0) for device in self.device_names)
+        self.packed_codes_mask = -1
+
+        self.transition_validators = dict((device, GrayTransitionValidator(self.num_codes[device], max_speed)) for device in devices.keys())
+        self.velocity_estimators = dict((device, VelocityEstimator(self.num_codes[device], stasis_timeout)) for device in devices.keys())
+        self.epoch = None  # Timestamps are given to the velocity estimators as seconds since this time
 
     def start(self, on_device_angle_changed):
         self._on_device_angle_changed = on_device_angle_changed
         current_sensor_values = self.sensors_adapter.start(self._on_sensor_values)
-        self.current_positions = self._decode_values(current_sensor_values)
+        current_sensor_word = self._to_sensor_word(current_sensor_values)
+        current_packed_codes = self._pack_codes(current_sensor_word)
+        current_positions = self._unpack_positions(current_packed_codes)
         now = self.clock.now()
-        for device in self.current_positions.keys():
-            self.last_position_ts[device] = now
-        return self.current_positions
+        self.epoch = now
+        for device, position in current_positions.items():
+            self.velocity_estimators[device].reset(0.0, position.position)
+            self.last_step_interval[device] = None
+        self.sensor_health.reset(now)
+        self.last_sensor_word = current_sensor_word
+        self.current_packed_codes = current_packed_codes
+        self.snapshot = PositionsSnapshot(0, now, current_positions,
+                                          dict((device, position.position) for device, position in current_positions.items()),
+                                          dict((device, 0) for device in current_positions.keys()),
+                                          dict((device, now) for device in current_positions.keys()))
+        self._started.set()
+        return current_positions
 
     def stop(self):
         self.sensors_adapter.stop()
 
+    def get_snapshot(self):
+        return self.snapshot
+
     def get_current_position(self, device):
-        return self.current_positions[device]
+        return self.snapshot.positions[device]
 
     def get_current_positions(self):
-        return self.current_positions
+        return self.snapshot.positions
+
+    def get_odometry(self, device, snapshot=None):
+        steps = (snapshot or self.snapshot).odometry_steps[device]
+        num_codes = self.num_codes[device]
+        return Odometry(steps, steps // num_codes, 360.0 - 360.0 / num_codes * steps)
+
+    def set_band_offsets(self, device, band_offsets):
+        """
+        Offsets of the bands, as measured by the calibration (see boost.calibration), in degrees, MSB to LSB.
+        """
+        assert len(band_offsets) == len(self.devices[device]), 'One offset per band of device {0}'.format(device)
+        num_codes = self.num_codes[device]
+        num_bits = len(band_offsets)
+        self.band_offsets[device] = list(band_offsets)
+        # The top boundary of a position is where the band toggled by the transition from the previous position changes
+        boundary_offsets = []
+        for position in range(num_codes):
+            code_bit = self._gray_code(position) ^ self._gray_code((position - 1) % num_codes)
+            boundary_offsets.append(band_offsets[num_bits - code_bit.bit_length()])
+        self.boundary_offsets[device] = boundary_offsets
+        # Positions with the calibrated angles, specific to this device
+        self.code_to_wheel_position[device] = self._build_code_table(num_bits, boundary_offsets)
+
+    def get_sector_bounds(self, device, steps):
+        """
+        Top and bottom angles (same reference as the odometry angle) of the sector reached after the given odometry steps.
+        """
+        boundary_offsets = self.boundary_offsets[device]
+        num_codes = self.num_codes[device]
+        sector_angle = 360.0 / num_codes
+        top_angle = 360.0 - sector_angle * steps + boundary_offsets[steps % num_codes]
+        bottom_angle = 360.0 - sector_angle * (steps + 1) + boundary_offsets[(steps + 1) % num_codes]
+        return top_angle, bottom_angle
+
+    def start_recording_edges(self, device):
+        """
+        Records the time of each one-sector transition of the device, and the boundary it crossed (the odometry steps of
+        the position on the far side of the boundary, when the position grows). Returns the list it keeps appending to.
+        """
+        edges = []
+        self.edge_recordings[device] = edges
+        return edges
+
+    def stop_recording_edges(self, device):
+        return self.edge_recordings.pop(device, None)
+
+    def get_interpolated_angle(self, device, timestamp=None, snapshot=None):
+        """
+        Cumulative angle (same reference as the odometry angle) at the given time, extrapolated from the last edge with
+        the velocity estimated at that edge, and clamped to the bounds of the current sector.
 
-    def _on_sensor_values(self, values):
+        The sector of a position spans the angle [angle - sector, angle] (corrected by the band offsets): it was entered
+        from the top if the position grew (angle decreasing) and from the bottom otherwise.
+        """
+        now = timestamp if timestamp is not None else self.clock.now()
+        snapshot = snapshot or self.snapshot
+        top_angle, bottom_angle = self.get_sector_bounds(device, snapshot.odometry_steps[device])
+        direction = snapshot.step_directions[device]
+        if direction == 0:
+            return (top_angle + bottom_angle) / 2.0  # No edge seen yet, the best guess is the middle of the sector
+        entry_angle = top_angle if direction > 0 else bottom_angle
+        last_edge_ts = snapshot.edge_timestamps[device]
+        angle = entry_angle + self.get_velocity(device, last_edge_ts).velocity * (now - last_edge_ts).total_seconds()
+        return min(top_angle, max(bottom_angle, angle))
+
+    def get_velocity(self, device, timestamp=None):
+        """
+        Signed velocity (degrees/sec, positive when the angle increases), acceleration and confidence of the estimate.
+        """
+        now = timestamp if timestamp is not None else self.clock.now()
+        return self.velocity_estimators[device].estimate((now - self.epoch).total_seconds())
+
+    def _on_sensor_values(self, values, timestamp=None):
+        # Adapters that know when the edge actually happened (e.g. kernel timestamps) pass it along
+        if self.snapshot is None:
+            # The adapter's thread can deliver values before "start" is done with the initial ones
+            self._started.wait()
+        snapshot = self.snapshot
         positions = {}
         speeds = {}
-        now = self.clock.now()
-        for device, position in self._decode_values(values).items():
-            last_position = self.current_positions[device]
-            if position != last_position:
-                positions[device] = position
-                last_position_ts = self.last_position_ts.get(device, None)
-                speed = None
-                if last_position_ts:
-                    elapsed_time_since_last_read = now - last_position_ts
-                    if elapsed_time_since_last_read < self.stasis_timeout:
-                        speed = self._calculate_angular_speed(last_position, position, elapsed_time_since_last_read)
-                if speed and speed > self.max_speed:
-                    self.log_error_message('Speed too high ({0} deg/sec). Probably the result of a faulty sensor read on the shaft encoder.'.format(speed))
-                    return
-                speeds[device] = speed
-            self.last_position_ts[device] = now
-            self.current_positions[device] = position
+        steps_by_device = {}
+        now = timestamp if timestamp is not None else self.clock.now()
+        word = self._to_sensor_word(values)
+        toggled_sensors = word ^ self.last_sensor_word
+        if not toggled_sensors:
+            return
+        self.last_sensor_word = word
+        if self.sensor_health.on_toggles(toggled_sensors, now):
+            self._mask_flagged_sensors()
+        packed_codes = self._pack_codes(word) & self.packed_codes_mask
+        changed_codes = packed_codes ^ self.current_packed_codes
+        if not changed_codes:
+            return
+        for device, shift, mask in self.device_fields:
+            if not (changed_codes >> shift) & mask:
+                continue
+            last_position = snapshot.positions[device]
+            code = (packed_codes >> shift) & mask
+            masked_code_bits = self.masked_code_bits[device]
+            if masked_code_bits:
+                position = self._decode_partial_code(device, code, masked_code_bits, last_position, snapshot)
+            else:
+                position = self.code_to_wheel_position[device][code]
+            elapsed_time_since_last_read = (now - snapshot.edge_timestamps[device]).total_seconds()
+            if not self.transition_validators[device].accepts(last_position, position, elapsed_time_since_last_read):
+                # Hold the last good position of this device only, the other devices are still updated
+                self.log_error_message('Invalid transition on device {0} ({1} -> {2}). Probably the result of a faulty sensor read on the shaft encoder.'.format(
+                    device, last_position.position, position.position))
+                disagreeing_code_bits = (code ^ self._gray_code(last_position.position)) & ~masked_code_bits
+                if self.sensor_health.on_rejected_transition(self._code_bits_to_sensors(device, disagreeing_code_bits), now):
+                    self._mask_flagged_sensors()
+                continue
+            steps = self._shortest_steps(device, last_position, position)
+            if steps != 0 and self._is_fast_reversal_on_stuck_sensor(device, last_position, steps, elapsed_time_since_last_read, snapshot):
+                # The reversal came from the sensor that just got masked: decode again without it, keeping the direction
+                code &= ~self.masked_code_bits[device]
+                position = self._decode_partial_code(device, code, self.masked_code_bits[device], last_position, snapshot)
+                steps = self._shortest_steps(device, last_position, position)
+            if steps == 0:
+                continue  # Only a masked bit changed
+            steps_by_device[device] = steps
+            edge_recording = self.edge_recordings.get(device)
+            if edge_recording is not None and abs(steps) == 1:
+                boundary = snapshot.odometry_steps[device] + (1 if steps > 0 else 0)
+                edge_recording.append(((now - self.epoch).total_seconds(), boundary))
+            self.last_step_interval[device] = elapsed_time_since_last_read
+            velocity_estimator = self.velocity_estimators[device]
+            seconds_since_epoch = (now - self.epoch).total_seconds()
+            velocity_estimator.add_sample(seconds_since_epoch, position.position)
+            positions[device] = position
+            speeds[device] = velocity_estimator.estimate(seconds_since_epoch).velocity
+            self.current_packed_codes = (self.current_packed_codes & ~(mask << shift)) | (code << shift)
         if len(positions) > 0:
+            self.snapshot = self._next_snapshot(snapshot, now, positions, steps_by_device)
             self._on_device_angle_changed(positions, speeds)
 
+    @staticmethod
+    def _next_snapshot(snapshot, now, positions, steps_by_device):
+        # Copy on write: the current snapshot may be in use by other threads
+        new_positions = dict(snapshot.positions)
+        new_positions.update(positions)
+        odometry_steps = dict(snapshot.odometry_steps)
+        step_directions = dict(snapshot.step_directions)
+        edge_timestamps = dict(snapshot.edge_timestamps)
+        for device, steps in steps_by_device.items():
+            odometry_steps[device] += steps
+            step_directions[device] = 1 if steps > 0 else -1
+            edge_timestamps[device] = now
+        return PositionsSnapshot(snapshot.version + 1, now, new_positions, odometry_steps, step_directions, edge_timestamps)
+
+    def get_rejected_transitions(self):
+        return dict((device, validator.num_rejected) for device, validator in self.transition_validators.items())
+
+    def get_sensors_health(self, timestamp=None):
+        return self.sensor_health.get_health(timestamp if timestamp is not None else self.clock.now())
+
+    def reset_sensors_health(self):
+        self.sensor_health.reset(self.clock.now())
+        self._mask_flagged_sensors()
+
+    def _shortest_steps(self, device, last_position, position):
+        # The direction of the transition is the one of the shortest way around
+        num_codes = self.num_codes[device]
+        steps = (position.position - last_position.position) % num_codes
+        if steps > num_codes // 2:
+            steps -= num_codes
+        return steps
+
+    def _is_fast_reversal_on_stuck_sensor(self, device, last_position, steps, elapsed_time, snapshot):
+        """
+        Returns True if the reversal made a sensor be flagged as stuck (and masked).
+        """
+        last_direction = snapshot.step_directions[device]
+        last_interval = self.last_step_interval[device]
+        if last_direction == 0 or (steps > 0) == (last_direction > 0) or not last_interval:
+            return False
+        if not STUCK_REVERSAL_INTERVAL_RANGE[0] <= elapsed_time / last_interval <= STUCK_REVERSAL_INTERVAL_RANGE[1]:
+            return False
+        # Turning back right after a missed edge: more likely, the sensor that should have toggled next is stuck, and the
+        # gray code got reflected
+        expected_position = (last_position.position + last_direction) % self.num_codes[device]
+        code_bit = self._gray_code(last_position.position) ^ self._gray_code(expected_position)
+        if code_bit & self.masked_code_bits[device]:
+            return False
+        if self.sensor_health.on_fast_reversal(self._code_bits_to_sensors(device, code_bit).bit_length() - 1):
+            self._mask_flagged_sensors()
+            return True
+        return False
+
+    def _mask_flagged_sensors(self):
+        flagged_sensors = self.sensor_health.flagged_sensors
+        packed_codes_mask = -1
+        for device, shift, _ in self.device_fields:
+            masked_code_bits = 0
+            for code_bit, sensor in enumerate(self.code_bit_sensors[device]):
+                if flagged_sensors & (1 << sensor):
+                    masked_code_bits |= 1 << code_bit
+            if masked_code_bits and masked_code_bits != self.masked_code_bits[device]:
+                self.log_error_message('Sensors {0} of device {1} look stuck or chattering: ignoring them, with reduced resolution.'.format(
+                    [sensor for sensor in self.devices[device] if flagged_sensors & (1 << sensor)], device))
+            self.masked_code_bits[device] = masked_code_bits
+            packed_codes_mask &= ~(masked_code_bits << shift)
+        self.packed_codes_mask = packed_codes_mask
+        if self.current_packed_codes is not None:
+            self.current_packed_codes &= packed_codes_mask
+
+    def _decode_partial_code(self, device, code, masked_code_bits, last_position, snapshot):
+        # Of all the codes the masked bits allow, the closest to where the shaft is expected to be next
+        num_codes = self.num_codes[device]
+        expected_position = (last_position.position + snapshot.step_directions[device]) % num_codes
+        table = self.code_to_wheel_position[device]
+        best_position = None
+        best_distance = None
+        masked_values = masked_code_bits
+        while True:
+            position = table[code | masked_values]
+            distance = abs(position.position - expected_position)
+            distance = min(distance, num_codes - distance)
+            if best_distance is None or distance < best_distance:
+                best_position, best_distance = position, distance
+            if masked_values == 0:
+                return best_position
+            masked_values = (masked_values - 1) & masked_code_bits
+
+    def _code_bits_to_sensors(self, device, code_bits):
+        sensors = 0
+        for code_bit, sensor in enumerate(self.code_bit_sensors[device]):
+            if code_bits & (1 << code_bit):
+                sensors |= 1 << sensor
+        return sensors
+
+    @staticmethod
+    def _gray_code(position):
+        return position ^ (position >> 1)
+
+    def _max_toggles_per_sec(self, max_speed):
+        # At full speed, the LSB of a device toggles every other sector, the next bit every 4 sectors, and so on. Twice
+        # that is clearly chattering.
+        max_toggles = [float('inf')] * self.num_sensors
+        for device in self.device_names:
+            max_sectors_per_sec = max_speed / (360.0 / self.num_codes[device])
+            for code_bit, sensor in enumerate(self.code_bit_sensors[device]):
+                max_toggles[sensor] = max(MIN_CHATTER_TOGGLES_PER_SEC, 2.0 * max_sectors_per_sec / (1 << (code_bit + 1)))
+        return max_toggles
+
     def _decode_values(self, values):
-        result = {}
-        for device, sensor_indexes in self.devices.items():
-            sensor_values = [values[idx] for idx in sensor_indexes]
-            position = self._code_to_position(sensor_values)
-            result[device] = position
-        return result
-
-    def _code_to_position(self, code):
-        code_str = ''.join(code)
-        value = self.gray_code_to_integer_map[code_str]
-        angle = 360.0 - 360.0 / self.num_codes * value
-        return WheelPosition(value, angle, code_str)
+        """
+        Accepts either a list of '0'/'1' sensor values or an integer sensor word.
+        """
+        return self._unpack_positions(self._pack_codes(self._to_sensor_word(values)))
+
+    def _to_sensor_word(self, values):
+        return (values if isinstance(values, int) else sensor_values_to_word(values)) & self.sensor_word_mask
 
-    def _calculate_angular_speed(self, old_position, new_position, elapsed_time):
-        angle_diff_a = new_position.angle - old_position.angle
-        angle_diff_b = old_position.angle - new_position.angle
-        if angle_diff_a < 0:
-            angle_diff_a += 360.0
-        if angle_diff_b < 0:
-            angle_diff_b += 360.0
-        # Choose the minimum of the two angles
-        minimum_angle_diff = min(angle_diff_a, angle_diff_b)
-        return minimum_angle_diff / elapsed_time.total_seconds()  # Degrees per second
+    def _pack_codes(self, word):
+        packed_codes = 0
+        for chunk_shift, table in self.chunk_decode_tables:
+            packed_codes |= table[(word >> chunk_shift) & CHUNK_MASK]
+        return packed_codes
+
+    def _unpack_positions(self, packed_codes):
+        return dict((device, self.code_to_wheel_position[device][(packed_codes >> shift) & mask])
+                    for device, shift, mask in self.device_fields)
+
+    def _build_chunk_decode_table(self, chunk_shift):
+        # Packed codes contributed by each value of the sensors in the chunk
+        bit_moves = []  # (bit in the chunk, bit in the packed codes)
+        for device, shift, _ in self.device_fields:
+            sensor_indexes = self.devices[device]
+            for bit_idx, sensor_idx in enumerate(sensor_indexes):  # MSB to LSB
+                if chunk_shift <= sensor_idx < chunk_shift + DECODE_CHUNK_BITS:
+                    bit_moves.append((sensor_idx - chunk_shift, shift + len(sensor_indexes) - 1 - bit_idx))
+        table = []
+        for chunk_value in range(1 << DECODE_CHUNK_BITS):
+            packed_codes = 0
+            for chunk_bit, packed_bit in bit_moves:
+                if chunk_value & (1 << chunk_bit):
+                    packed_codes |= 1 << packed_bit
+            table.append(packed_codes)
+        return table
+
+    def _build_code_table(self, num_bits, boundary_offsets=None):
+        all_codes = generate_gray_codes(num_bits)
+        table = [None] * len(all_codes)
+        for value, code in enumerate(all_codes):
+            angle_offset = boundary_offsets[value] if boundary_offsets else 0.0
+            table[int(code, 2)] = self._build_wheel_position(value, code, len(all_codes), angle_offset)
+        return table
+
+    def _build_wheel_position(self, value, code_str, num_codes, angle_offset=0.0):
+        angle = 360.0 - 360.0 / num_codes * value + angle_offset
+        return WheelPosition(value, angle, code_str)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,301 @@
+import unittest
+from datetime import datetime, timedelta
+from .shaft_encoder import ShaftEncoders, sensor_values_to_word, sensor_word_to_values
+from ..gray_code import generate_gray_codes
+
+
+DEVICES = {
+    'A': [0, 1, 2, 3, 4, 5],
+    'B': [6, 7, 8, 9, 10, 11],
+}
+
+
+# Three heads with different resolutions, more sensors than a whole-word lookup table could cover
+MIXED_DEVICES = {
+    'A': [0, 1, 2, 3, 4, 5],
+    'B': [13, 12, 11, 10, 9, 8, 7, 6],
+    'C': [14, 15, 16, 17, 18, 19, 20, 21, 22, 23],
+}
+
+
+def word_for_positions(positions, devices=DEVICES):
+    word = 0
+    for device, position in positions.items():
+        code = position ^ (position >> 1)
+        sensor_indexes = devices[device]
+        for bit_idx, sensor_idx in enumerate(sensor_indexes):  # MSB to LSB
+            if code & (1 << (len(sensor_indexes) - 1 - bit_idx)):
+                word |= 1 << sensor_idx
+    return word
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class FakeSensorsAdapter(object):
+    def __init__(self, initial_values):
+        self.initial_values = initial_values
+        self.on_edge_callback = None
+
+    def start(self, on_edge_callback):
+        self.on_edge_callback = on_edge_callback
+        return self.initial_values
+
+    def stop(self):
+        pass
+
+
+class ShaftEncodersTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.adapter = FakeSensorsAdapter(0)
+        self.shaft_encoders = ShaftEncoders(self.adapter, DEVICES, self.clock, 1.0, 800, self.fail)
+        self.notifications = []
+
+    def on_device_angle_changed(self, positions, speeds):
+        self.notifications.append((positions, speeds))
+
+    def test_sensor_word_conversion(self):
+        values = ['1', '0', '0', '1', '0', '0', '0', '0', '0', '0', '0', '1']
+        word = sensor_values_to_word(values)
+        self.assertEqual(word, 0b100000001001)
+        self.assertEqual(sensor_word_to_values(word, 12), values)
+
+    def test_word_decoding_matches_gray_code_map(self):
+        gray_code_to_integer_map = dict((code, idx) for idx, code in enumerate(generate_gray_codes(6)))
+        for word in range(1 << 12):
+            values = sensor_word_to_values(word, 12)
+            positions = self.shaft_encoders._decode_values(word)
+            for device, sensor_indexes in DEVICES.items():
+                code = ''.join(values[idx] for idx in sensor_indexes)
+                self.assertEqual(positions[device].code, code)
+                self.assertEqual(positions[device].position, gray_code_to_integer_map[code])
+            self.assertEqual(self.shaft_encoders._decode_values(values), positions)
+
+    def test_positions_are_flyweights(self):
+        first = self.shaft_encoders._decode_values(0b000001000001)
+        second = self.shaft_encoders._decode_values(['1', '0', '0', '0', '0', '0', '1', '0', '0', '0', '0', '0'])
+        self.assertIs(first['A'], second['A'])
+        self.assertIs(first['A'], second['B'])
+
+    def test_edges_as_sensor_words(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        self.clock.add(timedelta(seconds=0.1))
+        self.adapter.on_edge_callback(0b100000)  # LSB of device A
+        self.assertEqual(len(self.notifications), 1)
+        positions, speeds = self.notifications[0]
+        self.assertEqual(list(positions.keys()), ['A'])
+        self.assertEqual(positions['A'].position, 1)
+        # Position values grow as the angle decreases
+        self.assertAlmostEqual(speeds['A'], -360.0 / 64 / 0.1)
+
+    def test_invalid_transition_only_drops_the_faulty_device(self):
+        self.shaft_encoders.log_error_message = lambda message: None
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        self.clock.add(timedelta(milliseconds=5))
+        # Device A jumps half a turn in 5 ms, device B moves by one sector
+        self.adapter.on_edge_callback(word_for_positions({'A': 32, 'B': 1}))
+        positions, speeds = self.notifications[-1]
+        self.assertEqual(list(positions.keys()), ['B'])
+        self.assertEqual(self.shaft_encoders.get_current_position('A').position, 0)
+        self.assertEqual(self.shaft_encoders.get_current_position('B').position, 1)
+        self.assertEqual(self.shaft_encoders.get_rejected_transitions(), {'A': 1, 'B': 0})
+
+        # Moving one sector from the held position is fine
+        self.clock.add(timedelta(milliseconds=5))
+        self.adapter.on_edge_callback(word_for_positions({'A': 63, 'B': 1}))
+        positions, speeds = self.notifications[-1]
+        self.assertEqual(positions['A'].position, 63)
+
+    def test_large_jumps_are_rejected_after_stasis(self):
+        self.shaft_encoders.log_error_message = lambda message: None
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        # Still for a second: a misread of several bits is still a misread
+        self.clock.add(timedelta(seconds=1))
+        self.adapter.on_edge_callback(word_for_positions({'A': 32, 'B': 0}))
+        self.assertEqual(self.shaft_encoders.get_current_position('A').position, 0)
+        self.assertEqual(self.shaft_encoders.get_rejected_transitions(), {'A': 1, 'B': 0})
+        # One missed edge is tolerated
+        self.adapter.on_edge_callback(word_for_positions({'A': 2, 'B': 0}))
+        self.assertEqual(self.shaft_encoders.get_current_position('A').position, 2)
+
+    def test_velocity_is_signed_and_decays_between_edges(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        for position in [63, 62, 61, 60, 59]:
+            self.clock.add(timedelta(milliseconds=50))
+            self.adapter.on_edge_callback(word_for_positions({'A': position, 'B': 0}))
+        sector_angle = 360.0 / 64
+        estimate = self.shaft_encoders.get_velocity('A')
+        self.assertAlmostEqual(estimate.velocity, sector_angle / 0.05)
+        self.assertAlmostEqual(estimate.acceleration, 0.0)
+        self.assertGreater(estimate.confidence, 0.5)
+        self.assertEqual(self.shaft_encoders.get_velocity('B').velocity, 0.0)
+
+        # No edges for 200 ms: it cannot be faster than one sector in 200 ms
+        self.clock.add(timedelta(milliseconds=200))
+        estimate = self.shaft_encoders.get_velocity('A')
+        self.assertLess(estimate.velocity, sector_angle / 0.2)
+        self.assertGreater(estimate.velocity, 0.0)
+
+        self.clock.add(timedelta(seconds=1))
+        self.assertEqual(self.shaft_encoders.get_velocity('A').velocity, 0.0)
+
+    def test_odometry_across_full_turns(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        for step in range(1, 64 * 2 + 6):
+            self.clock.add(timedelta(milliseconds=10))
+            self.adapter.on_edge_callback(word_for_positions({'A': step % 64, 'B': (-step) % 64}))
+        odometry = self.shaft_encoders.get_odometry('A')
+        self.assertEqual(odometry.steps, 64 * 2 + 5)
+        self.assertEqual(odometry.turns, 2)
+        self.assertAlmostEqual(odometry.angle, 360.0 - 360.0 / 64 * (64 * 2 + 5))
+        odometry = self.shaft_encoders.get_odometry('B')
+        self.assertEqual(odometry.steps, -(64 * 2 + 5))
+        self.assertEqual(odometry.turns, -3)
+
+    def test_band_offsets_move_the_sector_boundaries(self):
+        sector_angle = 360.0 / 64
+        self.shaft_encoders.set_band_offsets('A', [0.0, 0.0, 0.0, 0.0, 0.5, -0.25])
+        # Position 1 is entered when the LSB toggles, position 2 when the next band does
+        top_angle, bottom_angle = self.shaft_encoders.get_sector_bounds('A', 1)
+        self.assertAlmostEqual(top_angle, 360.0 - sector_angle - 0.25)
+        self.assertAlmostEqual(bottom_angle, 360.0 - sector_angle * 2 + 0.5)
+        self.assertAlmostEqual(self.shaft_encoders._decode_values(word_for_positions({'A': 2}))['A'].angle, 360.0 - sector_angle * 2 + 0.5)
+        # Other devices are not affected
+        self.assertAlmostEqual(self.shaft_encoders.get_sector_bounds('B', 1)[0], 360.0 - sector_angle)
+        self.assertAlmostEqual(self.shaft_encoders._decode_values(word_for_positions({'B': 2}))['B'].angle, 360.0 - sector_angle * 2)
+
+    def test_snapshots_are_versioned_and_never_modified(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        first = self.shaft_encoders.get_snapshot()
+        self.assertEqual(first.version, 0)
+        self.clock.add(timedelta(milliseconds=10))
+        self.adapter.on_edge_callback(word_for_positions({'A': 1, 'B': 63}))
+        second = self.shaft_encoders.get_snapshot()
+        self.assertEqual(second.version, 1)
+        self.assertEqual(second.timestamp, self.clock.now())
+        self.assertEqual((second.positions['A'].position, second.positions['B'].position), (1, 63))
+        self.assertEqual(second.odometry_steps, {'A': 1, 'B': -1})
+        self.assertEqual(second.step_directions, {'A': 1, 'B': -1})
+        self.assertEqual((first.positions['A'].position, first.positions['B'].position), (0, 0))
+        self.assertEqual(first.odometry_steps, {'A': 0, 'B': 0})
+        # No position change, no new version
+        self.adapter.on_edge_callback(word_for_positions({'A': 1, 'B': 63}))
+        self.assertIs(self.shaft_encoders.get_snapshot(), second)
+
+    def test_interpolated_angle_within_sector(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        sector_angle = 360.0 / 64
+        self.assertAlmostEqual(self.shaft_encoders.get_interpolated_angle('A'), 360.0 - sector_angle / 2)
+        for position in range(1, 6):
+            self.clock.add(timedelta(milliseconds=50))
+            self.adapter.on_edge_callback(word_for_positions({'A': position, 'B': 0}))
+        # Position 5 was entered from its top (the angle decreases as the position grows)
+        top_angle = 360.0 - 5 * sector_angle
+        self.assertAlmostEqual(self.shaft_encoders.get_interpolated_angle('A'), top_angle)
+        self.assertAlmostEqual(self.shaft_encoders.get_interpolated_angle('A', self.clock.now() + timedelta(milliseconds=20)), top_angle - sector_angle * 0.4)
+        # Never beyond the current sector
+        self.assertAlmostEqual(self.shaft_encoders.get_interpolated_angle('A', self.clock.now() + timedelta(milliseconds=70)), top_angle - sector_angle)
+
+
+class MixedResolutionShaftEncodersTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.adapter = FakeSensorsAdapter(word_for_positions({'A': 3, 'B': 200, 'C': 1000}, MIXED_DEVICES))
+        self.shaft_encoders = ShaftEncoders(self.adapter, MIXED_DEVICES, self.clock, 1.0, 800, self.fail)
+        self.notifications = []
+
+    def on_device_angle_changed(self, positions, speeds):
+        self.notifications.append((positions, speeds))
+
+    def test_decoding_each_resolution(self):
+        self.assertEqual(self.shaft_encoders.num_codes, {'A': 64, 'B': 256, 'C': 1024})
+        for positions in ({'A': 0, 'B': 0, 'C': 0}, {'A': 63, 'B': 255, 'C': 1023}, {'A': 17, 'B': 128, 'C': 513}):
+            decoded = self.shaft_encoders._decode_values(word_for_positions(positions, MIXED_DEVICES))
+            self.assertEqual(dict((device, position.position) for device, position in decoded.items()), positions)
+        self.assertAlmostEqual(self.shaft_encoders._decode_values(word_for_positions({'C': 256}, MIXED_DEVICES))['C'].angle, 270.0)
+
+    def test_only_changed_devices_are_notified(self):
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        self.clock.add(timedelta(milliseconds=100))
+        self.adapter.on_edge_callback(word_for_positions({'A': 3, 'B': 201, 'C': 1000}, MIXED_DEVICES))
+        positions, speeds = self.notifications[-1]
+        self.assertEqual(list(positions.keys()), ['B'])
+        self.assertAlmostEqual(speeds['B'], -360.0 / 256 / 0.1)
+        # Noise on pins that do not belong to any device
+        self.adapter.on_edge_callback(word_for_positions({'A': 3, 'B': 201, 'C': 1000}, MIXED_DEVICES) | (1 << 24))
+        self.assertEqual(len(self.notifications), 1)
+        # Crossing the zero of a 10 bits disk
+        for position in list(range(1001, 1024)) + [0]:
+            self.clock.add(timedelta(milliseconds=5))
+            self.adapter.on_edge_callback(word_for_positions({'A': 3, 'B': 201, 'C': position}, MIXED_DEVICES))
+        self.assertEqual(self.shaft_encoders.get_odometry('C').steps, 1024)
+        self.assertEqual(self.shaft_encoders.get_odometry('C').turns, 1)
+
+
+class SensorHealthTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.adapter = FakeSensorsAdapter(0)
+        self.errors = []
+        self.shaft_encoders = ShaftEncoders(self.adapter, DEVICES, self.clock, 1.0, 800, self.errors.append)
+        self.shaft_encoders.start(lambda positions, speeds: None)
+
+    def turn_cw(self, num_steps, stuck_sensor=None, interval_ms=10):
+        for step in range(1, num_steps + 1):
+            self.clock.add(timedelta(milliseconds=interval_ms))
+            word = word_for_positions({'A': step % 64, 'B': 0})
+            if stuck_sensor is not None:
+                word &= ~(1 << stuck_sensor)
+            self.adapter.on_edge_callback(word)
+
+    def test_counters(self):
+        self.turn_cw(8)
+        health = self.shaft_encoders.get_sensors_health()
+        # Gray code: the LSB toggles every other step, the next bit every 4 steps...
+        self.assertEqual([sensor_health.num_toggles for sensor_health in health[:6]], [0, 0, 1, 1, 2, 4])
+        self.assertAlmostEqual(health[2].seconds_since_last_toggle, 0.0)
+        self.assertAlmostEqual(health[5].seconds_since_last_toggle, 0.01)
+        self.assertIsNone(health[0].seconds_since_last_toggle)
+        self.assertFalse(any(sensor_health.stuck or sensor_health.chattering for sensor_health in health))
+
+    def test_stuck_sensor_is_masked(self):
+        # The MSB of device A never sees black: the position reflects back at 31 and 0, at full speed
+        self.turn_cw(64 * 2, stuck_sensor=0)
+        health = self.shaft_encoders.get_sensors_health()
+        self.assertTrue(health[0].stuck)
+        self.assertEqual(self.shaft_encoders.masked_code_bits, {'A': 0b100000, 'B': 0})
+        self.assertEqual(len(self.errors), 1)
+        # From then on the position follows the shaft, with the MSB inferred from the direction of rotation
+        steps_before = self.shaft_encoders.get_odometry('A').steps
+        self.turn_cw(64 * 3, stuck_sensor=0)
+        self.assertEqual(self.shaft_encoders.get_odometry('A').steps, steps_before + 64 * 3)
+        # Back to 0, only the masked sensor toggles: the position is held one sector behind
+        self.assertEqual(self.shaft_encoders.get_current_position('A').position, 63)
+
+        self.shaft_encoders.reset_sensors_health()
+        self.assertEqual(self.shaft_encoders.masked_code_bits, {'A': 0, 'B': 0})
+
+    def test_chattering_sensor_is_masked(self):
+        # The LSB of device B flickers, way faster than the shaft could make it toggle
+        for idx in range(200):
+            self.clock.add(timedelta(milliseconds=2))
+            self.adapter.on_edge_callback(word_for_positions({'A': 0, 'B': idx % 2}))
+        health = self.shaft_encoders.get_sensors_health()
+        self.assertTrue(health[11].chattering)
+        self.assertFalse(health[5].chattering)
+        self.assertEqual(self.shaft_encoders.masked_code_bits, {'A': 0, 'B': 0b1})
+
+    def test_rejected_transitions_are_counted_per_sensor(self):
+        self.clock.add(timedelta(milliseconds=5))
+        self.adapter.on_edge_callback(word_for_positions({'A': 32, 'B': 0}))  # Half a turn in 5 ms
+        health = self.shaft_encoders.get_sensors_health()
+        self.assertEqual([sensor_health.num_rejected for sensor_health in health[:6]], [1, 1, 0, 0, 0, 0])
@@ -0,0 +1,30 @@
+import math
+
+
+class GrayTransitionValidator(object):
+    """
+    Per-device check of gray code transitions.
+
+    Adjacent gray codes differ by exactly one bit, so a healthy encoder moves one sector at a time. A new code is
+    accepted only if it is within the number of sectors the shaft can travel, at "max_speed", in the time elapsed
+    since the last accepted code, and never more than "max_steps" away: however long the shaft was still, a turning
+    shaft goes through every sector in between, so a longer jump means that edges were missed, or that several bits
+    were misread at once. Anything further away is a faulty read, and is counted and rejected.
+    """
+    def __init__(self, num_codes, max_speed, max_steps=2):
+        self.num_codes = num_codes
+        self.max_sectors_per_sec = max_speed / (360.0 / num_codes)  # max_speed is in degrees per second
+        self.max_steps = max_steps  # Sectors of a transition, with all the edges in between missed but one
+        self.num_accepted = 0
+        self.num_rejected = 0
+
+    def accepts(self, last_position, new_position, elapsed_time_in_sec):
+        steps = abs(new_position.position - last_position.position)
+        steps = min(steps, self.num_codes - steps)
+        # At least one sector is always reachable: consecutive edges can be arbitrarily close in time
+        reachable_steps = max(1, min(self.max_steps, int(math.ceil(elapsed_time_in_sec * self.max_sectors_per_sec))))
+        if steps <= reachable_steps:
+            self.num_accepted += 1
+            return True
+        self.num_rejected += 1
+        return False
@@ -0,0 +1,131 @@
+from array import array
+from collections import namedtuple
+
+
+# velocity in degrees per second, acceleration in degrees per second^2, confidence between 0 and 1
+# Positive values mean the angle of the WheelPosition is increasing.
+VelocityEstimate = namedtuple('VelocityEstimate', 'velocity acceleration confidence')
+
+STILL = VelocityEstimate(0.0, 0.0, 0.0)
+
+
+class VelocityEstimator(object):
+    """
+    Per-device estimate of velocity and acceleration, from the last few sector edges.
+
+    Samples (timestamp in seconds, unwrapped angle in degrees) are kept in a fixed-size ring buffer backed by arrays,
+    so that adding one (from the sensors thread) is O(1) and allocation-free. The estimate is only computed on demand,
+    by fitting a parabola through the samples that are younger than the stasis timeout.
+
+    The estimate is read from other threads without a lock: a sample is written before "head" is moved to it, and the
+    buffer has one slot more than the estimate uses, so the slot being written is never one that is being read.
+
+    Between edges, the speed decays towards zero: if no edge was seen for "dt" seconds, the shaft cannot be faster
+    than one sector every "dt" seconds, so the speed is bounded by that (minus the one sector per stasis timeout which
+    makes it reach zero at the stasis timeout, rather than jumping there).
+    """
+    def __init__(self, num_codes, stasis_timeout_in_sec, num_samples=8):
+        self.num_codes = num_codes
+        self.sector_angle = 360.0 / num_codes
+        self.stasis_timeout_in_sec = stasis_timeout_in_sec
+        self.num_samples = num_samples
+        self.buffer_size = num_samples + 1
+        self.timestamps = array('d', [0.0] * self.buffer_size)
+        self.angles = array('d', [0.0] * self.buffer_size)
+        self.count = 0
+        self.head = -1  # Index of the newest sample
+        self.last_position = None
+
+    def reset(self, timestamp, position):
+        self.count = 0
+        self.head = -1
+        self.last_position = None
+        self.add_sample(timestamp, position)
+
+    def add_sample(self, timestamp, position):
+        if self.last_position is None:
+            angle = 0.0
+        else:
+            steps = (position - self.last_position) % self.num_codes
+            if steps > self.num_codes // 2:
+                steps -= self.num_codes
+            # Position values grow as the angle decreases
+            angle = self.angles[self.head] - steps * self.sector_angle
+        self.last_position = position
+        head = (self.head + 1) % self.buffer_size
+        self.timestamps[head] = timestamp
+        self.angles[head] = angle
+        # Published only once the sample is complete
+        self.head = head
+        if self.count < self.num_samples:
+            self.count += 1
+
+    def estimate(self, timestamp):
+        # Consistent with each other, whatever the sensors thread does meanwhile
+        head, count = self.head, self.count
+        if count < 2:
+            return STILL
+        last_timestamp = self.timestamps[head]
+        time_since_last_edge = timestamp - last_timestamp
+        if time_since_last_edge >= self.stasis_timeout_in_sec:
+            return STILL
+
+        # Collect the recent samples, relative to the newest one
+        ts = []
+        angles = []
+        idx = head
+        last_angle = self.angles[head]
+        for _ in range(count):
+            t = self.timestamps[idx] - last_timestamp
+            if -t >= self.stasis_timeout_in_sec:
+                break
+            ts.append(t)
+            angles.append(self.angles[idx] - last_angle)
+            idx = (idx - 1) % self.buffer_size
+        if len(ts) < 2:
+            return STILL
+
+        if len(ts) == 2:
+            velocity = angles[1] / ts[1] if ts[1] != 0 else 0.0
+            acceleration = 0.0
+        else:
+            velocity, acceleration = _fit_parabola(ts, angles)
+            if velocity is None:
+                velocity = angles[1] / ts[1] if ts[1] != 0 else 0.0
+                acceleration = 0.0
+            velocity += acceleration * time_since_last_edge
+
+        confidence = (len(ts) - 1.0) / (self.num_samples - 1.0) * (1.0 - time_since_last_edge / self.stasis_timeout_in_sec)
+
+        # Decay between edges
+        if time_since_last_edge > 0:
+            max_speed = max(0.0, self.sector_angle / time_since_last_edge - self.sector_angle / self.stasis_timeout_in_sec)
+            if abs(velocity) > max_speed:
+                decay_acceleration = self.sector_angle / (time_since_last_edge * time_since_last_edge)
+                velocity, acceleration = (max_speed, -decay_acceleration) if velocity > 0 else (-max_speed, decay_acceleration)
+        return VelocityEstimate(velocity, acceleration, confidence)
+
+
+def _fit_parabola(ts, values):
+    """
+    Least squares fit of values = a + b*t + c*t^2. Returns the derivative at t=0 (b) and the second derivative (2c).
+    """
+    n = float(len(ts))
+    s1 = s2 = s3 = s4 = 0.0
+    v0 = v1 = v2 = 0.0
+    for t, v in zip(ts, values):
+        t2 = t * t
+        s1 += t
+        s2 += t2
+        s3 += t2 * t
+        s4 += t2 * t2
+        v0 += v
+        v1 += v * t
+        v2 += v * t2
+    # Solve the 3x3 normal equations with Cramer's rule
+    det = n * (s2 * s4 - s3 * s3) - s1 * (s1 * s4 - s3 * s2) + s2 * (s1 * s3 - s2 * s2)
+    if abs(det) < 1e-18:
+        return None, None
+    det_b = n * (v1 * s4 - s3 * v2) - v0 * (s1 * s4 - s3 * s2) + s2 * (s1 * v2 - v1 * s2)
+    det_c = n * (s2 * v2 - v1 * s3) - s1 * (s1 * v2 - v1 * s2) + v0 * (s1 * s3 - s2 * s2)
+    return det_b / det, 2.0 * det_c / det
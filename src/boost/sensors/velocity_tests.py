@@ -0,0 +1,63 @@
+import unittest
+from .velocity import VelocityEstimator
+
+
+class VelocityEstimatorTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.estimator = VelocityEstimator(64, 1.0)
+        self.sector_angle = 360.0 / 64
+
+    def test_not_enough_samples(self):
+        self.estimator.reset(0.0, 10)
+        self.assertEqual(self.estimator.estimate(0.1).velocity, 0.0)
+        self.assertEqual(self.estimator.estimate(0.1).confidence, 0.0)
+
+    def test_constant_acceleration(self):
+        # angle(t) = 100 * t^2, sampled at every sector (position values grow as the angle decreases)
+        self.estimator.reset(0.0, 0)
+        position = 0
+        for step in range(1, 8):
+            angle = step * self.sector_angle
+            t = (angle / 100.0) ** 0.5
+            position = (position - 1) % 64
+            self.estimator.add_sample(t, position)
+        estimate = self.estimator.estimate(t)
+        self.assertAlmostEqual(estimate.velocity, 200.0 * t, places=3)
+        self.assertAlmostEqual(estimate.acceleration, 200.0, places=3)
+        self.assertAlmostEqual(estimate.confidence, 1.0)
+
+    def test_wraps_around_a_full_turn(self):
+        self.estimator.reset(0.0, 62)
+        for idx, position in enumerate([63, 0, 1, 2]):
+            self.estimator.add_sample(0.01 * (idx + 1), position)
+        self.assertAlmostEqual(self.estimator.estimate(0.04).velocity, -self.sector_angle / 0.01)
+
+    def test_ring_buffer_keeps_only_the_latest_samples(self):
+        self.estimator.reset(0.0, 0)
+        # Slow first, then fast: only the fast samples are left in the buffer
+        for step in range(1, 5):
+            self.estimator.add_sample(0.1 * step, step)
+        for step in range(5, 15):
+            self.estimator.add_sample(0.4 + 0.01 * (step - 4), step)
+        self.assertAlmostEqual(self.estimator.estimate(0.5).velocity, -self.sector_angle / 0.01)
+
+    def test_estimate_while_a_sample_is_being_written(self):
+        self.estimator.reset(0.0, 0)
+        for step in range(1, 20):
+            self.estimator.add_sample(0.01 * step, step)
+        before = self.estimator.estimate(0.19)
+        estimates = []
+        angles = self.estimator.angles
+
+        class InterruptedAngles(object):
+            # The sensors thread is preempted halfway through writing a sample
+            def __getitem__(_, idx):
+                return angles[idx]
+
+            def __setitem__(_, idx, value):
+                estimates.append(self.estimator.estimate(0.19))
+                angles[idx] = value
+        self.estimator.angles = InterruptedAngles()
+        self.estimator.add_sample(0.2, 20)
+        self.assertEqual(estimates, [before])
+        self.assertAlmostEqual(self.estimator.estimate(0.2).velocity, -self.sector_angle / 0.01)
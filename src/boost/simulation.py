@@ -0,0 +1,207 @@
+from datetime import timedelta
+import math
+import threading
+import time
+from .motors.motors_mock import MockMotorsAdapter
+
+
+# NOTE: same convention as the motors controller and the shaft encoders:
+#  - positive power = positive velocity = Counter-Clockwise (CCW) rotation = increasing WheelPosition angle
+#  - negative power = Clockwise (CW) rotation
+
+
+class ShaftModel(object):
+    """
+    Motor + shaft + head, as a first order system with friction.
+
+    The power applied to the motor maps to a steady state speed through a power-to-speed curve (with a dead band where
+    the motor does not overcome static friction), and the shaft approaches that speed with a time constant given by its
+    inertia. When the motor does not drive the shaft, friction stops it.
+    """
+    def __init__(self, max_speed=360.0, time_constant=0.3, dead_band=0.1, curve_exponent=1.0, friction=180.0):
+        self.max_speed = max_speed            # Degrees per second, at full power
+        self.time_constant = time_constant    # Seconds, to cover ~63% of a speed change
+        self.dead_band = dead_band            # Power below which the motor cannot turn the shaft
+        self.curve_exponent = curve_exponent  # Shape of the power-to-speed curve, above the dead band
+        self.friction = friction              # Degrees per second^2, deceleration when not driven
+        self.power = 0.0
+        self.velocity = 0.0  # Degrees per second
+        self.angle = 0.0     # Degrees, unwrapped
+
+    def steady_state_speed(self, power):
+        magnitude = abs(power)
+        if magnitude <= self.dead_band:
+            return 0.0
+        speed = self.max_speed * ((min(magnitude, 1.0) - self.dead_band) / (1.0 - self.dead_band)) ** self.curve_exponent
+        return speed if power > 0 else -speed
+
+    def step(self, dt):
+        target_speed = self.steady_state_speed(self.power)
+        if target_speed == 0.0:
+            # Coasting: friction brings the shaft to a halt
+            decrease = self.friction * dt
+            if abs(self.velocity) <= decrease:
+                new_velocity = 0.0
+            else:
+                new_velocity = self.velocity - math.copysign(decrease, self.velocity)
+        else:
+            new_velocity = target_speed + (self.velocity - target_speed) * math.exp(-dt / self.time_constant)
+        self.angle += (self.velocity + new_velocity) / 2.0 * dt
+        self.velocity = new_velocity
+
+
+class HardwareSimulator(object):
+    """
+    Closed-loop stand-in for the motors and the shaft encoders: the power set on the motors adapter drives the shaft
+    models, and the rotation of the shafts comes out of the sensors adapter as gray code edges, on the pins of the
+    configured sensor devices.
+
+    "step" advances the simulation deterministically, so tests and benchmarks can run it faster than real time.
+    Once the sensors adapter is started, a thread steps it in real time: the edges are timestamped from the clock of the
+    app, whose ramps and ticks run on wall time, so the simulation can not run any faster there.
+
+    "band_offsets" simulates misaligned bands: per device, the offset in degrees of the edges of each band (MSB to LSB,
+    positive when the edge comes at a larger angle), less than half a sector.
+    """
+    def __init__(self, clock, sensor_devices, num_sensors=None, step_in_sec=0.001, shaft_model_factory=ShaftModel,
+                 band_offsets=None):
+        self.clock = clock
+        self.sensor_devices = sensor_devices
+        self.num_sensors = num_sensors or max(max(sensor_indexes) for sensor_indexes in sensor_devices.values()) + 1
+        self.step_in_sec = step_in_sec
+        self.shafts = dict((device, shaft_model_factory()) for device in sensor_devices.keys())
+        self.num_codes = dict((device, 1 << len(sensor_indexes)) for device, sensor_indexes in sensor_devices.items())
+        self.band_offsets = band_offsets or {}
+        self.motors_adapter = SimulatedMotorsAdapter(self)
+        self.sensors_adapter = SimulatedSensorsAdapter(self)
+        self.sensor_word = self._sensor_word()
+        self.simulated_time = 0.0  # Seconds since the start
+        self.start_time = None
+        self._on_sensor_word = None
+        self._running = False
+        self._thread = None
+
+    def get_position(self, device):
+        shaft = self.shafts[device]
+        num_codes = self.num_codes[device]
+        sector_angle = 360.0 / num_codes
+        # Position values grow as the angle decreases
+        phi = -shaft.angle
+        position = int(math.floor(phi / sector_angle))
+        if phi >= self._boundary_phi(device, position + 1):
+            position += 1
+        elif phi < self._boundary_phi(device, position):
+            position -= 1
+        return position % num_codes
+
+    def _boundary_phi(self, device, boundary):
+        # Boundary between the positions "boundary - 1" and "boundary", as the negated (unwrapped) angle
+        sector_angle = 360.0 / self.num_codes[device]
+        band_offsets = self.band_offsets.get(device)
+        if not band_offsets:
+            return boundary * sector_angle
+        position, previous_position = boundary % self.num_codes[device], (boundary - 1) % self.num_codes[device]
+        code_bit = (position ^ (position >> 1)) ^ (previous_position ^ (previous_position >> 1))
+        return boundary * sector_angle - band_offsets[len(band_offsets) - code_bit.bit_length()]
+
+    def step(self, dt):
+        previous_angles = dict((device, shaft.angle) for device, shaft in self.shafts.items())
+        for shaft in self.shafts.values():
+            shaft.step(dt)
+        # Emit one snapshot per crossed sector boundary, in time order
+        edges = []
+        for device, shaft in self.shafts.items():
+            num_codes = self.num_codes[device]
+            sector_angle = 360.0 / num_codes
+            # Position values grow as the angle decreases
+            start_phi, end_phi = -previous_angles[device], -shaft.angle
+            if start_phi == end_phi:
+                continue
+            low_sector, high_sector = sorted((int(math.floor(start_phi / sector_angle)), int(math.floor(end_phi / sector_angle))))
+            for boundary in range(low_sector, high_sector + 2):
+                boundary_phi = self._boundary_phi(device, boundary)
+                if start_phi < boundary_phi <= end_phi:
+                    position = boundary
+                elif end_phi < boundary_phi <= start_phi:
+                    position = boundary - 1
+                else:
+                    continue
+                time_offset = (boundary_phi - start_phi) / (end_phi - start_phi) * dt
+                edges.append((time_offset, device, position % num_codes))
+        edges.sort(key=lambda edge: edge[0])
+        for time_offset, device, position in edges:
+            self.sensor_word = self._set_device_position(self.sensor_word, device, position)
+            if self._on_sensor_word:
+                self._on_sensor_word(self.sensor_word, self.start_time + timedelta(seconds=self.simulated_time + time_offset))
+        self.simulated_time += dt
+
+    def start(self, on_sensor_word, run_thread=True):
+        self._on_sensor_word = on_sensor_word
+        self.start_time = self.clock.now()
+        if run_thread:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='hardware-simulator', daemon=True)
+            self._thread.start()
+        return self.sensor_word
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        started_at = time.monotonic()
+        while self._running:
+            delay = self.simulated_time - (time.monotonic() - started_at)
+            if delay > 0:
+                time.sleep(delay)
+            self.step(self.step_in_sec)
+
+    def _sensor_word(self):
+        word = 0
+        for device in self.shafts.keys():
+            word = self._set_device_position(word, device, self.get_position(device))
+        return word
+
+    def _set_device_position(self, word, device, position):
+        code = position ^ (position >> 1)
+        sensor_indexes = self.sensor_devices[device]
+        for bit_idx, sensor_idx in enumerate(sensor_indexes):  # MSB to LSB
+            if code & (1 << (len(sensor_indexes) - 1 - bit_idx)):
+                word |= 1 << sensor_idx
+            else:
+                word &= ~(1 << sensor_idx)
+        return word
+
+
+class SimulatedMotorsAdapter(MockMotorsAdapter):
+    def __init__(self, simulator):
+        super().__init__(print)
+        self.simulator = simulator
+
+    def set_motor_power(self, motor, power):
+        self.simulator.shafts[motor].power = power
+
+    def set_all_motors_power(self, power):
+        for shaft in self.simulator.shafts.values():
+            shaft.power = power
+
+    def get_motor_levels(self):
+        return dict((motor, shaft.power) for motor, shaft in self.simulator.shafts.items())
+
+    def stop(self):
+        for shaft in self.simulator.shafts.values():
+            shaft.power = 0.0
+
+
+class SimulatedSensorsAdapter(object):
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.sensor_pins = list(range(simulator.num_sensors))
+
+    def start(self, on_edge_callback):
+        return self.simulator.start(on_edge_callback)
+
+    def stop(self):
+        self.simulator.stop()
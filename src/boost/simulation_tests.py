@@ -0,0 +1,141 @@
+import unittest
+from datetime import datetime, timedelta
+from .simulation import HardwareSimulator, ShaftModel
+from .sensors.shaft_encoder import ShaftEncoders
+from .motors.motors_controller import MotorsController
+from .planner import Planner
+from .constants import MotorControllerConstants
+
+
+DEVICES = {
+    'A': [0, 1, 2, 3, 4, 5],
+    'B': [6, 7, 8, 9, 10, 11],
+}
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self._now = now
+
+    def now(self):
+        return self._now
+
+    def add(self, td):
+        self._now = self._now + td
+
+
+class ShaftModelTestSuite(unittest.TestCase):
+    def test_reaches_steady_state_speed(self):
+        shaft = ShaftModel(max_speed=360.0, time_constant=0.1, dead_band=0.1)
+        shaft.power = 0.55
+        for _ in range(1000):
+            shaft.step(0.001)
+        self.assertAlmostEqual(shaft.velocity, 180.0, places=1)
+
+    def test_dead_band_and_friction(self):
+        shaft = ShaftModel(dead_band=0.1, friction=180.0)
+        shaft.velocity = 90.0
+        shaft.power = -0.05
+        for _ in range(600):
+            shaft.step(0.001)
+        self.assertEqual(shaft.velocity, 0.0)
+        self.assertAlmostEqual(shaft.angle, 22.5, places=1)
+
+
+class HardwareSimulatorTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(datetime(2019, 4, 9, 22, 5, 0))  # 9 Apr 2019 - 22:05
+        self.simulator = HardwareSimulator(self.clock, DEVICES, 12)
+        self.shaft_encoders = ShaftEncoders(self.simulator.sensors_adapter, DEVICES, self.clock, 1.0, 800, self.fail)
+        self.changes = []
+
+    def on_device_angle_changed(self, positions, speeds):
+        self.changes.append(dict((device, position.position) for device, position in positions.items()))
+
+    def run_simulation(self, seconds, on_tick=None, tick_every_ms=50):
+        for idx in range(int(seconds * 1000)):
+            if on_tick and idx % tick_every_ms == 0:
+                on_tick()
+            self.simulator.step(0.001)
+            self.clock.add(timedelta(milliseconds=1))
+
+    def test_rotation_produces_gray_code_edges(self):
+        self.simulator.start(self.shaft_encoders._on_sensor_values, run_thread=False)
+        self.shaft_encoders.start(self.on_device_angle_changed)
+        # Clockwise rotation makes the positions grow
+        self.simulator.motors_adapter.set_motor_power('A', -1.0)
+        self.run_simulation(1.0)
+        positions = [change['A'] for change in self.changes]
+        self.assertEqual(positions, list(range(1, len(positions) + 1)))
+        self.assertEqual(self.shaft_encoders.get_current_position('A').position, self.simulator.get_position('A'))
+        self.assertEqual(self.shaft_encoders.get_rejected_transitions(), {'A': 0, 'B': 0})
+        estimate = self.shaft_encoders.get_velocity('A')
+        self.assertAlmostEqual(estimate.velocity, self.simulator.shafts['A'].velocity, delta=5.0)
+
+    def _build_planner(self, constants=None):
+        constants = constants or MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.5)
+        motors_controller = MotorsController(self.clock, DEVICES.keys())
+        # Time constant, dead band and friction of the default ShaftModel, and ticks every 50 ms
+        planner = Planner(self.shaft_encoders, motors_controller, motor_time_constant_in_sec=0.3, tick_interval_in_sec=0.05,
+                          motor_dead_band_power=0.1, coast_deceleration_in_deg_per_sec2=180.0)
+        planner.set_constants(constants)
+        self.shaft_encoders.start(planner.on_shaft_position)
+        return planner, motors_controller
+
+    def tick(self, planner, motors_controller):
+        planner.on_tick()
+        motors_controller.apply_motor_power(self.simulator.motors_adapter)
+
+    def move(self, constants, speed, direction, distance):
+        """
+        Moves head A by "distance" sectors from the middle of a sector, where the planner leaves the heads. Returns how
+        many sectors past the target it comes to rest.
+        """
+        self.simulator.shafts['A'].angle = -360.0 / 64 / 2
+        self.simulator.sensor_word = self.simulator._sensor_word()
+        planner, motors_controller = self._build_planner(constants)
+        planner.set_plan('A', (distance if direction == 'cw' else -distance) % 64, speed, direction)
+        target_steps = planner.targets['A'].steps
+        self.run_simulation(8.0, lambda: self.tick(planner, motors_controller))
+        self.assertEqual(self.simulator.shafts['A'].velocity, 0.0)
+        self.assertEqual(motors_controller.get_current_power()['A'], 0.0)
+        # Clockwise makes the steps grow
+        return (self.shaft_encoders.get_odometry('A').steps - target_steps) * (1 if direction == 'cw' else -1)
+
+    def assert_lands(self, constants, cases):
+        """
+        "cases": speed, direction, and how many sectors past the target the head may come to rest at (it starts slowing
+        down before the target, and moves on at the lowest speed if it stops short).
+        """
+        for speed, direction, tolerance in cases:
+            for distance in (20, 40):
+                with self.subTest(speed=speed, direction=direction, distance=distance):
+                    self.setUp()
+                    sectors_past = self.move(constants, speed, direction, distance)
+                    self.assertGreaterEqual(sectors_past, 0)
+                    self.assertLessEqual(sectors_past, tolerance)
+
+    def test_closed_loop_planner_reaches_target(self):
+        # Calibrated for the default ShaftModel
+        constants = MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.5, [40.0, 120.0, 200.0, 280.0, 360.0])
+        self.assert_lands(constants, [
+            (1, 'cw', 0), (2, 'cw', 0), (3, 'cw', 1), (4, 'cw', 1), (5, 'cw', 1),
+            (1, 'ccw', 0), (2, 'ccw', 0), (3, 'ccw', 1), (4, 'ccw', 1), (5, 'ccw', 1),
+        ])
+
+    def test_closed_loop_planner_with_s_curves(self):
+        constants = MotorControllerConstants([0.2, 0.4, 0.6, 0.8, 1.0], 0.3, [40.0, 120.0, 200.0, 280.0, 360.0],
+                                             motion_profile='s_curve', jerk_time_in_sec=0.2)
+        # At speed 4, the velocity estimate still lags behind the acceleration when it is time to stop a 20 sectors move
+        self.assert_lands(constants, [
+            (1, 'cw', 0), (2, 'cw', 0), (3, 'cw', 0), (4, 'cw', 2), (5, 'cw', 0),
+            (1, 'ccw', 0), (2, 'ccw', 0), (3, 'ccw', 0), (4, 'ccw', 2), (5, 'ccw', 0),
+        ])
+
+    def test_closed_loop_planner_multi_turn(self):
+        planner, motors_controller = self._build_planner()
+        planner.set_plan('A', 20, 5, 'cw', turns=2)
+        self.run_simulation(6.0, lambda: self.tick(planner, motors_controller))
+        self.assertEqual(self.simulator.shafts['A'].velocity, 0.0)
+        self.assertGreaterEqual(self.shaft_encoders.get_odometry('A').steps, 64 * 2 + 20)
+        self.assertLess(self.shaft_encoders.get_odometry('A').steps, 64 * 2 + 30)
@@ -100,12 +100,33 @@ class Storage(object):
         return True
 
     def get_motors_constants(self):
-        return MotorControllerConstants(self.data['meta']['constants']['power_definitions'], self.data['meta']['constants']['ramp_up_time_from_zero_to_max_in_sec'])
+        constants = self.data['meta']['constants']
+        return MotorControllerConstants(constants['power_definitions'], constants['ramp_up_time_from_zero_to_max_in_sec'],
+                                        constants.get('speed_definitions'), constants.get('speed_gains'),
+                                        constants.get('motion_profile'), constants.get('jerk_time_in_sec'))
 
     def set_constants(self, constants):
         self.data['meta']['constants'] = constants
         self._save_meta()
 
+    def get_band_offsets(self):
+        return self.data['meta'].get('band_offsets', {})
+
+    def set_band_offsets(self, device, band_offsets):
+        self.data['meta'].setdefault('band_offsets', {})[device] = band_offsets
+        self._save_meta()
+
+    def get_power_curves(self):
+        return self.data['meta'].get('power_curves', {})
+
+    def set_power_calibration(self, device, power_curves, power_definitions, speed_definitions):
+        # The definitions are shared by all the devices: computed from the curves of all of them
+        self.data['meta'].setdefault('power_curves', {})[device] = power_curves
+        constants = self.data['meta']['constants']
+        constants['power_definitions'] = power_definitions
+        constants['speed_definitions'] = speed_definitions
+        self._save_meta()
+
     def get_current_program(self):
         return self.data['programs']['all_programs'][self.data['programs']['current_program_id']]
 